@@ -0,0 +1,28 @@
+-- Índices para que los reportes no hagan seq-scan en Railway
+-- Ejecutar en Railway PostgreSQL console
+-- CONCURRENTLY evita bloquear escrituras mientras se construye el índice
+
+-- /reporte_hoy filtra por rango de fecha (fecha_registro >= hoy AND < mañana)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sitio3_animales_fecha
+ON operario_sitio3_animales (fecha_registro DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sitio1_fecha
+ON operario_fijo_granja (fecha DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conductores_fecha
+ON conductores (fecha DESC);
+
+-- /reporte_cedula filtra por cédula y ordena por fecha DESC LIMIT 10:
+-- el índice compuesto resuelve WHERE + ORDER BY sin ordenar en memoria
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sitio3_animales_ced_fecha
+ON operario_sitio3_animales (cedula_operario, fecha_registro DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sitio1_ced_fecha
+ON operario_fijo_granja (cedula, fecha DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conductores_ced_fecha
+ON conductores (cedula, fecha DESC);
+
+-- Verificar que los índices existen
+SELECT indexname FROM pg_indexes
+WHERE tablename IN ('operario_sitio3_animales', 'operario_fijo_granja', 'conductores');
@@ -0,0 +1,33 @@
+-- Tabla hija con el detalle de cada pesaje de Sitio 1
+-- Ejecutar en Railway PostgreSQL console
+-- El bot la crea sola si no existe; este script es para crearla a mano
+-- y (opcional) migrar el detalle que hoy vive como JSON en pesos_detalle
+
+CREATE TABLE IF NOT EXISTS operario_fijo_granja_pesos (
+    id SERIAL PRIMARY KEY,
+    registro_id INTEGER NOT NULL REFERENCES operario_fijo_granja(id),
+    pesaje_num INTEGER NOT NULL,
+    peso DECIMAL(10, 2) NOT NULL
+);
+
+-- Índice para agregaciones por registro (avg/sum de pesos de un registro)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_granja_pesos_registro
+ON operario_fijo_granja_pesos (registro_id);
+
+-- Migrar el detalle JSON existente a filas (solo registros aún no migrados)
+INSERT INTO operario_fijo_granja_pesos (registro_id, pesaje_num, peso)
+SELECT g.id, t.ordinality, t.value::DECIMAL(10, 2)
+FROM operario_fijo_granja g
+CROSS JOIN LATERAL jsonb_array_elements_text(g.pesos_detalle::jsonb) WITH ORDINALITY AS t(value, ordinality)
+WHERE g.pesos_detalle IS NOT NULL
+  AND g.pesos_detalle <> ''
+  AND NOT EXISTS (
+      SELECT 1 FROM operario_fijo_granja_pesos p WHERE p.registro_id = g.id
+  );
+
+-- Verificar que la migración funcionó
+SELECT registro_id, COUNT(*) AS pesajes, SUM(peso) AS peso_total
+FROM operario_fijo_granja_pesos
+GROUP BY registro_id
+ORDER BY registro_id DESC
+LIMIT 5;
@@ -1,23 +1,61 @@
 import os
 import re
+import time
+import math
 import asyncio
 import asyncpg
 import uuid
+import functools
+import logging
+import logging.handlers
+import queue
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.filters import CommandStart, Command
 from aiogram.utils.keyboard import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardBuilder
 from aiogram.types import ReplyKeyboardRemove
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from collections import Counter
+
+# orjson (serializador en C) si está disponible; fallback a json estándar
+try:
+    import orjson
+
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    def json_loads(texto):
+        return orjson.loads(texto)
+except ImportError:
+    import json
+
+    def json_dumps(obj) -> str:
+        return json.dumps(obj, separators=(',', ':'))
+
+    def json_loads(texto):
+        return json.loads(texto)
 
 # Librerías para Google Drive
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from google.oauth2 import service_account
 
+# Logger del bot: los records pasan por una cola y el write real lo hace un
+# hilo aparte (QueueListener), así un stdout lento (pipe de Railway saturado)
+# no bloquea el event loop. logger.exception() registra el traceback sin el
+# costo de reimportar traceback dentro de cada except.
+_cola_logs = queue.SimpleQueue()
+_listener_logs = logging.handlers.QueueListener(_cola_logs, logging.StreamHandler())
+_listener_logs.start()
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(_cola_logs)])
+logger = logging.getLogger(__name__)
+
 # ==================== CARGAR VARIABLES DE ENTORNO ==================== #
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -25,6 +63,7 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 GROUP_CHAT_ID = os.getenv("GROUP_CHAT_ID")
 GOOGLE_FOLDER_ID = os.getenv("GOOGLE_FOLDER_ID")
 GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH")
+REDIS_URL = os.getenv("REDIS_URL")
 
 # Validar BOT_TOKEN (obligatorio)
 if not BOT_TOKEN:
@@ -42,6 +81,87 @@ if GROUP_CHAT_ID:
 else:
     print("⚠️ WARNING: GROUP_CHAT_ID no está definido. No se enviarán notificaciones al grupo.")
 
+# Carpeta local de fotos: se crea una sola vez al arrancar en lugar de
+# repetir el os.makedirs en cada handler de fotos
+IMG_DIR = "imagenes_pesajes"
+os.makedirs(IMG_DIR, exist_ok=True)
+
+# ==================== RATE LIMITER DE ENVÍOS AL GRUPO ==================== #
+# Telegram limita ~20 mensajes/minuto por grupo y 30 mensajes/segundo en
+# total; si nos pasamos responde 429 y el flujo entero queda esperando el
+# retry_after. Un token bucket por límite evita llegar a ese punto.
+
+class LimitadorTasa:
+    """Token bucket asíncrono: hasta `capacidad` envíos cada `periodo` segundos"""
+    def __init__(self, capacidad: int, periodo: float):
+        self._capacidad = capacidad
+        self._periodo = periodo
+        self._tokens = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self._tokens = min(
+                    self._capacidad,
+                    self._tokens + (ahora - self._ultimo) * self._capacidad / self._periodo
+                )
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return self
+                # Dormir justo lo necesario para que se regenere un token
+                await asyncio.sleep((1 - self._tokens) * self._periodo / self._capacidad)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+LIMITE_GRUPO = LimitadorTasa(20, 60)   # por grupo
+LIMITE_GLOBAL = LimitadorTasa(30, 1)   # todo el bot
+
+async def enviar_al_grupo(crear_envio):
+    """Ejecuta un envío al grupo pasando por los dos token buckets.
+
+    Recibe una función sin argumentos que construye la corutina (p. ej.
+    `lambda: bot.send_message(...)`) para no crear la corutina antes de
+    tener el token.
+    """
+    async with LIMITE_GLOBAL, LIMITE_GRUPO:
+        return await crear_envio()
+
+# Formateo de fecha cacheado por segundo: strftime es caro (parsea el formato
+# en cada llamada) y bajo carga muchos guardados caen en el mismo segundo
+_ahora_cache = (0, "", "")
+
+def ahora_formateada() -> tuple[str, str]:
+    """Devuelve (fecha ISO para BD, fecha corta para mensajes), cacheadas 1 s"""
+    global _ahora_cache
+    segundo = int(time.time())
+    if segundo != _ahora_cache[0]:
+        dt = datetime.now()
+        _ahora_cache = (segundo, dt.strftime('%Y-%m-%d %H:%M:%S'), dt.strftime('%d/%m/%Y %H:%M'))
+    return _ahora_cache[1], _ahora_cache[2]
+
+# ==================== TAREAS EN SEGUNDO PLANO ==================== #
+# Guardado en BD y notificación al grupo corren detrás de la respuesta al
+# usuario. El semáforo acota cuántas tareas viven a la vez y el set guarda
+# la referencia para que el GC no las cancele a mitad de camino.
+SEM_TAREAS_FONDO = asyncio.Semaphore(50)
+_tareas_fondo = set()
+
+def lanzar_tarea_fondo(coro):
+    """Ejecuta la corutina en segundo plano, acotada por SEM_TAREAS_FONDO"""
+    async def _con_semaforo():
+        async with SEM_TAREAS_FONDO:
+            await coro
+
+    tarea = asyncio.create_task(_con_semaforo())
+    _tareas_fondo.add(tarea)
+    tarea.add_done_callback(_tareas_fondo.discard)
+    return tarea
+
 # ==================== CONFIGURAR GOOGLE DRIVE ==================== #
 def upload_to_drive(file_path, file_name):
     """Sube un archivo a Google Drive y retorna el link público"""
@@ -68,15 +188,26 @@ def upload_to_drive(file_path, file_name):
             'name': file_name,
             'parents': [GOOGLE_FOLDER_ID]
         }
-        media = MediaFileUpload(file_path, mimetype='image/jpeg')
-        
-        file = service.files().create(
+        # Subida resumable por chunks de 1 MB: no carga todo el JPEG en memoria
+        # y un corte de red no obliga a reiniciar la subida desde cero
+        media = MediaFileUpload(
+            file_path,
+            mimetype='image/jpeg',
+            resumable=True,
+            chunksize=1024 * 1024
+        )
+
+        request = service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id,webViewLink',
             supportsAllDrives=True
-        ).execute()
-        
+        )
+
+        file = None
+        while file is None:
+            status, file = request.next_chunk()
+
         file_id = file.get('id')
         
         # Hacer el archivo público
@@ -115,31 +246,157 @@ def upload_to_drive(file_path, file_name):
 # Pool de conexiones global
 db_pool = None
 
+# Circuit breaker: si la BD falló recientemente, no reintentar durante este tiempo
+DB_RETRY_SECONDS = 30
+db_unavailable_until = 0.0
+
+# Consultas de verificación de cédulas; el statement cache del pool las
+# deja preparadas tras la primera ejecución en cada conexión
+CEDULAS_SQL = {
+    'animales': '''
+        SELECT DISTINCT cedula_operario
+        FROM operario_sitio3_animales
+        WHERE telegram_user_id = $1
+        AND cedula_operario != $2
+    ''',
+    'descarga': '''
+        SELECT DISTINCT cedula_operario
+        FROM operario_sitio3_descarga_animales
+        WHERE telegram_user_id = $1
+        AND cedula_operario != $2
+    ''',
+    'conductores': '''
+        SELECT DISTINCT cedula
+        FROM conductores
+        WHERE telegram_user_id = $1
+        AND cedula != $2
+    ''',
+    'sitio1': '''
+        SELECT DISTINCT cedula
+        FROM operario_fijo_granja
+        WHERE telegram_user_id = $1
+        AND cedula != $2
+    ''',
+}
+
+# Consultas de los reportes "últimos 10", también cacheadas por conexión
+REPORTES_SQL = {
+    'sitio3_last10': "SELECT cedula_operario, bandas, rango_corrales, tipo_comida, fecha_registro FROM operario_sitio3_animales ORDER BY fecha_registro DESC LIMIT 10",
+    'sitio1_last10': "SELECT cedula, cantidad_lechones, lechones_por_grupo, peso_total, peso_promedio, fecha FROM operario_fijo_granja ORDER BY fecha DESC LIMIT 10",
+    'conductores_last10': "SELECT cedula, placa, tipo_carga, bascula, peso, fecha FROM conductores ORDER BY fecha DESC LIMIT 10",
+}
+
+async def inicializar_conexion(conn):
+    """Hook de init del pool: corre una sola vez por conexión física"""
+    # Con el codec registrado se pueden pasar listas/dicts de Python
+    # directamente como parámetros de columnas jsonb, sin dumps manual
+    try:
+        await conn.set_type_codec(
+            'jsonb', encoder=json_dumps, decoder=json_loads, schema='pg_catalog'
+        )
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar el codec JSONB: {e}")
+
+async def fetch_cedulas(conn, clave, telegram_user_id, cedula_actual):
+    """Ejecuta una consulta de cédulas (preparada vía statement cache)"""
+    return await conn.fetch(CEDULAS_SQL[clave], telegram_user_id, cedula_actual)
+
+async def fetch_reporte(conn, clave):
+    """Ejecuta una consulta de reporte (preparada vía statement cache)"""
+    return await conn.fetch(REPORTES_SQL[clave])
+
 async def init_db_pool():
     """Inicializa el pool de conexiones a PostgreSQL"""
-    global db_pool
+    global db_pool, db_unavailable_until
     if not DATABASE_URL:
         print("⚠️ DATABASE_URL no está configurado. No se usará base de datos.")
         return None
-    
+
     try:
         db_pool = await asyncpg.create_pool(
             DATABASE_URL,
             min_size=1,
             max_size=10,
             command_timeout=60,
-            max_inactive_connection_lifetime=300  # 5 minutos
+            max_inactive_connection_lifetime=300,  # 5 minutos
+            statement_cache_size=1024,  # las consultas repetidas quedan preparadas
+            init=inicializar_conexion
         )
+        db_unavailable_until = 0.0
         print("✅ Pool de conexiones a PostgreSQL creado correctamente")
         return db_pool
     except Exception as e:
+        db_unavailable_until = time.monotonic() + DB_RETRY_SECONDS
         print(f"❌ Error creando pool de PostgreSQL: {e}")
+        print(f"🔄 No se reintentará la conexión durante {DB_RETRY_SECONDS} segundos")
         return None
 
+async def init_db_tablas():
+    """Crea las tablas que el bot necesita. Se ejecuta una sola vez al
+    arrancar para que los handlers hagan únicamente el INSERT."""
+    try:
+        async with db_connection() as conn:
+            if conn:
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS conductores (
+                        id SERIAL PRIMARY KEY,
+                        telegram_id BIGINT NOT NULL,
+                        cedula VARCHAR(20) NOT NULL,
+                        placa VARCHAR(10) NOT NULL,
+                        tipo_carga VARCHAR(50) NOT NULL,
+                        num_animales INTEGER,
+                        tipo_combustible VARCHAR(20),
+                        cantidad_galones DECIMAL(10, 2),
+                        factura_dato1 VARCHAR(200),
+                        factura_dato2 VARCHAR(200),
+                        factura_dato3 VARCHAR(200),
+                        factura_foto TEXT,
+                        bascula VARCHAR(50) NOT NULL,
+                        cerdos_vivos INTEGER,
+                        cerdos_muertos INTEGER,
+                        peso DECIMAL(10, 2) NOT NULL,
+                        foto_pesaje TEXT,
+                        fecha TIMESTAMP DEFAULT NOW()
+                    )
+                ''')
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS operario_fijo_granja (
+                        id SERIAL PRIMARY KEY,
+                        telegram_id BIGINT NOT NULL,
+                        cedula VARCHAR(20) NOT NULL,
+                        cantidad_pesajes INTEGER NOT NULL,
+                        lechones_por_pesaje INTEGER NOT NULL,
+                        total_lechones INTEGER NOT NULL,
+                        peso_total DECIMAL(10, 2) NOT NULL,
+                        peso_promedio_por_lechon DECIMAL(10, 2) NOT NULL,
+                        peso_promedio_por_pesaje DECIMAL(10, 2) NOT NULL,
+                        pesos_detalle TEXT,
+                        foto_confirmacion TEXT,
+                        fecha TIMESTAMP DEFAULT NOW()
+                    )
+                ''')
+                # Tabla hija con el detalle de cada pesaje: sin JSON que
+                # codificar al guardar ni que parsear al consultar
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS operario_fijo_granja_pesos (
+                        id SERIAL PRIMARY KEY,
+                        registro_id INTEGER NOT NULL REFERENCES operario_fijo_granja(id),
+                        pesaje_num INTEGER NOT NULL,
+                        peso DECIMAL(10, 2) NOT NULL
+                    )
+                ''')
+                print("✅ Tablas de base de datos verificadas")
+    except Exception as e:
+        logger.exception(f"⚠️ Error creando tablas al arrancar: {e}")
+
 async def get_db_connection():
     """Obtiene una conexión del pool, reconectando si es necesario"""
     global db_pool
-    
+
+    # Si la BD falló hace poco, fallar rápido sin bloquear el handler
+    if db_pool is None and time.monotonic() < db_unavailable_until:
+        return None
+
     # Si no hay pool, intentar crear uno
     if db_pool is None:
         print("⚠️ Pool no existe, intentando crear...")
@@ -187,6 +444,35 @@ async def release_db_connection(conn):
         except Exception as e:
             print(f"⚠️ Error liberando conexión: {e}")
 
+@asynccontextmanager
+async def db_connection():
+    """Context manager que adquiere una conexión y la libera siempre.
+
+    Uso: async with db_connection() as conn: ...
+    conn puede ser None si la base de datos no está disponible.
+    """
+    conn = await get_db_connection()
+    try:
+        yield conn
+    finally:
+        if conn:
+            await release_db_connection(conn)
+
+async def obtener_db_pool():
+    """Devuelve el pool de conexiones, inicializándolo si aún no existe.
+
+    Útil para lanzar varias consultas en paralelo con db_pool.fetch(),
+    donde cada una adquiere y libera su propia conexión del pool.
+    """
+    if db_pool is None and time.monotonic() < db_unavailable_until:
+        return None
+
+    if db_pool is None:
+        print("⚠️ Pool no existe, intentando crear...")
+        await init_db_pool()
+
+    return db_pool
+
 # ==================== ESTADOS FSM ==================== #
 class RegistroState(StatesGroup):
     # Menú principal (multi-perfil)
@@ -289,56 +575,36 @@ class RegistroState(StatesGroup):
 class ConductoresState(StatesGroup):
     """Estados separados para el menú de conductores"""
     menu_conductores = State()
-    
+
     # Flujo de registro de pesaje conductores
+    # (sin confirmaciones intermedias: cada dato se captura y se sigue;
+    # la corrección se hace desde el resumen final campo por campo)
     cedula = State()
-    confirmar_cedula = State()
-    
     placa = State()
-    confirmar_placa = State()
-    
+
     tipo_transporte = State()
-    confirmar_tipo_transporte = State()
-    
+
     # Estados específicos para cada tipo de carga
     num_animales = State()
-    confirmar_num_animales = State()
-    
     tipo_combustible = State()
-    confirmar_tipo_combustible = State()
-    
     cantidad_galones = State()
-    confirmar_cantidad_galones = State()
-    
     numero_factura = State()
-    confirmar_numero_factura = State()
-    
     tipo_alimento = State()
-    confirmar_tipo_alimento = State()
-    
     kilos_comprados = State()
-    confirmar_kilos_comprados = State()
-    
     factura_foto = State()
-    
+
     # Selección de báscula
     bascula = State()
-    confirmar_bascula = State()
-    
+
     # Registro de peso
     peso = State()
-    confirmar_peso_input = State()
-    
     foto_pesaje = State()
-    confirmar_peso = State()
-    
+    confirmar_peso = State()  # Resumen final con edición por campo
+
     # Flujo especial para báscula Bogotá (solo cerdos gordos)
     cerdos_vivos = State()
-    confirmar_cerdos_vivos = State()
-    
     cerdos_muertos = State()
-    confirmar_cerdos_muertos = State()
-    
+
     # Flujo Peso Vacío
     peso_vacio_tipo_carga = State()  # Pregunta qué entregó o va a cargar
 
@@ -363,15 +629,42 @@ class OperarioSitio1State(StatesGroup):
     foto_final = State()  # Única foto de confirmación al final
 
 # ==================== VALIDACIONES ==================== #
+# Patrones compilados una sola vez al importar: los validadores corren en
+# cada mensaje y así se evita la búsqueda en el caché interno de re por llamada
+PLACA_RE = re.compile(r"^[A-Z]{3}\d{3}$")
+PESO_RE = re.compile(r"^\d+(,\d+)?$")
+RANGO_CORRALES_RE = re.compile(r"^\d+-\d+$")
+NUMERO_LOTE_RE = re.compile(r"^[A-Za-z0-9_-]{3,30}$")
+SELECCION_SILOS_RE = re.compile(r"^[1-6](,[1-6])*$")
+
+# Normalización de respuestas de teclado: quita tildes con una tabla de
+# translate y emojis/puntuación con una sola pasada de regex, en lugar de
+# repetir strip().lower() y comparar variantes con y sin tilde por handler
+_TILDES_TABLA = str.maketrans("áéíóúÁÉÍÓÚ", "aeiouaeiou")
+_NO_ALFANUM_RE = re.compile(r"[^\w\s]")
+
+def normalizar_texto(texto: str) -> str:
+    """Devuelve el texto en minúsculas, sin tildes, emojis ni puntuación"""
+    return _NO_ALFANUM_RE.sub("", texto.translate(_TILDES_TABLA)).strip().lower()
+
+# Texto libre del usuario interpolado en mensajes con parse_mode="Markdown":
+# un * _ ` o [ suelto (p. ej. en un número de factura) hace que Telegram
+# rechace el mensaje entero y haya que reintentar. Se escapa una sola vez.
+_MD_ESCAPE_TABLA = str.maketrans({'*': r'\*', '_': r'\_', '`': r'\`', '[': r'\['})
+
+def escapar_md(valor) -> str:
+    """Escapa los caracteres especiales de Markdown en texto libre"""
+    return str(valor).translate(_MD_ESCAPE_TABLA)
+
 def validar_cedula(valor):
     return valor.isdigit()
 
 def validar_placa(valor):
-    return re.fullmatch(r"^[A-Z]{3}\d{3}$", valor.upper())
+    return PLACA_RE.fullmatch(valor.upper())
 
 def validar_placa_conductor(valor: str) -> bool:
     """Valida placa de camión: 3 letras mayúsculas + 3 números (ej: NHU982)"""
-    return re.fullmatch(r"^[A-Z]{3}\d{3}$", valor.upper()) is not None
+    return PLACA_RE.fullmatch(valor.upper()) is not None
 
 def validar_numero_entero(valor: str, minimo: int = 1, maximo: int = 10000) -> tuple[bool, int, str]:
     """
@@ -388,37 +681,42 @@ def validar_numero_entero(valor: str, minimo: int = 1, maximo: int = 10000) -> t
     except ValueError:
         return False, 0, "Debe ingresar un número entero válido"
 
-def validar_galones(valor: str) -> tuple[bool, float, str]:
+def validar_decimal(valor: str, maximo: float = 100000, nombre: str = "La cantidad") -> tuple[bool, float, str]:
     """
-    Valida cantidad de galones: número positivo, puede tener decimales
-    Retorna: (es_valido, cantidad, mensaje_error)
+    Valida un número positivo, puede tener decimales (coma o punto)
+    Retorna: (es_valido, numero, mensaje_error)
     """
     try:
         # Reemplazar coma por punto para decimales
-        valor_limpio = valor.replace(",", ".")
-        galones = float(valor_limpio)
-        
-        if galones <= 0:
-            return False, 0, "La cantidad debe ser mayor a 0"
-        if galones > 100000:
-            return False, 0, "La cantidad no puede superar 100,000 galones"
-        
-        return True, galones, ""
+        numero = float(valor.replace(",", "."))
+
+        if numero <= 0:
+            return False, 0, f"{nombre} debe ser mayor a 0"
+        if numero > maximo:
+            return False, 0, f"{nombre} no puede superar {maximo:,.0f}"
+
+        return True, numero, ""
     except ValueError:
         return False, 0, "Debe ingresar un número válido (puede usar decimales con coma o punto)"
 
+def validar_galones(valor: str) -> tuple[bool, float, str]:
+    """Valida cantidad de galones: número positivo, puede tener decimales"""
+    return validar_decimal(valor, maximo=100000, nombre="La cantidad")
+
 def validar_peso(valor):
-    return re.fullmatch(r"^\d+(,\d+)?$", valor)
+    return PESO_RE.fullmatch(valor)
 
 # ==================== VALIDACIONES OPERARIO SITIO 3 ==================== #
+# Los validadores de abajo son funciones puras de su texto de entrada:
+# lru_cache convierte las revalidaciones de la misma cédula/banda/lote
+# (muy comunes durante un turno) en un lookup de dict
+@functools.lru_cache(maxsize=1024)
 def validar_cedula_sitio3(valor: str) -> bool:
     """Valida cédula para Sitio 3: solo números, 6-12 dígitos"""
-    if not valor.isdigit():
-        return False
-    if len(valor) < 6 or len(valor) > 12:
-        return False
-    return True
+    # len() es O(1): descarta textos largos antes de recorrerlos con isdigit()
+    return 6 <= len(valor) <= 12 and valor.isdigit()
 
+@functools.lru_cache(maxsize=1024)
 def validar_numero_banda(valor: str) -> tuple[bool, str, str]:
     """
     Valida número de banda: acepta cualquier texto (números, letras, guiones, etc.)
@@ -434,15 +732,19 @@ def validar_numero_banda(valor: str) -> tuple[bool, str, str]:
 
     return True, valor, ""
 
-def validar_rango_corrales(valor: str, max_rango: int = None) -> tuple[bool, str]:
+@functools.lru_cache(maxsize=1024)
+def validar_rango_corrales(valor: str, max_rango: int = None) -> tuple[bool, str, str]:
     """
     Valida rango de corrales: formato X-Y donde X <= Y
     max_rango: Si se especifica, el rango no puede superar este valor
-    Retorna: (es_valido, mensaje_error)
+    Retorna: (es_valido, rango_normalizado, mensaje_error)
+
+    El rango se devuelve ya parseado y normalizado ("01-09" -> "1-9") para
+    que ningún consumidor posterior tenga que volver a hacer split/int.
     """
     # Validar formato con regex
-    if not re.match(r'^\d+-\d+$', valor):
-        return False, "Formato incorrecto. Use: número-número (ejemplo: 1-10)"
+    if not RANGO_CORRALES_RE.match(valor):
+        return False, "", "Formato incorrecto. Use: número-número (ejemplo: 1-10)"
 
     # Extraer números
     partes = valor.split('-')
@@ -451,25 +753,26 @@ def validar_rango_corrales(valor: str, max_rango: int = None) -> tuple[bool, str
         fin = int(partes[1])
 
         if inicio < 1:
-            return False, "El número de corral inicial debe ser al menos 1 (no puede ser 0)"
+            return False, "", "El número de corral inicial debe ser al menos 1 (no puede ser 0)"
 
         if fin < 1:
-            return False, "El número de corral final debe ser al menos 1"
+            return False, "", "El número de corral final debe ser al menos 1"
 
         if inicio > fin:
-            return False, f"El número inicial ({inicio}) debe ser menor o igual al final ({fin})"
+            return False, "", f"El número inicial ({inicio}) debe ser menor o igual al final ({fin})"
 
         # Validar rango máximo si se especifica
         if max_rango is not None:
             rango_actual = fin - inicio + 1
             if rango_actual > max_rango:
-                return False, f"El rango máximo permitido es de {max_rango} corrales. Usted ingresó {rango_actual} corrales."
+                return False, "", f"El rango máximo permitido es de {max_rango} corrales. Usted ingresó {rango_actual} corrales."
 
-        return True, ""
+        return True, f"{inicio}-{fin}", ""
     except ValueError:
-        return False, "Error al procesar los números"
+        return False, "", "Error al procesar los números"
 
 # ==================== VALIDACIONES DESCARGA DE ANIMALES ==================== #
+@functools.lru_cache(maxsize=1024)
 def validar_cantidad_lechones(valor: str) -> tuple[bool, int, str]:
     """
     Valida cantidad de lechones: entero positivo, 1-5000
@@ -485,6 +788,7 @@ def validar_cantidad_lechones(valor: str) -> tuple[bool, int, str]:
     except ValueError:
         return False, 0, "Debe ingresar un número entero válido"
 
+@functools.lru_cache(maxsize=1024)
 def validar_numero_lote(valor: str) -> tuple[bool, str]:
     """
     Valida número de lote: alfanumérico, 3-30 caracteres
@@ -492,7 +796,7 @@ def validar_numero_lote(valor: str) -> tuple[bool, str]:
     Retorna: (es_valido, mensaje_error)
     """
     # Validar formato con regex
-    if not re.match(r'^[A-Za-z0-9_-]{3,30}$', valor):
+    if not NUMERO_LOTE_RE.match(valor):
         if len(valor) < 3:
             return False, "El número de lote es muy corto (mínimo 3 caracteres)"
         elif len(valor) > 30:
@@ -515,16 +819,16 @@ def validar_seleccion_silos(valor: str) -> tuple[bool, list[int], str]:
     valor_limpio = valor.replace(" ", "")
 
     # Validar formato básico
-    if not re.match(r'^[1-6](,[1-6])*$', valor_limpio):
+    if not SELECCION_SILOS_RE.match(valor_limpio):
         return False, [], "Formato incorrecto. Use números del 1 al 6 separados por comas (ej: 1,3,5)"
 
     # Extraer números
     try:
         silos = [int(s) for s in valor_limpio.split(',')]
 
-        # Verificar duplicados
-        if len(silos) != len(set(silos)):
-            duplicados = [s for s in set(silos) if silos.count(s) > 1]
+        # Verificar duplicados en una sola pasada
+        duplicados = [s for s, veces in Counter(silos).items() if veces > 1]
+        if duplicados:
             return False, [], f"Silos duplicados detectados: {', '.join(map(str, duplicados))}"
 
         # Ordenar silos
@@ -562,6 +866,33 @@ def validar_peso_toneladas(valor: str) -> tuple[bool, float, str]:
 
 # ==================== SISTEMA DE ALERTAS DE SEGURIDAD ==================== #
 
+# Plantilla estática de la alerta (solo se interpolan los campos dinámicos)
+ALERTA_SEGURIDAD_TEMPLATE = (
+    "🚨 *ALERTA DE SEGURIDAD - MÚLTIPLES CÉDULAS*\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "⚠️ Se ha detectado que un mismo usuario\n"
+    "de Telegram ha usado diferentes cédulas.\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    "📱 *DATOS DEL USUARIO:*\n\n"
+    "• Usuario Telegram: {username}\n"
+    "• ID Telegram: `{telegram_user_id}`\n"
+    "• Operación: {tipo_operacion}\n"
+    "• Fecha/Hora: {fecha_hora}\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    "🆔 *CÉDULAS DETECTADAS:*\n\n"
+    "• Cédula ACTUAL: `{cedula_actual}`\n\n"
+    "• Cédulas PREVIAS:\n{cedulas_previas_texto}\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "⚠️ *ACCIÓN REQUERIDA:*\n"
+    "Por favor verificar la identidad del operario\n"
+    "y tomar las medidas necesarias.\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+)
+
+# TTL del caché de cédulas por usuario: el historial casi nunca cambia,
+# así que 10 minutos evitan repetir las 4 consultas en re-registros seguidos
+CEDULAS_CACHE_TTL = 600
+
 async def verificar_multiples_cedulas(telegram_user_id: int, cedula_actual: str) -> tuple[bool, list[str]]:
     """
     Verifica si un telegram_user_id ha usado diferentes cédulas previamente en TODAS las tablas.
@@ -573,64 +904,76 @@ async def verificar_multiples_cedulas(telegram_user_id: int, cedula_actual: str)
     Returns:
         (hay_alerta, lista_cedulas_diferentes)
     """
-    conn = None
-    cedulas_encontradas = set()
+    clave_cache = f"cedulas:{telegram_user_id}"
 
-    try:
-        conn = await get_db_connection()
-        if not conn:
-            print("⚠️ No se pudo verificar múltiples cédulas (sin conexión a BD)")
-            return False, []
-
-        # Consultar en tabla de Registro de Animales (Sitio 3)
-        registros_animales = await conn.fetch('''
-            SELECT DISTINCT cedula_operario
-            FROM operario_sitio3_animales
-            WHERE telegram_user_id = $1
-            AND cedula_operario != $2
-        ''', telegram_user_id, cedula_actual)
-
-        for reg in registros_animales:
-            cedulas_encontradas.add(reg['cedula_operario'])
-
-        # Consultar en tabla de Descarga de Animales (Sitio 3)
-        registros_descarga = await conn.fetch('''
-            SELECT DISTINCT cedula_operario
-            FROM operario_sitio3_descarga_animales
-            WHERE telegram_user_id = $1
-            AND cedula_operario != $2
-        ''', telegram_user_id, cedula_actual)
-
-        for reg in registros_descarga:
-            cedulas_encontradas.add(reg['cedula_operario'])
-
-        # Consultar en tabla de Conductores
+    # Caché Redis: si ya tenemos el historial de cédulas del usuario,
+    # resolvemos sin tocar la BD y registramos la cédula actual en el set
+    if redis_actividad is not None:
         try:
-            registros_conductores = await conn.fetch('''
-                SELECT DISTINCT cedula
-                FROM conductores
-                WHERE telegram_user_id = $1
-                AND cedula != $2
-            ''', telegram_user_id, cedula_actual)
-
-            for reg in registros_conductores:
-                cedulas_encontradas.add(reg['cedula'])
+            cedulas_cacheadas = await redis_actividad.smembers(clave_cache)
+            if cedulas_cacheadas:
+                await redis_actividad.sadd(clave_cache, cedula_actual)
+                await redis_actividad.expire(clave_cache, CEDULAS_CACHE_TTL)
+                otras = sorted(c for c in cedulas_cacheadas if c != cedula_actual)
+                if otras:
+                    print(f"🚨 ALERTA: Usuario {telegram_user_id} ha usado múltiples cédulas (caché):")
+                    print(f"   - Cédula actual: {cedula_actual}")
+                    print(f"   - Cédulas previas: {', '.join(otras)}")
+                    return True, otras
+                return False, []
         except Exception as e:
-            print(f"⚠️ Tabla conductores no existe o error: {e}")
+            print(f"⚠️ Caché de cédulas no disponible, consultando BD: {e}")
 
-        # Consultar en tabla de Operario Sitio 1 (Granja)
-        try:
-            registros_sitio1 = await conn.fetch('''
-                SELECT DISTINCT cedula
-                FROM operario_fijo_granja
-                WHERE telegram_user_id = $1
-                AND cedula != $2
-            ''', telegram_user_id, cedula_actual)
-
-            for reg in registros_sitio1:
-                cedulas_encontradas.add(reg['cedula'])
-        except Exception as e:
-            print(f"⚠️ Tabla operario_fijo_granja no existe o error: {e}")
+    # Si la BD falló hace poco, no bloquear el flujo intentando verificar
+    if db_pool is None and time.monotonic() < db_unavailable_until:
+        print("⚠️ Verificación de múltiples cédulas omitida (BD no disponible)")
+        return False, []
+
+    cedulas_encontradas = set()
+
+    try:
+        async with db_connection() as conn:
+            if not conn:
+                print("⚠️ No se pudo verificar múltiples cédulas (sin conexión a BD)")
+                return False, []
+
+            # Consultar en tabla de Registro de Animales (Sitio 3)
+            registros_animales = await fetch_cedulas(conn, 'animales', telegram_user_id, cedula_actual)
+
+            for reg in registros_animales:
+                cedulas_encontradas.add(reg['cedula_operario'])
+
+            # Consultar en tabla de Descarga de Animales (Sitio 3)
+            registros_descarga = await fetch_cedulas(conn, 'descarga', telegram_user_id, cedula_actual)
+
+            for reg in registros_descarga:
+                cedulas_encontradas.add(reg['cedula_operario'])
+
+            # Consultar en tabla de Conductores
+            try:
+                registros_conductores = await fetch_cedulas(conn, 'conductores', telegram_user_id, cedula_actual)
+
+                for reg in registros_conductores:
+                    cedulas_encontradas.add(reg['cedula'])
+            except Exception as e:
+                print(f"⚠️ Tabla conductores no existe o error: {e}")
+
+            # Consultar en tabla de Operario Sitio 1 (Granja)
+            try:
+                registros_sitio1 = await fetch_cedulas(conn, 'sitio1', telegram_user_id, cedula_actual)
+
+                for reg in registros_sitio1:
+                    cedulas_encontradas.add(reg['cedula'])
+            except Exception as e:
+                print(f"⚠️ Tabla operario_fijo_granja no existe o error: {e}")
+
+        # Poblar el caché con el historial completo (incluye la cédula actual)
+        if redis_actividad is not None:
+            try:
+                await redis_actividad.sadd(clave_cache, cedula_actual, *cedulas_encontradas)
+                await redis_actividad.expire(clave_cache, CEDULAS_CACHE_TTL)
+            except Exception as e:
+                print(f"⚠️ No se pudo poblar el caché de cédulas: {e}")
 
         # Si encontramos otras cédulas, hay alerta
         if cedulas_encontradas:
@@ -642,15 +985,9 @@ async def verificar_multiples_cedulas(telegram_user_id: int, cedula_actual: str)
         return False, []
 
     except Exception as e:
-        print(f"❌ Error en verificación de múltiples cédulas: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error en verificación de múltiples cédulas: {e}")
         return False, []
 
-    finally:
-        if conn:
-            await release_db_connection(conn)
-
 async def enviar_alerta_seguridad(
     telegram_user_id: int,
     username: str,
@@ -676,259 +1013,678 @@ async def enviar_alerta_seguridad(
         fecha_hora = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
 
         # Formatear lista de cédulas previas
-        cedulas_previas_texto = '\n'.join([f"   • `{c}`" for c in cedulas_previas])
-
-        mensaje_alerta = (
-            "🚨 *ALERTA DE SEGURIDAD - MÚLTIPLES CÉDULAS*\n"
-            "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-            "⚠️ Se ha detectado que un mismo usuario\n"
-            "de Telegram ha usado diferentes cédulas.\n\n"
-            "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-            "📱 *DATOS DEL USUARIO:*\n\n"
-            f"• Usuario Telegram: {username}\n"
-            f"• ID Telegram: `{telegram_user_id}`\n"
-            f"• Operación: {tipo_operacion}\n"
-            f"• Fecha/Hora: {fecha_hora}\n\n"
-            "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-            "🆔 *CÉDULAS DETECTADAS:*\n\n"
-            f"• Cédula ACTUAL: `{cedula_actual}`\n\n"
-            f"• Cédulas PREVIAS:\n{cedulas_previas_texto}\n\n"
-            "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-            "⚠️ *ACCIÓN REQUERIDA:*\n"
-            "Por favor verificar la identidad del operario\n"
-            "y tomar las medidas necesarias.\n\n"
-            "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+        cedulas_previas_texto = '\n'.join("   • `" + c + "`" for c in cedulas_previas)
+
+        mensaje_alerta = ALERTA_SEGURIDAD_TEMPLATE.format(
+            username=username,
+            telegram_user_id=telegram_user_id,
+            tipo_operacion=tipo_operacion,
+            fecha_hora=fecha_hora,
+            cedula_actual=cedula_actual,
+            cedulas_previas_texto=cedulas_previas_texto
         )
 
-        await bot.send_message(GROUP_CHAT_ID, mensaje_alerta, parse_mode="Markdown")
-        print(f"✅ Alerta de seguridad enviada al grupo (User ID: {telegram_user_id})")
+        await encolar_mensaje(GROUP_CHAT_ID, mensaje_alerta, "Markdown")
+        print(f"📨 Alerta de seguridad encolada (User ID: {telegram_user_id})")
 
     except Exception as e:
-        print(f"❌ Error enviando alerta de seguridad: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error enviando alerta de seguridad: {e}")
+
+# Cola de mensajes salientes: Telegram limita a ~30 mensajes/segundo por bot,
+# así que un consumidor único despacha la cola respetando ese tope en lugar
+# de que cada alerta golpee la API directamente
+MENSAJES_POR_SEGUNDO = 25
+COALESCE_SEGUNDOS = 2.0
+
+cola_mensajes: asyncio.Queue = asyncio.Queue()
+_mensajes_recientes: dict = {}  # (chat_id, texto) -> monotonic del último encolado
+
+async def encolar_mensaje(chat_id, texto: str, parse_mode: str = None):
+    """Encola un mensaje saliente, descartando duplicados exactos muy seguidos"""
+    ahora = time.monotonic()
+    clave = (chat_id, texto)
+    ultimo = _mensajes_recientes.get(clave)
+    if ultimo is not None and ahora - ultimo < COALESCE_SEGUNDOS:
+        print(f"ℹ️ Mensaje duplicado descartado (chat {chat_id})")
+        return
+    _mensajes_recientes[clave] = ahora
+    # Purgar entradas viejas para que el dict no crezca sin límite
+    for k in [k for k, t in _mensajes_recientes.items() if ahora - t >= COALESCE_SEGUNDOS]:
+        del _mensajes_recientes[k]
+    await cola_mensajes.put((chat_id, texto, parse_mode))
+
+async def consumidor_mensajes():
+    """Tarea de fondo que envía los mensajes encolados a ritmo controlado"""
+    intervalo = 1.0 / MENSAJES_POR_SEGUNDO
+    while True:
+        chat_id, texto, parse_mode = await cola_mensajes.get()
+        try:
+            await bot.send_message(chat_id, texto, parse_mode=parse_mode)
+        except Exception as e:
+            print(f"❌ Error enviando mensaje encolado: {e}")
+        finally:
+            cola_mensajes.task_done()
+        await asyncio.sleep(intervalo)
 
 # ==================== FIN SISTEMA DE ALERTAS ==================== #
 
+# Textos estáticos de los menús (se construyen una sola vez) y teclado-remove
+# compartido para no crear un objeto nuevo en cada respuesta
+MENU_PRINCIPAL_TEXT = (
+    "👋 *Bienvenido al Sistema de Gestión de Lomarosa*\n\n"
+    "Seleccione su perfil:\n\n"
+    "1️⃣ Operario Sitio 3\n"
+    "2️⃣ Operario Sitio 1\n"
+    "3️⃣ Conductores\n\n"
+    "Escriba el número de la opción:\n\n"
+    "💡 _Escriba 0 en cualquier momento para cancelar_\n\n"
+    "🐷 *LOMAROSA* 🐷\n"
+    "_Campo bien hecho, cerdos bien criados_"
+)
+
+MENU_SITIO3_TEXT = (
+    "🐷 *OPERARIO SITIO 3*\n\n"
+    "Seleccione una opción:\n\n"
+    "1️⃣ Registro de consumo por lote\n"
+    "2️⃣ Ingreso concentrado en silo\n"
+    "3️⃣ Ingreso de lechones\n"
+    "4️⃣ Registro celdas de carga\n"
+    "5️⃣ Registro de combustible\n"
+    "6️⃣ Traslado entre corrales\n\n"
+    "Escriba el número de la opción:\n\n"
+    "💡 _Escriba 0 para volver al menú principal_"
+)
+
+FINALIZAR_TEXT = (
+    "✅ *FINALIZADO*\n\n"
+    "Has acabado el flujo y el registro fue exitoso.\n\n"
+    "En caso de volver a querer usar el bot, escriba:\n"
+    "/start\n\n"
+    "Si no, ¡hasta luego!\n\n"
+    "🙏 *MUCHAS GRACIAS*\n\n"
+    "🐷 *LOMAROSA* 🐷\n"
+    "_Campo bien hecho, cerdos bien criados_"
+)
+
+KB_REMOVE = ReplyKeyboardRemove()
+
+AYUDA_TEXT = (
+    "📚 *COMANDOS DISPONIBLES*\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+
+    "🏠 *MENÚ PRINCIPAL*\n"
+    "`/start` - Iniciar el bot y ver menú principal\n"
+    "`/ayuda` - Ver esta lista de comandos\n\n"
+
+    "📊 *REPORTES Y CONSULTAS*\n\n"
+
+    "*Ver registros de hoy:*\n"
+    "`/reporte_hoy`\n"
+    "Muestra todos los registros del día actual\n\n"
+
+    "*Buscar por cédula:*\n"
+    "`/reporte_cedula 1234567890`\n"
+    "Muestra todos los registros de una cédula\n"
+    "_Reemplaza 1234567890 con la cédula a buscar_\n\n"
+
+    "*Reportes por sitio:*\n"
+    "`/reporte_sitio3` - Últimos 10 registros Sitio 3\n"
+    "`/reporte_sitio1` - Últimos 10 registros Sitio 1\n"
+    "`/reporte_conductores` - Últimos 10 registros Conductores\n\n"
+
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    "💡 *NOTA:* Los comandos se escriben directamente en el chat\n\n"
+
+    "🐷 *LOMAROSA* 🐷\n"
+    "_Campo bien hecho, cerdos bien criados_"
+)
+
+CONDUCTORES_MENU_TEXT = (
+    "🚛 *CONDUCTORES - REGISTRO DE PESAJE*\n\n"
+    "¿Qué va a transportar?\n\n"
+    "1️⃣ Lechones (cerdos pequeños)\n"
+    "2️⃣ Concentrado (alimento)\n"
+    "3️⃣ Cerdos Gordos (para venta)\n"
+    "4️⃣ Combustible (diesel/corriente)\n"
+    "5️⃣ Peso Vacío\n\n"
+    "Seleccione una opción:"
+)
+
+PESO_VACIO_CARGA_TEXT = (
+    "🚛 *PESO VACÍO*\n\n"
+    "¿Qué entregó o qué va a cargar?\n\n"
+    "1️⃣ Lechones\n"
+    "2️⃣ Concentrado\n"
+    "3️⃣ Cerdos Gordos\n"
+    "4️⃣ Combustible\n\n"
+    "Seleccione una opción:"
+)
+
+# Teclados estáticos: construirlos una sola vez al importar y reutilizar el
+# markup, en vez de rearmar el ReplyKeyboardBuilder en cada mensaje
+def _kb(botones, *filas):
+    """Construye un ReplyKeyboardMarkup estático (solo se llama al importar)"""
+    builder = ReplyKeyboardBuilder()
+    for texto in botones:
+        builder.button(text=texto)
+    if filas:
+        builder.adjust(*filas)
+    return builder.as_markup(resize_keyboard=True)
+
+CONDUCTORES_MENU_KB = _kb(
+    ("1. Lechones", "2. Concentrado", "3. Cerdos Gordos", "4. Combustible", "5. Peso Vacío"),
+    2, 2, 1
+)
+PESO_VACIO_CARGA_KB = _kb(
+    ("1. Lechones", "2. Concentrado", "3. Cerdos Gordos", "4. Combustible"), 2, 2
+)
+KB_CONFIRMAR_MODIFICAR = _kb(("1. Confirmar", "2. Modificar"), 2)
+KB_GRANJA_BOGOTA = _kb(("1. Granja", "2. Bogotá"), 2)
+KB_COMBUSTIBLE = _kb(("Diesel", "Corriente"), 2)
+KB_TIPO_ALIMENTO = _kb(("1. Levante", "2. Engorde/Medicado", "3. Finalizador"), 1)
+KB_SI_CONFIRMAR_NO_EDITAR = _kb(("1. Sí, confirmar", "2. No, editar"), 2)
+KB_TIPO_COMIDA_SITIO3 = _kb(("Levante", "Engorde / Levante 3 medicado", "Finalizador"), 1)
+KB_OTRA_BANDA = _kb(("✅ Sí, otra banda", "❌ No, terminar"), 2)
+KB_SILOS = _kb(("1", "2", "3", "4", "5", "6"), 3)
+KB_OPCION_1_2 = _kb(("1", "2"), 2)
+KB_OTRO_SILO = _kb(("✅ Sí, otro silo", "❌ No, finalizar"), 2)
+KB_REGISTRAR_OTRO = _kb(("✅ Sí, registrar otro", "❌ No, finalizar"), 1)
+
+# Conjuntos de opciones para F.text.in_: frozenset da pertenencia O(1)
+# y se construye una sola vez, en vez de una lista nueva por registro
+_TIPOS_COMIDA = frozenset({"Levante", "Engorde / Levante 3 medicado", "Finalizador"})
+_SI_OTRA_BANDA = frozenset({"✅ Sí, otra banda", "Sí", "Si", "1"})
+_NO_TERMINAR = frozenset({"❌ No, terminar", "No", "2"})
+_SILOS_VALIDOS = frozenset({"1", "2", "3", "4", "5", "6"})
+_SI_OTRO_SILO = frozenset({"✅ Sí, otro silo", "Sí", "Si", "1"})
+_NO_FINALIZAR = frozenset({"❌ No, finalizar", "No", "2"})
+_TIPOS_CARGA_CAMION = frozenset({"Cerdo vivo", "Canales frías", "Desposte", "Pedidos", "Gasolina"})
+
+# Mensajes estáticos que se repiten en varios handlers
+PROMPT_BANDA = (
+    "🏷️ Escriba el número de banda\n\n"
+    "_(ejemplo: 212-b1)_"
+)
+PROMPT_RANGO_CORRALES = (
+    "📍 ¿En qué corrales van a ubicarse los lechones?\n\n"
+    "Por favor ingrese el rango en formato: *#-#*\n\n"
+    "⚠️ _Máximo 9 corrales por registro_\n\n"
+    "*Ejemplos válidos:*\n"
+    "• `1-9`\n"
+    "• `10-18`\n"
+    "• `5-10`"
+)
+RESUMEN_SITIO3_TEMPLATE = (
+    "📋 *RESUMEN DE LA OPERACIÓN*\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "1️⃣ Corrales: *{rango}*\n"
+    "2️⃣ Banda: *{banda}*\n"
+    "3️⃣ Tipo de comida: *{tipo_comida}*\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "Si desea cambiar alguna opción,\n"
+    "escriba el número (1, 2 o 3).\n\n"
+    "✅ Si todo está correcto, escriba *OK*"
+)
+MSG_PEDIR_LOTE = (
+    "🏷️ Ingrese el número de LOTE\n\n"
+    "⚠️ Nota: El lote es el identificador único\n"
+    "de este grupo de animales para trazabilidad.\n\n"
+    "Formato típico: YYYY-NNN\n"
+    "Ejemplos: 2024-001, 2024-045, 2025-123\n\n"
+    "Número de lote:"
+)
+
+# Opciones de báscula según el tipo de carga: (markup, texto de opciones)
+BASCULAS_POR_CARGA = {
+    'Concentrado': (_kb(("1. Báscula Italcol",), 1), "1️⃣ Báscula Italcol"),
+    'Cerdos Gordos': (_kb(("2. Bogotá", "3. Finca Tranquera"), 1), "2️⃣ Bogotá\n3️⃣ Finca Tranquera"),
+    None: (_kb(("3. Finca Tranquera",), 1), "3️⃣ Finca Tranquera"),
+}
+
 async def volver_menu_principal(message: types.Message, state: FSMContext):
     """Función helper para volver al menú principal multi-perfil"""
     await state.clear()
-    await message.answer(
-        "👋 *Bienvenido al Sistema de Gestión de Lomarosa*\n\n"
-        "Seleccione su perfil:\n\n"
-        "1️⃣ Operario Sitio 3\n"
-        "2️⃣ Operario Sitio 1\n"
-        "3️⃣ Conductores\n\n"
-        "Escriba el número de la opción:\n\n"
-        "💡 _Escriba 0 en cualquier momento para cancelar_\n\n"
-        "🐷 *LOMAROSA* 🐷\n"
-        "_Campo bien hecho, cerdos bien criados_",
-        parse_mode="Markdown"
-    )
+    await message.answer(MENU_PRINCIPAL_TEXT, parse_mode="Markdown")
     await state.set_state(RegistroState.menu_principal)
 
 async def volver_menu_sitio3(message: types.Message, state: FSMContext):
     """Función helper para volver al submenú de Operario Sitio 3"""
-    await message.answer(
-        "🐷 *OPERARIO SITIO 3*\n\n"
-        "Seleccione una opción:\n\n"
-        "1️⃣ Registro de consumo por lote\n"
-        "2️⃣ Ingreso concentrado en silo\n"
-        "3️⃣ Ingreso de lechones\n"
-        "4️⃣ Registro celdas de carga\n"
-        "5️⃣ Registro de combustible\n"
-        "6️⃣ Traslado entre corrales\n\n"
-        "Escriba el número de la opción:\n\n"
-        "💡 _Escriba 0 para volver al menú principal_",
-        parse_mode="Markdown"
-    )
+    await message.answer(MENU_SITIO3_TEXT, parse_mode="Markdown")
     await state.set_state(RegistroState.sitio3_menu)
 
 async def finalizar_flujo(message: types.Message, state: FSMContext):
     """Función para finalizar el flujo y despedir al usuario (NO vuelve al menú)"""
     await state.clear()
     await message.answer(
-        "✅ *FINALIZADO*\n\n"
-        "Has acabado el flujo y el registro fue exitoso.\n\n"
-        "En caso de volver a querer usar el bot, escriba:\n"
-        "/start\n\n"
-        "Si no, ¡hasta luego!\n\n"
-        "🙏 *MUCHAS GRACIAS*\n\n"
-        "🐷 *LOMAROSA* 🐷\n"
-        "_Campo bien hecho, cerdos bien criados_",
+        FINALIZAR_TEXT,
         parse_mode="Markdown",
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=KB_REMOVE
     )
 
 # ==================== CONFIGURAR BOT ==================== #
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
+# Sesión HTTP con keep-alive largo y más conexiones por host: los envíos
+# concurrentes a api.telegram.org reutilizan sockets TLS ya abiertos en
+# vez de pagar un handshake por llamada
+sesion_bot = AiohttpSession()
+if hasattr(sesion_bot, "_connector_init"):
+    # Parámetros del TCPConnector interno de aiohttp (API interna de
+    # aiogram 3.x; si cambia en una versión futura, quedan los defaults)
+    sesion_bot._connector_init.update(limit_per_host=30, keepalive_timeout=75)
+
+bot = Bot(token=BOT_TOKEN, session=sesion_bot)
+
+class CacheStorage(BaseStorage):
+    """Storage FSM con caché de lectura en memoria sobre otro storage.
+
+    Casi todos los handlers hacen al menos un get_data y un set_state por
+    mensaje; con Redis eso son varios round-trips por update. Las
+    lecturas se sirven de un dict local y las escrituras van siempre al
+    storage real (write-through), así el estado sigue sobreviviendo
+    reinicios. Válido mientras el bot corra en un solo proceso.
+    """
+
+    def __init__(self, inner: BaseStorage):
+        self._inner = inner
+        self._estados = {}
+        self._datos = {}
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        self._estados[key] = state.state if isinstance(state, State) else state
+        await self._inner.set_state(key, state)
+
+    async def get_state(self, key: StorageKey):
+        if key in self._estados:
+            return self._estados[key]
+        estado = await self._inner.get_state(key)
+        self._estados[key] = estado
+        return estado
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        self._datos[key] = data
+        await self._inner.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> dict:
+        if key in self._datos:
+            return self._datos[key].copy()
+        datos = await self._inner.get_data(key)
+        self._datos[key] = datos
+        return datos.copy()
+
+    async def close(self) -> None:
+        await self._inner.close()
+
+# Storage FSM: Redis si está configurado (permite varios procesos y sobrevive
+# reinicios), MemoryStorage como fallback para desarrollo local
+if REDIS_URL:
+    from aiogram.fsm.storage.redis import RedisStorage
+    # TTL de 1 hora: un flujo abandonado no deja claves huérfanas en Redis
+    storage = CacheStorage(RedisStorage.from_url(REDIS_URL, state_ttl=3600, data_ttl=3600))
+    print("✅ FSM storage: Redis (con caché de lectura en memoria)")
+else:
+    storage = MemoryStorage()
+    print("⚠️ REDIS_URL no está definido. Se usará MemoryStorage (un solo proceso)")
+
 dp = Dispatcher(storage=storage)
 
 # ==================== SISTEMA DE TIMEOUT DE INACTIVIDAD ==================== #
-# Diccionario para rastrear la última actividad de cada usuario
-user_last_activity = {}
 TIMEOUT_MINUTES = 20
+TIMEOUT_SEGUNDOS = TIMEOUT_MINUTES * 60
+
+# Con Redis la actividad se rastrea con claves act:<user_id> que expiran
+# solas (EX), así el dict no crece sin límite, sobrevive reinicios y se
+# comparte entre workers. Sin Redis se conserva el dict en memoria.
+if REDIS_URL:
+    import redis.asyncio as aioredis
+    redis_actividad = aioredis.from_url(REDIS_URL, decode_responses=True)
+else:
+    redis_actividad = None
 
-async def guardar_registro_inactivo(user_id: int, state_name: str, data: dict):
-    """Guarda un registro parcial en la base de datos con estado INACTIVO"""
-    conn = None
+# Diccionario para rastrear la última actividad de cada usuario (fallback)
+user_last_activity = {}
+
+SESION_EXPIRADA_TEXT = (
+    "⏱️ *SESIÓN EXPIRADA POR INACTIVIDAD*\n\n"
+    "Han pasado más de 20 minutos sin actividad.\n"
+    "Su progreso ha sido guardado como INACTIVO.\n\n"
+    "Para comenzar de nuevo, use /start"
+)
+
+async def expirar_sesion_inactiva(user_id: int):
+    """Guarda y limpia la sesión de un usuario cuya clave de actividad expiró"""
+    key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+    state = FSMContext(storage=dp.storage, key=key)
+    current_state = await state.get_state()
+
+    # Solo guardar si hay un estado activo (no en menú principal)
+    if current_state and current_state != "RegistroState:menu_principal":
+        state_data = await state.get_data()
+        await guardar_registro_inactivo(user_id, current_state, state_data)
+        await encolar_mensaje(user_id, SESION_EXPIRADA_TEXT, "Markdown")
+        await state.clear()
+
+# Zset con el vencimiento de cada usuario activo: respaldo para cuando el
+# proveedor de Redis no permite CONFIG SET o la suscripción se cae
+ACT_DEADLINES_KEY = 'act:deadlines'
+
+async def escuchar_expiraciones_actividad():
+    """Tarea de fondo: reacciona a la expiración de las claves act:* en Redis"""
     try:
-        conn = await get_db_connection()
-        if not conn:
-            print(f"⚠️ No se pudo guardar registro inactivo para user {user_id}")
-            return
+        # Habilitar notificaciones de expiración en el keyspace (algunos
+        # proveedores gestionados lo rechazan; queda el barrido de respaldo)
+        await redis_actividad.config_set('notify-keyspace-events', 'Ex')
+    except Exception as e:
+        print(f"⚠️ No se pudo configurar notify-keyspace-events: {e}")
 
-        # Determinar en qué tabla guardar según el estado
-        fecha_hora = datetime.now()
-
-        if "ConductoresState" in state_name:
-            # Guardar en tabla conductores con estado INACTIVO
-            await conn.execute('''
-                INSERT INTO conductores (
-                    telegram_id, cedula, placa, tipo_carga, num_animales, tipo_combustible,
-                    cantidad_galones, factura_dato1, factura_dato2, factura_dato3,
-                    factura_foto, bascula, cerdos_vivos, cerdos_muertos, peso, foto_pesaje, fecha
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17)
-            ''',
-                user_id,
-                data.get('cedula', 'INACTIVO'),
-                data.get('placa', 'INACTIVO'),
-                data.get('tipo_carga', 'INACTIVO'),
-                data.get('num_animales'),
-                data.get('tipo_combustible'),
-                data.get('cantidad_galones'),
-                data.get('numero_factura'),
-                data.get('tipo_alimento'),
-                data.get('kilos_comprados'),
-                data.get('factura_foto'),
-                data.get('bascula', 'INACTIVO'),
-                data.get('cerdos_vivos'),
-                data.get('cerdos_muertos'),
-                data.get('peso', 0.0),
-                data.get('foto_pesaje'),
-                fecha_hora
-            )
-            print(f"✅ Registro INACTIVO guardado en conductores para user {user_id}")
+    while True:
+        try:
+            pubsub = redis_actividad.pubsub()
+            # Comodín en el índice de BD: la URL puede apuntar a una BD != 0
+            await pubsub.psubscribe('__keyevent@*__:expired')
+            print("✅ Escuchando expiraciones de actividad en Redis")
+
+            async for mensaje in pubsub.listen():
+                if mensaje.get('type') != 'pmessage':
+                    continue
+                clave = mensaje.get('data', '')
+                if not clave.startswith('act:') or clave == ACT_DEADLINES_KEY:
+                    continue
+                user_id = clave.split(':', 1)[1]
+                try:
+                    await expirar_sesion_inactiva(int(user_id))
+                    await redis_actividad.zrem(ACT_DEADLINES_KEY, user_id)
+                except Exception as e:
+                    print(f"⚠️ Error procesando expiración de {clave}: {e}")
+        except Exception as e:
+            # Si la conexión pub/sub se cae, reintentar en vez de dejar
+            # los timeouts muertos hasta el próximo deploy
+            print(f"⚠️ Suscripción de expiraciones caída, reintentando: {e}")
+            await asyncio.sleep(5)
 
-        elif "OperarioSitio1State" in state_name:
-            # Guardar en tabla operario_fijo_granja
-            import json
-            pesos = data.get("pesos", [])
-            fotos = data.get("fotos", [])
-            peso_total = sum(pesos) if pesos else 0
-            peso_promedio = peso_total / len(pesos) if pesos else 0
-
-            await conn.execute('''
-                INSERT INTO operario_fijo_granja (
-                    telegram_id, cedula, cantidad_lechones, peso_total, peso_promedio,
-                    pesos_detalle, fotos_urls, fecha
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            ''',
-                user_id,
-                data.get('cedula', 'INACTIVO'),
-                data.get('cantidad_lechones', 0),
-                peso_total,
-                peso_promedio,
-                json.dumps(pesos),
-                json.dumps(fotos),
-                fecha_hora
+async def barrer_actividad_redis():
+    """Tarea de fondo (con Redis): barrido de respaldo de sesiones vencidas.
+
+    Cubre los casos en que las keyspace notifications no llegan (proveedor
+    sin CONFIG SET, suscripción reconectando). expirar_sesion_inactiva es
+    idempotente, así que no importa si el listener ya procesó al usuario.
+    """
+    while True:
+        await asyncio.sleep(120)
+        try:
+            vencidos = await redis_actividad.zrangebyscore(
+                ACT_DEADLINES_KEY, '-inf', time.time()
             )
-            print(f"✅ Registro INACTIVO guardado en operario_fijo_granja para user {user_id}")
+            for user_id in vencidos:
+                await expirar_sesion_inactiva(int(user_id))
+                await redis_actividad.zrem(ACT_DEADLINES_KEY, user_id)
+            if vencidos:
+                print(f"🧹 {len(vencidos)} sesión(es) vencida(s) barridas de Redis")
+        except Exception as e:
+            print(f"⚠️ Error en el barrido de actividad: {e}")
 
-        elif "sitio3" in state_name.lower() or "RegistroState" in state_name:
-            # Para Sitio 3, guardar según el tipo de operación
-            if "medicion" in state_name.lower():
-                await conn.execute('''
-                    INSERT INTO operario_sitio3_medicion_silos (
-                        cedula_operario, silos_medidos, tipo_comida, peso_antes, imagen_antes,
-                        peso_despues, imagen_despues, diferencia, fecha_registro, session_id, telegram_user_id
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
-                ''',
-                    data.get('medicion_cedula', 'INACTIVO'),
-                    data.get('medicion_silos_seleccionados', 'INACTIVO'),
-                    data.get('medicion_tipo_comida', 'INACTIVO'),
-                    data.get('medicion_peso_antes'),
-                    data.get('medicion_imagen_antes'),
-                    data.get('medicion_peso_despues'),
-                    data.get('medicion_imagen_despues'),
-                    0.0,
-                    fecha_hora,
-                    data.get('medicion_session_id', str(uuid.uuid4())),
-                    user_id
+async def podar_actividad():
+    """Tarea de fondo (solo sin Redis): expira y poda el dict de actividad.
+
+    Sin esta pasada periódica el dict crece sin límite con usuarios que
+    dejaron de escribir, y sus sesiones solo expiraban si volvían a enviar
+    un mensaje.
+    """
+    while True:
+        await asyncio.sleep(60)
+        corte = time.monotonic() - TIMEOUT_SEGUNDOS
+        # Snapshot para no mutar el dict mientras se itera
+        vencidos = [u for u, t in list(user_last_activity.items()) if t < corte]
+        for user_id in vencidos:
+            user_last_activity.pop(user_id, None)
+            try:
+                await expirar_sesion_inactiva(user_id)
+            except Exception as e:
+                print(f"⚠️ Error expirando sesión de user {user_id}: {e}")
+        if vencidos:
+            print(f"🧹 {len(vencidos)} entrada(s) de actividad podadas")
+
+# Los registros inactivos no se insertan uno a uno: se acumulan en colas
+# (una por tabla destino) y una tarea de fondo los vuelca cada pocos
+# segundos con COPY binario, que agrupa el costo de conexión y de commit
+REGISTROS_FLUSH_SEGUNDOS = 5
+
+REGISTROS_COLUMNAS = {
+    'conductores': (
+        'telegram_id', 'cedula', 'placa', 'tipo_carga', 'num_animales',
+        'tipo_combustible', 'cantidad_galones', 'factura_dato1', 'factura_dato2',
+        'factura_dato3', 'factura_foto', 'bascula', 'cerdos_vivos',
+        'cerdos_muertos', 'peso', 'foto_pesaje', 'fecha'
+    ),
+    'operario_fijo_granja': (
+        'telegram_id', 'cedula', 'cantidad_lechones', 'peso_total',
+        'peso_promedio', 'pesos_detalle', 'fotos_urls', 'fecha'
+    ),
+    'operario_sitio3_medicion_silos': (
+        'cedula_operario', 'silos_medidos', 'tipo_comida', 'peso_antes',
+        'imagen_antes', 'peso_despues', 'imagen_despues', 'diferencia',
+        'fecha_registro', 'session_id', 'telegram_user_id'
+    ),
+    'operario_sitio3_animales': (
+        'cedula_operario', 'cantidad_animales', 'rango_corrales', 'tipo_comida',
+        'fecha_registro', 'session_id', 'telegram_user_id'
+    ),
+}
+
+colas_registros = {tabla: asyncio.Queue() for tabla in REGISTROS_COLUMNAS}
+
+async def guardar_registro_inactivo(user_id: int, state_name: str, data: dict):
+    """Encola un registro parcial para guardarlo con estado INACTIVO"""
+    # Si la sesión expiró antes de capturar algún dato útil, no vale la pena
+    # encolar una fila llena de 'INACTIVO'
+    if not any(data.get(k) for k in ('cedula', 'medicion_cedula', 'sitio3_cedula', 'pesos')):
+        print(f"ℹ️ Sesión de user {user_id} sin datos útiles; se omite registro inactivo")
+        return
+
+    # Determinar en qué tabla guardar según el estado
+    fecha_hora = datetime.now()
+
+    if "ConductoresState" in state_name:
+        colas_registros['conductores'].put_nowait((
+            user_id,
+            data.get('cedula', 'INACTIVO'),
+            data.get('placa', 'INACTIVO'),
+            data.get('tipo_carga', 'INACTIVO'),
+            data.get('num_animales'),
+            data.get('tipo_combustible'),
+            data.get('cantidad_galones'),
+            data.get('numero_factura'),
+            data.get('tipo_alimento'),
+            data.get('kilos_comprados'),
+            data.get('factura_foto'),
+            data.get('bascula', 'INACTIVO'),
+            data.get('cerdos_vivos'),
+            data.get('cerdos_muertos'),
+            data.get('peso', 0.0),
+            data.get('foto_pesaje'),
+            fecha_hora
+        ))
+        print(f"📨 Registro INACTIVO encolado (conductores, user {user_id})")
+
+    elif "OperarioSitio1State" in state_name:
+        pesos = data.get("pesos", [])
+        fotos = data.get("fotos", [])
+        # fsum: una sola pasada en C y sin imprecisión acumulada de float
+        peso_total = math.fsum(pesos)
+        peso_promedio = peso_total / len(pesos) if pesos else 0
+
+        colas_registros['operario_fijo_granja'].put_nowait((
+            user_id,
+            data.get('cedula', 'INACTIVO'),
+            data.get('cantidad_lechones', 0),
+            peso_total,
+            peso_promedio,
+            json_dumps(pesos),
+            json_dumps(fotos),
+            fecha_hora
+        ))
+        print(f"📨 Registro INACTIVO encolado (operario_fijo_granja, user {user_id})")
+
+    elif "sitio3" in state_name.lower() or "RegistroState" in state_name:
+        # Para Sitio 3, encolar según el tipo de operación
+        if "medicion" in state_name.lower():
+            colas_registros['operario_sitio3_medicion_silos'].put_nowait((
+                data.get('medicion_cedula', 'INACTIVO'),
+                data.get('medicion_silos_seleccionados', 'INACTIVO'),
+                data.get('medicion_tipo_comida', 'INACTIVO'),
+                data.get('medicion_peso_antes'),
+                data.get('medicion_imagen_antes'),
+                data.get('medicion_peso_despues'),
+                data.get('medicion_imagen_despues'),
+                0.0,
+                fecha_hora,
+                # or en vez de default de .get(): el UUID solo se genera si falta
+                data.get('medicion_session_id') or str(uuid.uuid4()),
+                user_id
+            ))
+        else:
+            # Registro de animales o descarga
+            colas_registros['operario_sitio3_animales'].put_nowait((
+                data.get('sitio3_cedula', 'INACTIVO'),
+                data.get('sitio3_cantidad_animales', 0),
+                data.get('sitio3_rango_corrales', 'INACTIVO'),
+                data.get('sitio3_tipo_comida', 'INACTIVO'),
+                fecha_hora,
+                data.get('session_id') or str(uuid.uuid4()),
+                user_id
+            ))
+        print(f"📨 Registro INACTIVO encolado (Sitio 3, user {user_id})")
+
+# Por debajo de este tamaño de lote conviene executemany (un solo pipeline
+# de extended-query); por encima, COPY binario gana con claridad
+REGISTROS_COPY_UMBRAL = 100
+
+async def guardar_registros_batch(conn, filas_por_tabla: dict):
+    """Guarda lotes de registros encolados: executemany o COPY según el tamaño"""
+    for tabla, filas in filas_por_tabla.items():
+        if not filas:
+            continue
+
+        columnas = REGISTROS_COLUMNAS[tabla]
+        try:
+            if len(filas) < REGISTROS_COPY_UMBRAL:
+                placeholders = ', '.join(f'${i + 1}' for i in range(len(columnas)))
+                await conn.executemany(
+                    f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({placeholders})",
+                    filas
                 )
             else:
-                # Registro de animales o descarga
-                await conn.execute('''
-                    INSERT INTO operario_sitio3_animales (
-                        cedula_operario, cantidad_animales, rango_corrales, tipo_comida,
-                        fecha_registro, session_id, telegram_user_id
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7)
-                ''',
-                    data.get('sitio3_cedula', 'INACTIVO'),
-                    data.get('sitio3_cantidad_animales', 0),
-                    data.get('sitio3_rango_corrales', 'INACTIVO'),
-                    data.get('sitio3_tipo_comida', 'INACTIVO'),
-                    fecha_hora,
-                    data.get('session_id', str(uuid.uuid4())),
-                    user_id
+                await conn.copy_records_to_table(
+                    tabla, records=filas, columns=list(columnas)
                 )
-            print(f"✅ Registro INACTIVO guardado en Sitio 3 para user {user_id}")
+            print(f"✅ {len(filas)} registro(s) guardados en {tabla}")
+        except Exception as e:
+            logger.exception(f"⚠️ Error volcando registros en {tabla}: {e}")
+
+async def volcar_registros_pendientes():
+    """Vuelca las colas de registros pendientes a la BD en un solo lote"""
+    if all(cola.empty() for cola in colas_registros.values()):
+        return
 
+    pool = await obtener_db_pool()
+    if not pool:
+        print("⚠️ No se pudieron volcar registros pendientes (sin pool); se reintenta luego")
+        return
+
+    filas_por_tabla = {}
+    for tabla, cola in colas_registros.items():
+        filas = []
+        while not cola.empty():
+            filas.append(cola.get_nowait())
+        if filas:
+            filas_por_tabla[tabla] = filas
+
+    if not filas_por_tabla:
+        return
+
+    try:
+        async with pool.acquire() as conn:
+            await guardar_registros_batch(conn, filas_por_tabla)
     except Exception as e:
-        print(f"⚠️ Error guardando registro inactivo: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"⚠️ Error volcando registros pendientes: {e}")
+
+async def flusher_registros():
+    """Tarea de fondo que vuelca periódicamente las colas de registros"""
+    while True:
+        await asyncio.sleep(REGISTROS_FLUSH_SEGUNDOS)
+        await volcar_registros_pendientes()
+
+# Orden por chat: el polling despacha cada update como tarea independiente,
+# así que dos mensajes rápidos del mismo usuario podrían procesarse en paralelo
+# y pisarse el estado FSM. Un lock FIFO por chat serializa dentro del chat sin
+# frenar a los demás: el guardado lento de un usuario no bloquea al resto.
+_locks_por_chat = {}  # chat_id -> [lock, mensajes en vuelo]
+
+@dp.message.middleware()
+async def orden_por_chat_middleware(handler, event, data):
+    """Serializa los mensajes de un mismo chat preservando su orden"""
+    chat_id = event.chat.id
+    entrada = _locks_por_chat.get(chat_id)
+    if entrada is None:
+        entrada = _locks_por_chat[chat_id] = [asyncio.Lock(), 0]
+    entrada[1] += 1
+    try:
+        async with entrada[0]:
+            return await handler(event, data)
     finally:
-        if conn:
-            await release_db_connection(conn)
+        # Sin mensajes en vuelo el lock ya no hace falta: evitar que el
+        # diccionario crezca con un lock por cada chat que escribió una vez
+        entrada[1] -= 1
+        if entrada[1] == 0:
+            _locks_por_chat.pop(chat_id, None)
 
-@dp.update.middleware()
+@dp.message.middleware()
 async def timeout_middleware(handler, event, data):
     """Middleware para detectar inactividad de 20 minutos"""
-    # Solo aplicar a mensajes de usuarios
-    if hasattr(event, 'from_user') and event.from_user:
+    # Registrado solo para mensajes: aiogram garantiza from_user aquí, así
+    # que sobra el hasattr y los updates de otros tipos ni pasan por aquí
+    if event.from_user:
         user_id = event.from_user.id
-        current_time = datetime.now()
-
-        # Verificar si el usuario tiene actividad previa
-        if user_id in user_last_activity:
-            last_activity = user_last_activity[user_id]
-            time_diff = current_time - last_activity
-
-            # Si han pasado más de 20 minutos
-            if time_diff > timedelta(minutes=TIMEOUT_MINUTES):
-                state = data.get("state")
-                if state:
-                    current_state = await state.get_state()
-
-                    # Solo guardar si hay un estado activo (no en menú principal)
-                    if current_state and current_state != "RegistroState:menu_principal":
-                        state_data = await state.get_data()
-
-                        # Guardar registro parcial
-                        await guardar_registro_inactivo(user_id, current_state, state_data)
-
-                        # Notificar al usuario
-                        await event.answer(
-                            "⏱️ *SESIÓN EXPIRADA POR INACTIVIDAD*\n\n"
-                            "Han pasado más de 20 minutos sin actividad.\n"
-                            "Su progreso ha sido guardado como INACTIVO.\n\n"
-                            "Para comenzar de nuevo, use /start",
-                            parse_mode="Markdown"
-                        )
 
-                        # Limpiar el estado
-                        await state.clear()
+        if redis_actividad is not None:
+            # La expiración la detecta Redis: aquí solo se refresca la clave
+            # (el valor no se lee nunca; lo que importa es el EXPIRE).
+            # El zset de vencimientos alimenta el barrido de respaldo.
+            pipe = redis_actividad.pipeline(transaction=False)
+            pipe.set(f"act:{user_id}", "1", ex=TIMEOUT_SEGUNDOS)
+            pipe.zadd(ACT_DEADLINES_KEY, {str(user_id): time.time() + TIMEOUT_SEGUNDOS})
+            await pipe.execute()
+        else:
+            # Reloj monotónico: comparar dos floats por mensaje en vez de
+            # construir datetime/timedelta cada vez
+            ahora = time.monotonic()
+            last_activity = user_last_activity.get(user_id)
+            if last_activity is not None:
+                # Si han pasado más de 20 minutos
+                if ahora - last_activity > TIMEOUT_SEGUNDOS:
+                    state = data.get("state")
+                    if state:
+                        current_state = await state.get_state()
 
-                        # Remover del diccionario
-                        del user_last_activity[user_id]
+                        # Solo guardar si hay un estado activo (no en menú principal)
+                        if current_state and current_state != "RegistroState:menu_principal":
+                            state_data = await state.get_data()
 
-                        # No continuar con el handler
-                        return
+                            # Guardar registro parcial
+                            await guardar_registro_inactivo(user_id, current_state, state_data)
+
+                            # Notificar al usuario
+                            await event.answer(SESION_EXPIRADA_TEXT, parse_mode="Markdown")
+
+                            # Limpiar el estado
+                            await state.clear()
+
+                            # Remover del diccionario
+                            del user_last_activity[user_id]
+
+                            # No continuar con el handler
+                            return
 
-        # Actualizar última actividad
-        user_last_activity[user_id] = current_time
+            # Actualizar última actividad
+            user_last_activity[user_id] = ahora
 
     # Continuar con el handler normal
     return await handler(event, data)
@@ -947,18 +1703,7 @@ async def cancelar_operacion(message: types.Message, state: FSMContext):
 async def start(message: types.Message, state: FSMContext):
     """Handler inicial - Muestra menú principal multi-perfil"""
     await state.clear()
-    await message.answer(
-        "👋 *Bienvenido al Sistema de Gestión de Lomarosa*\n\n"
-        "Seleccione su perfil:\n\n"
-        "1️⃣ Operario Sitio 3\n"
-        "2️⃣ Operario Sitio 1\n"
-        "3️⃣ Conductores\n\n"
-        "Escriba el número de la opción:\n\n"
-        "💡 _Escriba 0 en cualquier momento para cancelar_\n\n"
-        "🐷 *LOMAROSA* 🐷\n"
-        "_Campo bien hecho, cerdos bien criados_",
-        parse_mode="Markdown"
-    )
+    await message.answer(MENU_PRINCIPAL_TEXT, parse_mode="Markdown")
     await state.set_state(RegistroState.menu_principal)
 
 # ==================== COMANDOS DE REPORTES/CONSULTAS ==================== #
@@ -981,108 +1726,76 @@ def formatear_fecha(fecha_obj):
 @dp.message(Command("ayuda"))
 async def ayuda(message: types.Message):
     """Muestra todos los comandos disponibles"""
-    mensaje = (
-        "📚 *COMANDOS DISPONIBLES*\n"
-        "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-
-        "🏠 *MENÚ PRINCIPAL*\n"
-        "`/start` - Iniciar el bot y ver menú principal\n"
-        "`/ayuda` - Ver esta lista de comandos\n\n"
-
-        "📊 *REPORTES Y CONSULTAS*\n\n"
-
-        "*Ver registros de hoy:*\n"
-        "`/reporte_hoy`\n"
-        "Muestra todos los registros del día actual\n\n"
-
-        "*Buscar por cédula:*\n"
-        "`/reporte_cedula 1234567890`\n"
-        "Muestra todos los registros de una cédula\n"
-        "_Reemplaza 1234567890 con la cédula a buscar_\n\n"
-
-        "*Reportes por sitio:*\n"
-        "`/reporte_sitio3` - Últimos 10 registros Sitio 3\n"
-        "`/reporte_sitio1` - Últimos 10 registros Sitio 1\n"
-        "`/reporte_conductores` - Últimos 10 registros Conductores\n\n"
-
-        "━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-        "💡 *NOTA:* Los comandos se escriben directamente en el chat\n\n"
-
-        "🐷 *LOMAROSA* 🐷\n"
-        "_Campo bien hecho, cerdos bien criados_"
-    )
-
-    await message.answer(mensaje, parse_mode="Markdown")
+    await message.answer(AYUDA_TEXT, parse_mode="Markdown")
 
 @dp.message(Command("reporte_hoy"))
 async def reporte_hoy(message: types.Message):
     """Muestra todos los registros del día actual"""
-    conn = None
     try:
-        conn = await get_db_connection()
-        if not conn:
+        pool = await obtener_db_pool()
+        if not pool:
             await message.answer("⚠️ Error de conexión a la base de datos.")
             return
 
-        # Fecha como objeto date (no string)
-        fecha_hoy = datetime.now().date()
-
-        # Consultar todas las tablas
-        sitio3_animales = await conn.fetch(
-            "SELECT cedula_operario, bandas, rango_corrales, tipo_comida, fecha_registro FROM operario_sitio3_animales WHERE DATE(fecha_registro) = $1 ORDER BY fecha_registro DESC",
-            fecha_hoy
-        )
-
-        sitio1 = await conn.fetch(
-            "SELECT cedula, cantidad_lechones, lechones_por_grupo, peso_total, peso_promedio, fecha FROM operario_fijo_granja WHERE DATE(fecha) = $1 ORDER BY fecha DESC",
-            fecha_hoy
-        )
-
-        conductores = await conn.fetch(
-            "SELECT cedula, placa, tipo_carga, bascula, peso, fecha FROM conductores WHERE DATE(fecha) = $1 ORDER BY fecha DESC",
-            fecha_hoy
+        # Rango [hoy, mañana): a diferencia de WHERE DATE(col) = $1, este
+        # predicado sí puede usar un índice btree normal sobre la columna
+        inicio_dia = datetime.combine(datetime.now().date(), datetime.min.time())
+        fin_dia = inicio_dia + timedelta(days=1)
+
+        # Las tres consultas son independientes: lanzarlas en paralelo,
+        # cada una con su propia conexión del pool
+        sitio3_animales, sitio1, conductores = await asyncio.gather(
+            pool.fetch(
+                "SELECT cedula_operario, bandas, rango_corrales, tipo_comida, fecha_registro FROM operario_sitio3_animales WHERE fecha_registro >= $1 AND fecha_registro < $2 ORDER BY fecha_registro DESC",
+                inicio_dia, fin_dia
+            ),
+            pool.fetch(
+                "SELECT cedula, cantidad_lechones, lechones_por_grupo, peso_total, peso_promedio, fecha FROM operario_fijo_granja WHERE fecha >= $1 AND fecha < $2 ORDER BY fecha DESC",
+                inicio_dia, fin_dia
+            ),
+            pool.fetch(
+                "SELECT cedula, placa, tipo_carga, bascula, peso, fecha FROM conductores WHERE fecha >= $1 AND fecha < $2 ORDER BY fecha DESC",
+                inicio_dia, fin_dia
+            )
         )
 
-        # Construir mensaje
-        mensaje = f"📊 *REPORTE DEL DÍA {datetime.now().strftime('%d/%m/%Y')}*\n\n"
+        # Construir mensaje por partes y unir al final (evita copias O(n²) del +=)
+        partes = [f"📊 *REPORTE DEL DÍA {datetime.now().strftime('%d/%m/%Y')}*\n\n"]
 
         if sitio3_animales:
-            mensaje += f"🐷 *SITIO 3 - ANIMALES* ({len(sitio3_animales)} registros)\n"
+            partes.append(f"🐷 *SITIO 3 - ANIMALES* ({len(sitio3_animales)} registros)\n")
             for reg in sitio3_animales[:5]:  # Máximo 5
-                mensaje += f"• Cédula: {reg['cedula_operario']} | Banda: {reg['bandas']} | Corrales: {reg['rango_corrales']}\n"
+                partes.append(f"• Cédula: {reg['cedula_operario']} | Banda: {reg['bandas']} | Corrales: {reg['rango_corrales']}\n")
             if len(sitio3_animales) > 5:
-                mensaje += f"_... y {len(sitio3_animales) - 5} más_\n"
-            mensaje += "\n"
+                partes.append(f"_... y {len(sitio3_animales) - 5} más_\n")
+            partes.append("\n")
 
         if sitio1:
-            mensaje += f"🐷 *SITIO 1 - LECHONES* ({len(sitio1)} registros)\n"
+            partes.append(f"🐷 *SITIO 1 - LECHONES* ({len(sitio1)} registros)\n")
             for reg in sitio1[:5]:
-                mensaje += f"• Cédula: {reg['cedula']} | Lechones: {reg['cantidad_lechones']} | Peso: {reg['peso_total']:.2f} kg\n"
+                partes.append(f"• Cédula: {reg['cedula']} | Lechones: {reg['cantidad_lechones']} | Peso: {reg['peso_total']:.2f} kg\n")
             if len(sitio1) > 5:
-                mensaje += f"_... y {len(sitio1) - 5} más_\n"
-            mensaje += "\n"
+                partes.append(f"_... y {len(sitio1) - 5} más_\n")
+            partes.append("\n")
 
         if conductores:
-            mensaje += f"🚛 *CONDUCTORES* ({len(conductores)} registros)\n"
+            partes.append(f"🚛 *CONDUCTORES* ({len(conductores)} registros)\n")
             for reg in conductores[:5]:
-                mensaje += f"• Cédula: {reg['cedula']} | Placa: {reg['placa']} | Carga: {reg['tipo_carga']}\n"
+                partes.append(f"• Cédula: {reg['cedula']} | Placa: {reg['placa']} | Carga: {reg['tipo_carga']}\n")
             if len(conductores) > 5:
-                mensaje += f"_... y {len(conductores) - 5} más_\n"
-            mensaje += "\n"
+                partes.append(f"_... y {len(conductores) - 5} más_\n")
+            partes.append("\n")
 
         if not sitio3_animales and not sitio1 and not conductores:
-            mensaje += "No hay registros para el día de hoy."
+            partes.append("No hay registros para el día de hoy.")
 
-        mensaje += f"\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_"
+        partes.append("\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_")
 
-        await message.answer(mensaje, parse_mode="Markdown")
+        await message.answer("".join(partes), parse_mode="Markdown")
 
     except Exception as e:
         await message.answer(f"⚠️ Error al generar reporte: {e}")
         print(f"Error en reporte_hoy: {e}")
-    finally:
-        if conn:
-            await release_db_connection(conn)
 
 @dp.message(Command("reporte_cedula"))
 async def reporte_cedula(message: types.Message):
@@ -1101,189 +1814,219 @@ async def reporte_cedula(message: types.Message):
 
         cedula = args[1].strip()
 
-        conn = None
-        conn = await get_db_connection()
-        if not conn:
+        pool = await obtener_db_pool()
+        if not pool:
             await message.answer("⚠️ Error de conexión a la base de datos.")
             return
 
-        # Consultar todas las tablas
-        sitio3_animales = await conn.fetch(
-            "SELECT bandas, rango_corrales, tipo_comida, fecha_registro FROM operario_sitio3_animales WHERE cedula_operario = $1 ORDER BY fecha_registro DESC LIMIT 10",
-            cedula
-        )
-
-        sitio1 = await conn.fetch(
-            "SELECT cantidad_lechones, lechones_por_grupo, peso_total, peso_promedio, fecha FROM operario_fijo_granja WHERE cedula = $1 ORDER BY fecha DESC LIMIT 10",
-            cedula
-        )
-
-        conductores = await conn.fetch(
-            "SELECT placa, tipo_carga, bascula, peso, fecha FROM conductores WHERE cedula = $1 ORDER BY fecha DESC LIMIT 10",
-            cedula
+        # Consultar las tres tablas en paralelo
+        sitio3_animales, sitio1, conductores = await asyncio.gather(
+            pool.fetch(
+                "SELECT bandas, rango_corrales, tipo_comida, fecha_registro FROM operario_sitio3_animales WHERE cedula_operario = $1 ORDER BY fecha_registro DESC LIMIT 10",
+                cedula
+            ),
+            pool.fetch(
+                "SELECT cantidad_lechones, lechones_por_grupo, peso_total, peso_promedio, fecha FROM operario_fijo_granja WHERE cedula = $1 ORDER BY fecha DESC LIMIT 10",
+                cedula
+            ),
+            pool.fetch(
+                "SELECT placa, tipo_carga, bascula, peso, fecha FROM conductores WHERE cedula = $1 ORDER BY fecha DESC LIMIT 10",
+                cedula
+            )
         )
 
-        # Construir mensaje
-        mensaje = f"📋 *REPORTE - CÉDULA {cedula}*\n\n"
+        # Construir mensaje por partes y unir al final
+        partes = [f"📋 *REPORTE - CÉDULA {cedula}*\n\n"]
 
         if sitio3_animales:
-            mensaje += f"🐷 *SITIO 3 - ANIMALES* (últimos {len(sitio3_animales)})\n"
+            partes.append(f"🐷 *SITIO 3 - ANIMALES* (últimos {len(sitio3_animales)})\n")
             for reg in sitio3_animales:
                 fecha = formatear_fecha(reg['fecha_registro'])
-                mensaje += f"• {fecha} | Banda: {reg['bandas']} | Corrales: {reg['rango_corrales']}\n"
-            mensaje += "\n"
+                partes.append(f"• {fecha} | Banda: {reg['bandas']} | Corrales: {reg['rango_corrales']}\n")
+            partes.append("\n")
 
         if sitio1:
-            mensaje += f"🐷 *SITIO 1 - LECHONES* (últimos {len(sitio1)})\n"
+            partes.append(f"🐷 *SITIO 1 - LECHONES* (últimos {len(sitio1)})\n")
             for reg in sitio1:
                 fecha = formatear_fecha(reg['fecha'])
-                mensaje += f"• {fecha} | {reg['cantidad_lechones']} lechones | {reg['peso_total']:.2f} kg\n"
-            mensaje += "\n"
+                partes.append(f"• {fecha} | {reg['cantidad_lechones']} lechones | {reg['peso_total']:.2f} kg\n")
+            partes.append("\n")
 
         if conductores:
-            mensaje += f"🚛 *CONDUCTORES* (últimos {len(conductores)})\n"
+            partes.append(f"🚛 *CONDUCTORES* (últimos {len(conductores)})\n")
             for reg in conductores:
                 fecha = formatear_fecha(reg['fecha'])
-                mensaje += f"• {fecha} | {reg['placa']} | {reg['tipo_carga']}\n"
-            mensaje += "\n"
+                partes.append(f"• {fecha} | {reg['placa']} | {reg['tipo_carga']}\n")
+            partes.append("\n")
 
         if not sitio3_animales and not sitio1 and not conductores:
-            mensaje += f"No se encontraron registros para la cédula {cedula}."
+            partes.append(f"No se encontraron registros para la cédula {cedula}.")
 
-        mensaje += f"\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_"
+        partes.append("\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_")
 
-        await message.answer(mensaje, parse_mode="Markdown")
+        await message.answer("".join(partes), parse_mode="Markdown")
 
     except Exception as e:
         await message.answer(f"⚠️ Error al generar reporte: {e}")
         print(f"Error en reporte_cedula: {e}")
-    finally:
-        if conn:
-            await release_db_connection(conn)
+
+# Caché corta para los reportes "últimos 10": bajo carga muchas consultas
+# seguidas devuelven las mismas filas, así que se sirve el Markdown ya
+# renderizado durante unos segundos; un lock por reporte evita que una
+# avalancha de pulsaciones dispare la misma consulta en paralelo
+REPORTE_CACHE_TTL = 30
+_reporte_cache = {}   # clave -> (monotonic de expiración, mensaje)
+_reporte_locks = {}   # clave -> asyncio.Lock
+
+def _reporte_cache_get(clave: str):
+    """Devuelve el mensaje cacheado si aún no expiró, o None"""
+    entrada = _reporte_cache.get(clave)
+    if entrada and time.monotonic() < entrada[0]:
+        return entrada[1]
+    return None
+
+def _reporte_cache_set(clave: str, mensaje: str):
+    _reporte_cache[clave] = (time.monotonic() + REPORTE_CACHE_TTL, mensaje)
+
+def _reporte_lock(clave: str) -> asyncio.Lock:
+    if clave not in _reporte_locks:
+        _reporte_locks[clave] = asyncio.Lock()
+    return _reporte_locks[clave]
 
 @dp.message(Command("reporte_sitio3"))
 async def reporte_sitio3(message: types.Message):
-    """Muestra últimos 10 registros de Sitio 3"""
-    conn = None
+    """Muestra últimos 10 registros de Sitio 3 (cacheado 30 s)"""
+    mensaje = _reporte_cache_get("sitio3")
+    if mensaje:
+        await message.answer(mensaje, parse_mode="Markdown")
+        return
+
     try:
-        conn = await get_db_connection()
-        if not conn:
-            await message.answer("⚠️ Error de conexión a la base de datos.")
-            return
+        async with _reporte_lock("sitio3"):
+            # Otro handler pudo reconstruirlo mientras esperábamos el lock
+            mensaje = _reporte_cache_get("sitio3")
+            if not mensaje:
+                async with db_connection() as conn:
+                    if not conn:
+                        await message.answer("⚠️ Error de conexión a la base de datos.")
+                        return
 
-        registros = await conn.fetch(
-            "SELECT cedula_operario, bandas, rango_corrales, tipo_comida, fecha_registro FROM operario_sitio3_animales ORDER BY fecha_registro DESC LIMIT 10"
-        )
+                    registros = await fetch_reporte(conn, 'sitio3_last10')
 
-        mensaje = "📊 *REPORTE SITIO 3 - ÚLTIMOS 10 REGISTROS*\n\n"
+                partes = ["📊 *REPORTE SITIO 3 - ÚLTIMOS 10 REGISTROS*\n\n"]
 
-        if registros:
-            for i, reg in enumerate(registros, 1):
-                fecha = formatear_fecha(reg['fecha_registro'])
-                mensaje += (
-                    f"{i}. {fecha}\n"
-                    f"   • Cédula: {reg['cedula_operario']}\n"
-                    f"   • Banda: {reg['bandas']}\n"
-                    f"   • Corrales: {reg['rango_corrales']}\n"
-                    f"   • Comida: {reg['tipo_comida']}\n\n"
-                )
-        else:
-            mensaje += "No hay registros en Sitio 3."
+                if registros:
+                    for i, reg in enumerate(registros, 1):
+                        fecha = formatear_fecha(reg['fecha_registro'])
+                        partes.append(
+                            f"{i}. {fecha}\n"
+                            f"   • Cédula: {reg['cedula_operario']}\n"
+                            f"   • Banda: {reg['bandas']}\n"
+                            f"   • Corrales: {reg['rango_corrales']}\n"
+                            f"   • Comida: {reg['tipo_comida']}\n\n"
+                        )
+                else:
+                    partes.append("No hay registros en Sitio 3.")
 
-        mensaje += f"\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_"
+                partes.append("\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_")
+                mensaje = "".join(partes)
+                _reporte_cache_set("sitio3", mensaje)
 
         await message.answer(mensaje, parse_mode="Markdown")
 
     except Exception as e:
         await message.answer(f"⚠️ Error al generar reporte: {e}")
-        print(f"Error en reporte_sitio3: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if conn:
-            await release_db_connection(conn)
+        logger.exception(f"Error en reporte_sitio3: {e}")
 
 @dp.message(Command("reporte_sitio1"))
 async def reporte_sitio1(message: types.Message):
-    """Muestra últimos 10 registros de Sitio 1"""
-    conn = None
+    """Muestra últimos 10 registros de Sitio 1 (cacheado 30 s)"""
+    mensaje = _reporte_cache_get("sitio1")
+    if mensaje:
+        await message.answer(mensaje, parse_mode="Markdown")
+        return
+
     try:
-        conn = await get_db_connection()
-        if not conn:
-            await message.answer("⚠️ Error de conexión a la base de datos.")
-            return
+        async with _reporte_lock("sitio1"):
+            mensaje = _reporte_cache_get("sitio1")
+            if not mensaje:
+                async with db_connection() as conn:
+                    if not conn:
+                        await message.answer("⚠️ Error de conexión a la base de datos.")
+                        return
 
-        registros = await conn.fetch(
-            "SELECT cedula, cantidad_lechones, lechones_por_grupo, peso_total, peso_promedio, fecha FROM operario_fijo_granja ORDER BY fecha DESC LIMIT 10"
-        )
+                    registros = await fetch_reporte(conn, 'sitio1_last10')
 
-        mensaje = "📊 *REPORTE SITIO 1 - ÚLTIMOS 10 REGISTROS*\n\n"
+                partes = ["📊 *REPORTE SITIO 1 - ÚLTIMOS 10 REGISTROS*\n\n"]
 
-        if registros:
-            for i, reg in enumerate(registros, 1):
-                fecha = reg['fecha'].strftime('%d/%m %H:%M')
-                mensaje += (
-                    f"{i}. {fecha}\n"
-                    f"   • Cédula: {reg['cedula']}\n"
-                    f"   • Lechones: {reg['cantidad_lechones']}\n"
-                    f"   • Agrupación: {reg['lechones_por_grupo'] or 'N/A'}\n"
-                    f"   • Peso total: {reg['peso_total']:.2f} kg\n"
-                    f"   • Promedio: {reg['peso_promedio']:.2f} kg\n\n"
-                )
-        else:
-            mensaje += "No hay registros en Sitio 1."
+                if registros:
+                    for i, reg in enumerate(registros, 1):
+                        fecha = reg['fecha'].strftime('%d/%m %H:%M')
+                        partes.append(
+                            f"{i}. {fecha}\n"
+                            f"   • Cédula: {reg['cedula']}\n"
+                            f"   • Lechones: {reg['cantidad_lechones']}\n"
+                            f"   • Agrupación: {reg['lechones_por_grupo'] or 'N/A'}\n"
+                            f"   • Peso total: {reg['peso_total']:.2f} kg\n"
+                            f"   • Promedio: {reg['peso_promedio']:.2f} kg\n\n"
+                        )
+                else:
+                    partes.append("No hay registros en Sitio 1.")
 
-        mensaje += f"\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_"
+                partes.append("\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_")
+                mensaje = "".join(partes)
+                _reporte_cache_set("sitio1", mensaje)
 
         await message.answer(mensaje, parse_mode="Markdown")
 
     except Exception as e:
         await message.answer(f"⚠️ Error al generar reporte: {e}")
         print(f"Error en reporte_sitio1: {e}")
-    finally:
-        if conn:
-            await release_db_connection(conn)
 
 @dp.message(Command("reporte_conductores"))
 async def reporte_conductores(message: types.Message):
-    """Muestra últimos 10 registros de Conductores"""
-    conn = None
+    """Muestra últimos 10 registros de Conductores (cacheado 30 s)"""
+    mensaje = _reporte_cache_get("conductores")
+    if mensaje:
+        await message.answer(mensaje, parse_mode="Markdown")
+        return
+
     try:
-        conn = await get_db_connection()
-        if not conn:
-            await message.answer("⚠️ Error de conexión a la base de datos.")
-            return
+        async with _reporte_lock("conductores"):
+            mensaje = _reporte_cache_get("conductores")
+            if not mensaje:
+                async with db_connection() as conn:
+                    if not conn:
+                        await message.answer("⚠️ Error de conexión a la base de datos.")
+                        return
 
-        registros = await conn.fetch(
-            "SELECT cedula, placa, tipo_carga, bascula, peso, fecha FROM conductores ORDER BY fecha DESC LIMIT 10"
-        )
+                    registros = await fetch_reporte(conn, 'conductores_last10')
 
-        mensaje = "📊 *REPORTE CONDUCTORES - ÚLTIMOS 10 REGISTROS*\n\n"
+                partes = ["📊 *REPORTE CONDUCTORES - ÚLTIMOS 10 REGISTROS*\n\n"]
 
-        if registros:
-            for i, reg in enumerate(registros, 1):
-                fecha = reg['fecha'].strftime('%d/%m %H:%M')
-                mensaje += (
-                    f"{i}. {fecha}\n"
-                    f"   • Cédula: {reg['cedula']}\n"
-                    f"   • Placa: {reg['placa']}\n"
-                    f"   • Carga: {reg['tipo_carga']}\n"
-                    f"   • Báscula: {reg['bascula']}\n"
-                    f"   • Peso: {reg['peso']:.2f} kg\n\n"
-                )
-        else:
-            mensaje += "No hay registros de Conductores."
+                if registros:
+                    for i, reg in enumerate(registros, 1):
+                        fecha = reg['fecha'].strftime('%d/%m %H:%M')
+                        partes.append(
+                            f"{i}. {fecha}\n"
+                            f"   • Cédula: {reg['cedula']}\n"
+                            f"   • Placa: {reg['placa']}\n"
+                            f"   • Carga: {reg['tipo_carga']}\n"
+                            f"   • Báscula: {reg['bascula']}\n"
+                            f"   • Peso: {reg['peso']:.2f} kg\n\n"
+                        )
+                else:
+                    partes.append("No hay registros de Conductores.")
 
-        mensaje += f"\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_"
+                partes.append("\n🐷 *LOMAROSA* 🐷\n_Campo bien hecho, cerdos bien criados_")
+                mensaje = "".join(partes)
+                _reporte_cache_set("conductores", mensaje)
 
         await message.answer(mensaje, parse_mode="Markdown")
 
     except Exception as e:
         await message.answer(f"⚠️ Error al generar reporte: {e}")
         print(f"Error en reporte_conductores: {e}")
-    finally:
-        if conn:
-            await release_db_connection(conn)
 
 # ==================== MENÚ PRINCIPAL MULTI-PERFIL ==================== #
 @dp.message(RegistroState.menu_principal, F.text == "1")
@@ -1313,25 +2056,10 @@ async def menu_conductores(message: types.Message, state: FSMContext):
     # Guardar telegram_id automáticamente
     await state.update_data(telegram_id=message.from_user.id)
     
-    # Mostrar menú de opciones primero
-    keyboard = ReplyKeyboardBuilder()
-    keyboard.button(text="1. Lechones")
-    keyboard.button(text="2. Concentrado")
-    keyboard.button(text="3. Cerdos Gordos")
-    keyboard.button(text="4. Combustible")
-    keyboard.button(text="5. Peso Vacío")
-    keyboard.adjust(2, 2, 1)
-    
+    # Mostrar menú de opciones primero (texto y teclado ya precalculados)
     await message.answer(
-        "🚛 *CONDUCTORES - REGISTRO DE PESAJE*\n\n"
-        "¿Qué va a transportar?\n\n"
-        "1️⃣ Lechones (cerdos pequeños)\n"
-        "2️⃣ Concentrado (alimento)\n"
-        "3️⃣ Cerdos Gordos (para venta)\n"
-        "4️⃣ Combustible (diesel/corriente)\n"
-        "5️⃣ Peso Vacío\n\n"
-        "Seleccione una opción:",
-        reply_markup=keyboard.as_markup(resize_keyboard=True),
+        CONDUCTORES_MENU_TEXT,
+        reply_markup=CONDUCTORES_MENU_KB,
         parse_mode="Markdown"
     )
     await state.set_state(ConductoresState.menu_conductores)
@@ -1340,7 +2068,7 @@ async def menu_conductores(message: types.Message, state: FSMContext):
 @dp.message(ConductoresState.menu_conductores)
 async def procesar_menu_conductores(message: types.Message, state: FSMContext):
     """Procesa la selección del menú de conductores"""
-    texto = message.text.strip().lower()
+    texto = normalizar_texto(message.text)
     
     # Opciones 1-4: Guardar tipo de carga y pedir cédula
     tipo_carga = None
@@ -1355,23 +2083,10 @@ async def procesar_menu_conductores(message: types.Message, state: FSMContext):
     elif "5" in texto or "vac" in texto:
         # Opción 5: Peso Vacío - flujo diferente
         await state.update_data(tipo_carga="Peso Vacío", es_peso_vacio=True)
-        
-        keyboard = ReplyKeyboardBuilder()
-        keyboard.button(text="1. Lechones")
-        keyboard.button(text="2. Concentrado")
-        keyboard.button(text="3. Cerdos Gordos")
-        keyboard.button(text="4. Combustible")
-        keyboard.adjust(2, 2)
-        
+
         await message.answer(
-            "🚛 *PESO VACÍO*\n\n"
-            "¿Qué entregó o qué va a cargar?\n\n"
-            "1️⃣ Lechones\n"
-            "2️⃣ Concentrado\n"
-            "3️⃣ Cerdos Gordos\n"
-            "4️⃣ Combustible\n\n"
-            "Seleccione una opción:",
-            reply_markup=keyboard.as_markup(resize_keyboard=True),
+            PESO_VACIO_CARGA_TEXT,
+            reply_markup=PESO_VACIO_CARGA_KB,
             parse_mode="Markdown"
         )
         await state.set_state(ConductoresState.peso_vacio_tipo_carga)
@@ -1394,7 +2109,7 @@ async def procesar_menu_conductores(message: types.Message, state: FSMContext):
 @dp.message(ConductoresState.peso_vacio_tipo_carga)
 async def procesar_peso_vacio_tipo_carga(message: types.Message, state: FSMContext):
     """Procesa qué entregó o va a cargar en peso vacío"""
-    texto = message.text.strip().lower()
+    texto = normalizar_texto(message.text)
     
     tipo_carga_referencia = None
     if "1" in texto or "lechon" in texto:
@@ -1420,14 +2135,33 @@ async def procesar_peso_vacio_tipo_carga(message: types.Message, state: FSMConte
 
 # ==================== NUEVO FLUJO CONDUCTORES ==================== #
 
+# Clasificador de respuestas de confirmación: una sola normalización por
+# mensaje en lugar de repetir los escaneos de subcadenas en cada handler.
+# Se evalúa NO antes que SÍ para conservar la precedencia que ya tenían
+# los handlers ("2"/modificar ganaba sobre "1"/confirmar).
+RESP_OTRA = 0
+RESP_SI = 1
+RESP_NO = 2
+
+# Respuestas de confirmación ancladas al inicio del texto normalizado:
+# un solo match de regex en vez de varios escaneos de substring, y
+# "no confirmar" ya no puede clasificar como SÍ
+_RESP_NO_RE = re.compile(r"^(?:2|no|modificar|editar|cancelar)")
+_RESP_SI_RE = re.compile(r"^(?:1|si|confirmar|ok)")
+
+@functools.lru_cache(maxsize=128)
+def clasificar_confirmacion(texto: str) -> int:
+    """Clasifica una respuesta de confirmación en RESP_SI / RESP_NO / RESP_OTRA"""
+    t = normalizar_texto(texto)
+    if _RESP_NO_RE.match(t):
+        return RESP_NO
+    if _RESP_SI_RE.match(t):
+        return RESP_SI
+    return RESP_OTRA
+
 # Función helper para confirmaciones
 async def preguntar_confirmacion(message: types.Message, valor: str, campo: str):
     """Pregunta si el valor ingresado es correcto"""
-    keyboard = ReplyKeyboardBuilder()
-    keyboard.button(text="1. Confirmar")
-    keyboard.button(text="2. Modificar")
-    keyboard.adjust(2)
-
     # Mensaje específico para báscula (es un botón, no texto escrito)
     if campo.lower() == "báscula":
         pregunta = "¿Está seguro que es la ubicación que quiere ingresar?"
@@ -1439,10 +2173,56 @@ async def preguntar_confirmacion(message: types.Message, valor: str, campo: str)
         f"{pregunta}\n\n"
         f"1️⃣ Confirmar\n"
         f"2️⃣ Modificar",
-        reply_markup=keyboard.as_markup(resize_keyboard=True),
+        reply_markup=KB_CONFIRMAR_MODIFICAR,
         parse_mode="Markdown"
     )
 
+def registrar_paso_confirmado(estado_entrada, estado_confirmar, validador, clave_temp,
+                              pedir_confirmacion, repetir_pregunta, al_confirmar):
+    """Registra el par de handlers procesar/confirmar de un paso del flujo.
+
+    Todos los pasos con confirmación comparten el mismo esqueleto:
+    validar → guardar temporal → preguntar → SÍ consolida y avanza /
+    NO repite la pregunta. Esta fábrica registra ambos handlers en el
+    dispatcher y deja lo específico de cada paso en callbacks:
+
+    - validador: callable(texto) -> (es_valido, valor, error)
+    - pedir_confirmacion: corutina(message, state, valor) que pregunta
+    - repetir_pregunta: corutina(message, state) para la rama NO
+    - al_confirmar: corutina(message, state, data, valor) que consolida y
+      avanza; recibe el data ya leído para no repetir el get_data
+    """
+    @dp.message(estado_entrada)
+    async def _procesar(message: types.Message, state: FSMContext):
+        es_valido, valor, error = validador(message.text.strip())
+
+        if not es_valido:
+            await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
+            return
+
+        await state.update_data(**{clave_temp: valor})
+        # Enviar la pregunta y escribir el estado FSM en paralelo
+        await asyncio.gather(
+            pedir_confirmacion(message, state, valor),
+            state.set_state(estado_confirmar),
+        )
+
+    @dp.message(estado_confirmar)
+    async def _confirmar(message: types.Message, state: FSMContext):
+        respuesta = clasificar_confirmacion(message.text)
+
+        if respuesta == RESP_NO:
+            await repetir_pregunta(message, state)
+            await state.set_state(estado_entrada)
+            return
+
+        if respuesta == RESP_SI:
+            data = await state.get_data()
+            await al_confirmar(message, state, data, data.get(clave_temp))
+            return
+
+        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
 # 1. CÉDULA
 @dp.message(ConductoresState.cedula)
 async def procesar_cedula_conductor(message: types.Message, state: FSMContext):
@@ -1457,22 +2237,8 @@ async def procesar_cedula_conductor(message: types.Message, state: FSMContext):
         )
         return
 
-    await state.update_data(cedula=cedula)
-    await message.answer(
-        f"📋 Cédula ingresada: *{cedula}*\n\n"
-        "¿Es correcta?\n\n"
-        "1️⃣ Sí, confirmar\n"
-        "2️⃣ No, editar\n\n"
-        "Escriba el número de la opción:",
-        parse_mode="Markdown"
-    )
-    await state.set_state(ConductoresState.confirmar_cedula)
-
-@dp.message(ConductoresState.confirmar_cedula, F.text == "1")
-async def confirmar_cedula_conductor_si(message: types.Message, state: FSMContext):
-    """Confirma la cédula y verifica múltiples cédulas"""
     data = await state.get_data()
-    cedula = data.get('cedula')
+    await state.update_data(cedula=cedula)
     telegram_user_id = message.from_user.id
 
     # Verificar si hay múltiples cédulas (alerta de seguridad)
@@ -1488,6 +2254,11 @@ async def confirmar_cedula_conductor_si(message: types.Message, state: FSMContex
             tipo_operacion="Conductores"
         )
 
+    # Si viene de editar desde el resumen, volver directo al resumen
+    if data.get('editando'):
+        await mostrar_resumen_conductor(message, state)
+        return
+
     await message.answer(
         f"✅ Cédula: *{cedula}*\n\n"
         f"Ahora, ingrese la *placa del camión*:\n"
@@ -1497,26 +2268,6 @@ async def confirmar_cedula_conductor_si(message: types.Message, state: FSMContex
     )
     await state.set_state(ConductoresState.placa)
 
-@dp.message(ConductoresState.confirmar_cedula, F.text == "2")
-async def confirmar_cedula_conductor_no(message: types.Message, state: FSMContext):
-    """Permite editar la cédula"""
-    await message.answer(
-        "Por favor, ingrese nuevamente su *cédula*:",
-        reply_markup=ReplyKeyboardRemove(),
-        parse_mode="Markdown"
-    )
-    await state.set_state(ConductoresState.cedula)
-
-@dp.message(ConductoresState.confirmar_cedula)
-async def confirmar_cedula_conductor_invalido(message: types.Message, state: FSMContext):
-    """Maneja respuesta inválida en confirmación"""
-    await message.answer(
-        "⚠️ Opción no válida.\n\n"
-        "Por favor escriba:\n"
-        "1️⃣ para confirmar\n"
-        "2️⃣ para editar"
-    )
-
 # 2. PLACA
 @dp.message(ConductoresState.placa)
 async def procesar_placa_conductor(message: types.Message, state: FSMContext):
@@ -1531,91 +2282,62 @@ async def procesar_placa_conductor(message: types.Message, state: FSMContext):
         )
         return
     
-    await state.update_data(placa_temp=placa)
-    await preguntar_confirmacion(message, placa, "placa")
-    await state.set_state(ConductoresState.confirmar_placa)
-
-@dp.message(ConductoresState.confirmar_placa)
-async def confirmar_placa_conductor(message: types.Message, state: FSMContext):
-    """Confirma la placa o permite modificarla"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
+    data = await state.get_data()
+    tipo_carga = data.get("tipo_carga")
+    es_peso_vacio = data.get("es_peso_vacio", False)
+    await state.update_data(placa=placa)
+
+    # Si viene de editar desde el resumen, volver directo al resumen
+    if data.get('editando'):
+        await mostrar_resumen_conductor(message, state)
+        return
+
+    # Si es peso vacío, ir directamente a báscula
+    if es_peso_vacio:
         await message.answer(
-            "Por favor, ingrese nuevamente la *placa del camión*:\n"
-            "_(Formato: 3 letras + 3 números, ejemplo: NHU982)_",
-            reply_markup=ReplyKeyboardRemove(),
+            f"✅ Placa: *{placa}*\n\n"
+            f"📍 *SELECCIÓN DE BÁSCULA*\n\n"
+            f"¿En qué báscula se realizará el pesaje?\n\n"
+            f"1️⃣ Granja\n"
+            f"2️⃣ Bogotá\n\n"
+            f"Seleccione una opción:",
+            reply_markup=KB_GRANJA_BOGOTA,
             parse_mode="Markdown"
         )
-        await state.set_state(ConductoresState.placa)
+        await state.set_state(ConductoresState.bascula)
         return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        placa = data.get("placa_temp")
-        tipo_carga = data.get("tipo_carga")
-        es_peso_vacio = data.get("es_peso_vacio", False)
-        await state.update_data(placa=placa)
-        
-        # Si es peso vacío, ir directamente a báscula
-        if es_peso_vacio:
-            tipo_ref = data.get("tipo_carga_referencia", "")
-            keyboard = ReplyKeyboardBuilder()
-            keyboard.button(text="1. Granja")
-            keyboard.button(text="2. Bogotá")
-            keyboard.adjust(2)
-            
-            await message.answer(
-                f"✅ Placa: *{placa}*\n\n"
-                f"📍 *SELECCIÓN DE BÁSCULA*\n\n"
-                f"¿En qué báscula se realizará el pesaje?\n\n"
-                f"1️⃣ Granja\n"
-                f"2️⃣ Bogotá\n\n"
-                f"Seleccione una opción:",
-                reply_markup=keyboard.as_markup(resize_keyboard=True),
-                parse_mode="Markdown"
-            )
-            await state.set_state(ConductoresState.bascula)
-            return
-        
-        # Si NO es peso vacío, continuar con el flujo según tipo de carga
-        if tipo_carga == "Lechones" or tipo_carga == "Cerdos Gordos":
-            animal_tipo = "lechones" if tipo_carga == "Lechones" else "cerdos gordos"
-            await message.answer(
-                f"✅ Placa: *{placa}*\n\n"
-                f"¿Cuántos {animal_tipo} va a transportar?\n"
-                f"_(Ingrese solo el número)_",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="Markdown"
-            )
-            await state.set_state(ConductoresState.num_animales)
-        
-        elif tipo_carga == "Combustible":
-            keyboard = ReplyKeyboardBuilder()
-            keyboard.button(text="Diesel")
-            keyboard.button(text="Corriente")
-            keyboard.adjust(2)
-            
-            await message.answer(
-                f"✅ Placa: *{placa}*\n\n"
-                f"¿Qué tipo de combustible?\n\n"
-                f"Seleccione una opción:",
-                reply_markup=keyboard.as_markup(resize_keyboard=True),
-                parse_mode="Markdown"
-            )
-            await state.set_state(ConductoresState.tipo_combustible)
-        
-        elif tipo_carga == "Concentrado":
-            await message.answer(
-                f"✅ Placa: *{placa}*\n\n"
-                f"📋 *DATOS DE LA FACTURA*\n\n"
-                f"Por favor ingrese el *número de factura*:",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="Markdown"
-            )
-            await state.set_state(ConductoresState.numero_factura)
-    else:
-        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    # Si NO es peso vacío, continuar con el flujo según tipo de carga
+    if tipo_carga == "Lechones" or tipo_carga == "Cerdos Gordos":
+        animal_tipo = "lechones" if tipo_carga == "Lechones" else "cerdos gordos"
+        await message.answer(
+            f"✅ Placa: *{placa}*\n\n"
+            f"¿Cuántos {animal_tipo} va a transportar?\n"
+            f"_(Ingrese solo el número)_",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.num_animales)
+
+    elif tipo_carga == "Combustible":
+        await message.answer(
+            f"✅ Placa: *{placa}*\n\n"
+            f"¿Qué tipo de combustible?\n\n"
+            f"Seleccione una opción:",
+            reply_markup=KB_COMBUSTIBLE,
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.tipo_combustible)
+
+    elif tipo_carga == "Concentrado":
+        await message.answer(
+            f"✅ Placa: *{placa}*\n\n"
+            f"📋 *DATOS DE LA FACTURA*\n\n"
+            f"Por favor ingrese el *número de factura*:",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.numero_factura)
 
 # 4a. NÚMERO DE ANIMALES (para Lechones o Cerdos Gordos)
 @dp.message(ConductoresState.num_animales)
@@ -1627,87 +2349,49 @@ async def procesar_num_animales(message: types.Message, state: FSMContext):
         await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
         return
     
-    await state.update_data(num_animales_temp=cantidad)
-    await preguntar_confirmacion(message, str(cantidad), "cantidad de animales")
-    await state.set_state(ConductoresState.confirmar_num_animales)
-
-@dp.message(ConductoresState.confirmar_num_animales)
-async def confirmar_num_animales(message: types.Message, state: FSMContext):
-    """Confirma la cantidad de animales o permite modificarla"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        data = await state.get_data()
-        tipo_carga = data.get("tipo_carga")
-        animal_tipo = "lechones" if tipo_carga == "Lechones" else "cerdos gordos"
-        
-        await message.answer(
-            f"¿Cuántos {animal_tipo} va a transportar?\n"
-            f"_(Ingrese solo el número)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.num_animales)
+    data = await state.get_data()
+    await state.update_data(num_animales=cantidad)
+
+    # Si viene de editar desde el resumen, recalcular los cerdos muertos
+    # (flujo Bogotá) y volver directo al resumen
+    if data.get('editando'):
+        if 'cerdos_vivos' in data:
+            await state.update_data(cerdos_muertos=cantidad - data['cerdos_vivos'])
+        await mostrar_resumen_conductor(message, state)
         return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        cantidad = data.get("num_animales_temp")
-        await state.update_data(num_animales=cantidad)
-        
-        # Continuar al siguiente paso: selección de báscula
-        await preguntar_bascula(message, state)
-    else:
-        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    # Continuar al siguiente paso: selección de báscula
+    await preguntar_bascula(message, state)
 
 # 4b. TIPO DE COMBUSTIBLE
+# Variantes aceptadas -> valor canónico (lookup O(1), sin .title())
+_TIPOS_COMBUSTIBLE = {"diesel": "Diesel", "corriente": "Corriente"}
+
 @dp.message(ConductoresState.tipo_combustible)
 async def procesar_tipo_combustible(message: types.Message, state: FSMContext):
     """Procesa el tipo de combustible"""
-    tipo = message.text.strip().title()
-    
-    if tipo not in ["Diesel", "Corriente"]:
+    tipo = _TIPOS_COMBUSTIBLE.get(message.text.strip().lower())
+
+    if tipo is None:
         await message.answer("⚠️ Opción no válida. Seleccione Diesel o Corriente:")
         return
     
-    await state.update_data(tipo_combustible_temp=tipo)
-    await preguntar_confirmacion(message, tipo, "tipo de combustible")
-    await state.set_state(ConductoresState.confirmar_tipo_combustible)
-
-@dp.message(ConductoresState.confirmar_tipo_combustible)
-async def confirmar_tipo_combustible(message: types.Message, state: FSMContext):
-    """Confirma el tipo de combustible o permite modificarlo"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        keyboard = ReplyKeyboardBuilder()
-        keyboard.button(text="Diesel")
-        keyboard.button(text="Corriente")
-        keyboard.adjust(2)
-        
-        await message.answer(
-            "¿Qué tipo de combustible?\n\n"
-            "Seleccione una opción:",
-            reply_markup=keyboard.as_markup(resize_keyboard=True)
-        )
-        await state.set_state(ConductoresState.tipo_combustible)
+    data = await state.get_data()
+    await state.update_data(tipo_combustible=tipo)
+
+    # Si viene de editar desde el resumen, volver directo al resumen
+    if data.get('editando'):
+        await mostrar_resumen_conductor(message, state)
         return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        tipo = data.get("tipo_combustible_temp")
-        await state.update_data(tipo_combustible=tipo)
-        
-        await message.answer(
-            f"✅ Tipo de combustible: *{tipo}*\n\n"
-            f"¿Cuántos galones va a transportar?\n"
-            f"_(Puede usar decimales con coma o punto)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.cantidad_galones)
-    else:
-        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    await message.answer(
+        f"✅ Tipo de combustible: *{tipo}*\n\n"
+        f"¿Cuántos galones va a transportar?\n"
+        f"_(Puede usar decimales con coma o punto)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(ConductoresState.cantidad_galones)
 
 # 4c. CANTIDAD DE GALONES
 @dp.message(ConductoresState.cantidad_galones)
@@ -1719,97 +2403,46 @@ async def procesar_cantidad_galones(message: types.Message, state: FSMContext):
         await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
         return
     
-    await state.update_data(cantidad_galones_temp=galones)
-    await preguntar_confirmacion(message, f"{galones:,.2f} galones", "cantidad")
-    await state.set_state(ConductoresState.confirmar_cantidad_galones)
-
-@dp.message(ConductoresState.confirmar_cantidad_galones)
-async def confirmar_cantidad_galones(message: types.Message, state: FSMContext):
-    """Confirma la cantidad de galones o permite modificarla"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        await message.answer(
-            "¿Cuántos galones va a transportar?\n"
-            "_(Puede usar decimales con coma o punto)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.cantidad_galones)
+    data = await state.get_data()
+    await state.update_data(cantidad_galones=galones)
+
+    # Si viene de editar desde el resumen, volver directo al resumen
+    if data.get('editando'):
+        await mostrar_resumen_conductor(message, state)
         return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        galones = data.get("cantidad_galones_temp")
-        await state.update_data(cantidad_galones=galones)
-        
-        # Continuar a selección de báscula
-        await preguntar_bascula(message, state)
-    else:
-        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    # Continuar a selección de báscula
+    await preguntar_bascula(message, state)
 
 # 4d. DATOS DE FACTURA (para Concentrado)
 @dp.message(ConductoresState.numero_factura)
 async def procesar_numero_factura(message: types.Message, state: FSMContext):
     """Procesa el número de factura"""
     numero = message.text.strip()
-    await state.update_data(numero_factura_temp=numero)
-    
-    await preguntar_confirmacion(message, numero, "número de factura")
-    await state.set_state(ConductoresState.confirmar_numero_factura)
-
-@dp.message(ConductoresState.confirmar_numero_factura)
-async def confirmar_numero_factura(message: types.Message, state: FSMContext):
-    """Confirma el número de factura o permite modificarlo"""
-    texto = message.text.strip().lower()
-    print(f"DEBUG confirmar_numero_factura: texto='{texto}'")
-    
-    if "2" in texto or "modificar" in texto:
-        print("DEBUG: Entrando a modificar")
-        await message.answer(
-            "✏️ Ingrese nuevamente el *número de factura*:",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.numero_factura)
-        return
-    
-    if "1" in texto or "confirmar" in texto:
-        print("DEBUG: Entrando a confirmar")
-        data = await state.get_data()
-        numero = data.get("numero_factura_temp")
-        print(f"DEBUG: numero={numero}")
-        await state.update_data(numero_factura=numero)
-        
-        # Preguntar tipo de alimento
-        keyboard = ReplyKeyboardBuilder()
-        keyboard.button(text="1. Levante")
-        keyboard.button(text="2. Engorde/Medicado")
-        keyboard.button(text="3. Finalizador")
-        keyboard.adjust(1)
-        
-        print("DEBUG: Enviando mensaje de tipo de alimento")
-        await message.answer(
-            f"✅ Número de factura: *{numero}*\n\n"
-            f"📋 Seleccione el *tipo de alimento*:\n\n"
-            f"1️⃣ *Levante*\n"
-            f"2️⃣ *Engorde/Medicado*\n"
-            f"3️⃣ *Finalizador*",
-            reply_markup=keyboard.as_markup(resize_keyboard=True),
-            parse_mode="Markdown"
-        )
-        print("DEBUG: Cambiando estado a tipo_alimento")
-        await state.set_state(ConductoresState.tipo_alimento)
-        print("DEBUG: Estado cambiado exitosamente")
+    data = await state.get_data()
+    await state.update_data(numero_factura=numero)
+
+    # Si viene de editar desde el resumen, volver directo al resumen
+    if data.get('editando'):
+        await mostrar_resumen_conductor(message, state)
         return
-    
-    print("DEBUG: Opción no válida")
-    await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    # Preguntar tipo de alimento
+    await message.answer(
+        f"✅ Número de factura: *{escapar_md(numero)}*\n\n"
+        f"📋 Seleccione el *tipo de alimento*:\n\n"
+        f"1️⃣ *Levante*\n"
+        f"2️⃣ *Engorde/Medicado*\n"
+        f"3️⃣ *Finalizador*",
+        reply_markup=KB_TIPO_ALIMENTO,
+        parse_mode="Markdown"
+    )
+    await state.set_state(ConductoresState.tipo_alimento)
 
 @dp.message(ConductoresState.tipo_alimento)
 async def procesar_tipo_alimento(message: types.Message, state: FSMContext):
     """Procesa la selección del tipo de alimento"""
-    texto = message.text.strip().lower()
+    texto = normalizar_texto(message.text)
     
     tipo = None
     if "1" in texto or "levante" in texto:
@@ -1828,48 +2461,21 @@ async def procesar_tipo_alimento(message: types.Message, state: FSMContext):
         )
         return
     
-    await state.update_data(tipo_alimento_temp=tipo)
-    await preguntar_confirmacion(message, tipo, "tipo de alimento")
-    await state.set_state(ConductoresState.confirmar_tipo_alimento)
-
-@dp.message(ConductoresState.confirmar_tipo_alimento)
-async def confirmar_tipo_alimento(message: types.Message, state: FSMContext):
-    """Confirma el tipo de alimento o permite modificarlo"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        keyboard = ReplyKeyboardBuilder()
-        keyboard.button(text="1. Levante")
-        keyboard.button(text="2. Engorde/Medicado")
-        keyboard.button(text="3. Finalizador")
-        keyboard.adjust(1)
-        
-        await message.answer(
-            "✏️ Seleccione nuevamente el *tipo de alimento*:\n\n"
-            f"1️⃣ *Levante*\n"
-            f"2️⃣ *Engorde/Medicado*\n"
-            f"3️⃣ *Finalizador*",
-            reply_markup=keyboard.as_markup(resize_keyboard=True),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.tipo_alimento)
-        return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        tipo = data.get("tipo_alimento_temp")
-        await state.update_data(tipo_alimento=tipo)
-        
-        await message.answer(
-            f"✅ Tipo de alimento: *{tipo}*\n\n"
-            f"📊 Ingrese los *kilos comprados* (número):",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.kilos_comprados)
+    data = await state.get_data()
+    await state.update_data(tipo_alimento=tipo)
+
+    # Si viene de editar desde el resumen, volver directo al resumen
+    if data.get('editando'):
+        await mostrar_resumen_conductor(message, state)
         return
-    
-    await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    await message.answer(
+        f"✅ Tipo de alimento: *{tipo}*\n\n"
+        f"📊 Ingrese los *kilos comprados* (número):",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(ConductoresState.kilos_comprados)
 
 @dp.message(ConductoresState.kilos_comprados)
 async def procesar_kilos_comprados(message: types.Message, state: FSMContext):
@@ -1880,71 +2486,71 @@ async def procesar_kilos_comprados(message: types.Message, state: FSMContext):
         await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
         return
     
-    await state.update_data(kilos_comprados_temp=kilos)
-    await preguntar_confirmacion(message, f"{kilos:,.2f} kg", "kilos comprados")
-    await state.set_state(ConductoresState.confirmar_kilos_comprados)
-
-@dp.message(ConductoresState.confirmar_kilos_comprados)
-async def confirmar_kilos_comprados(message: types.Message, state: FSMContext):
-    """Confirma los kilos comprados o permite modificarlos"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        await message.answer(
-            "✏️ Ingrese nuevamente los *kilos comprados*:",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.kilos_comprados)
-        return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        kilos = data.get("kilos_comprados_temp")
-        await state.update_data(kilos_comprados=kilos)
-        
-        await message.answer(
-            f"✅ Kilos comprados: *{kilos:,.2f} kg*\n\n"
-            f"📸 Ahora envíe una *foto de la factura*:",
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.factura_foto)
+    data = await state.get_data()
+    await state.update_data(kilos_comprados=kilos)
+
+    # Si viene de editar desde el resumen, volver directo al resumen
+    if data.get('editando'):
+        await mostrar_resumen_conductor(message, state)
         return
-    
-    await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
 
-@dp.message(ConductoresState.factura_foto, F.photo)
-async def procesar_factura_foto(message: types.Message, state: FSMContext):
-    """Procesa la foto de la factura"""
-    # Obtener la foto de mayor resolución
-    photo = message.photo[-1]
-    file_id = photo.file_id
-    
-    # Descargar foto
-    file = await bot.get_file(file_id)
-    os.makedirs("imagenes_pesajes", exist_ok=True)
-    
+    await message.answer(
+        f"✅ Kilos comprados: *{kilos:,.2f} kg*\n\n"
+        f"📸 Ahora envíe una *foto de la factura*:",
+        parse_mode="Markdown"
+    )
+    await state.set_state(ConductoresState.factura_foto)
+
+# Límite de descargas + subidas a Drive simultáneas en segundo plano
+_UPLOAD_SEM = asyncio.Semaphore(4)
+
+async def persistir_foto(file_path: str, filename: str, state: FSMContext, campo: str):
+    """Sube una foto ya descargada a Drive en segundo plano.
+
+    El handler descarga la foto (lo rápido), guarda el path local en el
+    FSM y responde de inmediato; aquí se reemplaza por el enlace de Drive
+    cuando la subida termina, sin bloquear el flujo del usuario. Con la
+    foto ya en disco, el envío al grupo funciona aunque el usuario
+    confirme antes de que la subida lance.
+    """
+    try:
+        async with _UPLOAD_SEM:
+            drive_link = await asyncio.to_thread(upload_to_drive, file_path, filename)
+
+        # Solo actualizar si la sesión sigue viva (el usuario pudo terminar)
+        if drive_link and await state.get_state() is not None:
+            await state.update_data(**{campo: drive_link})
+    except Exception as e:
+        logger.exception(f"⚠️ Error subiendo foto {filename} a Drive: {e}")
+
+@dp.message(ConductoresState.factura_foto, F.photo)
+async def procesar_factura_foto(message: types.Message, state: FSMContext):
+    """Procesa la foto de la factura"""
+    # Obtener la foto de mayor resolución
+    photo = message.photo[-1]
+    file_id = photo.file_id
+
     data = await state.get_data()
     cedula = data.get("cedula")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     filename = f"factura_{cedula}_{timestamp}.jpg"
-    file_path = os.path.join("imagenes_pesajes", filename)
-    
+    file_path = os.path.join(IMG_DIR, filename)
+
+    # Descargar ya (es lo rápido); solo la subida a Drive va en segundo plano
+    file = await bot.get_file(file_id)
     await bot.download_file(file.file_path, file_path)
-    
-    # Subir a Drive
-    drive_link = upload_to_drive(file_path, filename)
-    await state.update_data(factura_foto=drive_link or file_path)
-    
+    await state.update_data(factura_foto=file_path)
+    lanzar_tarea_fondo(persistir_foto(file_path, filename, state, "factura_foto"))
+
     await message.answer(
         f"✅ Foto de factura recibida\n\n"
         f"Continuando con el registro..."
     )
-    
+
     # Continuar a selección de báscula
     await preguntar_bascula(message, state)
 
-@dp.message(ConductoresState.factura_foto)
+@dp.message(ConductoresState.factura_foto, ~F.photo)
 async def factura_foto_no_valida(message: types.Message, state: FSMContext):
     """Handler para cuando no envían una foto"""
     await message.answer("⚠️ Por favor envíe una FOTO de la factura (no texto).")
@@ -1955,41 +2561,23 @@ async def preguntar_bascula(message: types.Message, state: FSMContext):
     data = await state.get_data()
     tipo_carga = data.get("tipo_carga")
     
-    # Crear opciones de báscula según restricciones
-    keyboard = ReplyKeyboardBuilder()
-    opciones_texto = []
-    
-    # Báscula Italcol: solo para concentrado (ÚNICA OPCIÓN)
-    if tipo_carga == "Concentrado":
-        keyboard.button(text="1. Báscula Italcol")
-        opciones_texto.append("1️⃣ Báscula Italcol")
-    else:
-        # Para otros tipos de carga
-        # Báscula Bogotá: solo para cerdos gordos
-        if tipo_carga == "Cerdos Gordos":
-            keyboard.button(text="2. Bogotá")
-            opciones_texto.append("2️⃣ Bogotá")
-        
-        # Finca Tranquera: disponible para todos excepto concentrado
-        keyboard.button(text="3. Finca Tranquera")
-        opciones_texto.append("3️⃣ Finca Tranquera")
-    
-    keyboard.adjust(1)  # Una opción por fila
-    
-    opciones_str = "\n".join(opciones_texto)
-    
+    # Opciones de báscula según restricciones (teclados precalculados):
+    # Italcol solo para concentrado, Bogotá solo para cerdos gordos y
+    # Finca Tranquera para todos excepto concentrado
+    markup, opciones_str = BASCULAS_POR_CARGA.get(tipo_carga, BASCULAS_POR_CARGA[None])
+
     await message.answer(
         f"🏢 ¿Qué báscula vas a registrar para el pesaje?\n\n"
         f"{opciones_str}\n\n"
         f"Seleccione una opción:",
-        reply_markup=keyboard.as_markup(resize_keyboard=True)
+        reply_markup=markup
     )
     await state.set_state(ConductoresState.bascula)
 
 @dp.message(ConductoresState.bascula)
 async def procesar_bascula(message: types.Message, state: FSMContext):
     """Procesa la selección de báscula"""
-    texto = message.text.strip().lower()
+    texto = normalizar_texto(message.text)
     data = await state.get_data()
     tipo_carga = data.get("tipo_carga")
     
@@ -2000,7 +2588,7 @@ async def procesar_bascula(message: types.Message, state: FSMContext):
         else:
             await message.answer("⚠️ La Báscula Italcol solo está disponible para Concentrado.")
             return
-    elif "2" in texto or "bogota" in texto or "bogotá" in texto:
+    elif "2" in texto or "bogota" in texto:
         if tipo_carga == "Cerdos Gordos":
             bascula = "Bogotá"
         else:
@@ -2012,47 +2600,28 @@ async def procesar_bascula(message: types.Message, state: FSMContext):
         await message.answer("⚠️ Opción no válida. Seleccione una de las opciones disponibles.")
         return
     
-    await state.update_data(bascula_temp=bascula)
-    await preguntar_confirmacion(message, bascula, "báscula")
-    await state.set_state(ConductoresState.confirmar_bascula)
+    await state.update_data(bascula=bascula)
 
-@dp.message(ConductoresState.confirmar_bascula)
-async def confirmar_bascula(message: types.Message, state: FSMContext):
-    """Confirma la báscula o permite modificarla"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        # Volver a preguntar báscula
-        await preguntar_bascula(message, state)
-        return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        bascula = data.get("bascula_temp")
-        await state.update_data(bascula=bascula)
-        
-        # Si es Bogotá, hacer pregunta especial sobre cerdos vivos
-        if bascula == "Bogotá":
-            await message.answer(
-                f"✅ Báscula: *{bascula}*\n\n"
-                f"¿Cuántos cerdos llegan *VIVOS*?\n"
-                f"_(Ingrese solo el número)_",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="Markdown"
-            )
-            await state.set_state(ConductoresState.cerdos_vivos)
-        else:
-            # Continuar con peso normal
-            await message.answer(
-                f"✅ Báscula: *{bascula}*\n\n"
-                f"¿Cuánto pesa? _(en kilogramos)_\n"
-                f"_(Puede usar decimales con coma)_",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="Markdown"
-            )
-            await state.set_state(ConductoresState.peso)
+    # Si es Bogotá, hacer pregunta especial sobre cerdos vivos
+    if bascula == "Bogotá":
+        await message.answer(
+            f"✅ Báscula: *{bascula}*\n\n"
+            f"¿Cuántos cerdos llegan *VIVOS*?\n"
+            f"_(Ingrese solo el número)_",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.cerdos_vivos)
     else:
-        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+        # Continuar con peso normal
+        await message.answer(
+            f"✅ Báscula: *{bascula}*\n\n"
+            f"¿Cuánto pesa? _(en kilogramos)_\n"
+            f"_(Puede usar decimales con coma)_",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.peso)
 
 # 6. FLUJO ESPECIAL BOGOTÁ - Cerdos vivos
 @dp.message(ConductoresState.cerdos_vivos)
@@ -2064,116 +2633,61 @@ async def procesar_cerdos_vivos(message: types.Message, state: FSMContext):
         await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
         return
     
-    await state.update_data(cerdos_vivos_temp=cantidad_vivos)
-    await preguntar_confirmacion(message, str(cantidad_vivos), "cantidad de cerdos vivos")
-    await state.set_state(ConductoresState.confirmar_cerdos_vivos)
-
-@dp.message(ConductoresState.confirmar_cerdos_vivos)
-async def confirmar_cerdos_vivos(message: types.Message, state: FSMContext):
-    """Confirma cantidad de cerdos vivos o permite modificarla"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
+    # Obtener el total de animales para calcular los muertos
+    data = await state.get_data()
+    total_animales = data.get('num_animales', 0)
+    cerdos_muertos = total_animales - cantidad_vivos
+
+    await state.update_data(
+        cerdos_vivos=cantidad_vivos,
+        cerdos_muertos=cerdos_muertos
+    )
+
+    if cerdos_muertos > 0:
+        # ALERTA ESPECIAL si hay cerdos muertos
         await message.answer(
-            "¿Cuántos cerdos llegan *VIVOS*?\n"
-            "_(Ingrese solo el número)_",
-            reply_markup=ReplyKeyboardRemove(),
+            f"✅ Cerdos vivos: *{cantidad_vivos}*\n"
+            f"📊 Total de cerdos: *{total_animales}*\n\n"
+            f"🚨 *ALERTA: {cerdos_muertos} CERDOS MUERTOS* 🚨\n\n"
+            f"⚠️ ¡ATENCIÓN! SE DETECTARON ANIMALES MUERTOS\n"
+            f"Cantidad: *{cerdos_muertos}*",
             parse_mode="Markdown"
         )
-        await state.set_state(ConductoresState.cerdos_vivos)
-        return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        cantidad_vivos = data.get("cerdos_vivos_temp")
-        
-        # Obtener el total de animales para calcular los muertos
-        total_animales = data.get('num_animales', 0)
-        cerdos_muertos = total_animales - cantidad_vivos
-        
-        await state.update_data(
-            cerdos_vivos=cantidad_vivos,
-            cerdos_muertos=cerdos_muertos
-        )
-        
-        if cerdos_muertos > 0:
-            # ALERTA ESPECIAL si hay cerdos muertos
-            await message.answer(
-                f"✅ Cerdos vivos: *{cantidad_vivos}*\n"
-                f"📊 Total de cerdos: *{total_animales}*\n\n"
-                f"🚨 *ALERTA: {cerdos_muertos} CERDOS MUERTOS* 🚨\n\n"
-                f"⚠️ ¡ATENCIÓN! SE DETECTARON ANIMALES MUERTOS\n"
-                f"Cantidad: *{cerdos_muertos}*",
-                parse_mode="Markdown"
-            )
-        else:
-            await message.answer(
-                f"✅ Cerdos vivos: *{cantidad_vivos}*\n"
-                f"📊 Total de cerdos: *{total_animales}*\n"
-                f"✅ Sin cerdos muertos",
-                parse_mode="Markdown"
-            )
-        
-        # Continuar con el peso de los cerdos vivos
+    else:
         await message.answer(
-            f"¿Cuánto pesan los *{cantidad_vivos} cerdos VIVOS*? _(en kilogramos)_\n"
-            f"_(Puede usar decimales con coma)_",
+            f"✅ Cerdos vivos: *{cantidad_vivos}*\n"
+            f"📊 Total de cerdos: *{total_animales}*\n"
+            f"✅ Sin cerdos muertos",
             parse_mode="Markdown"
         )
-        await state.set_state(ConductoresState.peso)
-    else:
-        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    # Continuar con el peso de los cerdos vivos
+    await message.answer(
+        f"¿Cuánto pesan los *{cantidad_vivos} cerdos VIVOS*? _(en kilogramos)_\n"
+        f"_(Puede usar decimales con coma)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(ConductoresState.peso)
 
 # 7. PESO
 @dp.message(ConductoresState.peso)
 async def procesar_peso(message: types.Message, state: FSMContext):
     """Procesa el peso del pesaje"""
-    peso_texto = message.text.strip().replace(",", ".")
-    
-    try:
-        peso = float(peso_texto)
-        if peso <= 0:
-            await message.answer("⚠️ El peso debe ser mayor a 0.\n\nIntente nuevamente:")
-            return
-        if peso > 100000:
-            await message.answer("⚠️ El peso no puede superar 100,000 kg.\n\nIntente nuevamente:")
-            return
-    except ValueError:
-        await message.answer("⚠️ Peso inválido. Ingrese un número válido (puede usar decimales).\n\nIntente nuevamente:")
-        return
-    
-    await state.update_data(peso_temp=peso)
-    await preguntar_confirmacion(message, f"{peso:,.2f} kg", "peso")
-    await state.set_state(ConductoresState.confirmar_peso_input)
-
-@dp.message(ConductoresState.confirmar_peso_input)
-async def confirmar_peso_input(message: types.Message, state: FSMContext):
-    """Confirma el peso o permite modificarlo"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        await message.answer(
-            "¿Cuánto pesa? _(en kilogramos)_\n"
-            "_(Puede usar decimales con coma)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.peso)
+    es_valido, peso, error = validar_decimal(message.text.strip(), maximo=100000, nombre="El peso")
+
+    if not es_valido:
+        await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
         return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        peso = data.get("peso_temp")
-        await state.update_data(peso=peso)
-        
-        await message.answer(
-            f"✅ Peso: *{peso:,.2f} kg*\n\n"
-            f"📸 Ahora envíe una *foto del pesaje*:",
-            parse_mode="Markdown"
-        )
-        await state.set_state(ConductoresState.foto_pesaje)
-    else:
-        await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+
+    await state.update_data(peso=peso)
+
+    await message.answer(
+        f"✅ Peso: *{peso:,.2f} kg*\n\n"
+        f"📸 Ahora envíe una *foto del pesaje*:",
+        parse_mode="Markdown"
+    )
+    await state.set_state(ConductoresState.foto_pesaje)
 
 # 9. FOTO DEL PESAJE
 @dp.message(ConductoresState.foto_pesaje, F.photo)
@@ -2183,52 +2697,47 @@ async def procesar_foto_pesaje(message: types.Message, state: FSMContext):
     photo = message.photo[-1]
     file_id = photo.file_id
     
-    # Descargar foto
-    file = await bot.get_file(file_id)
-    os.makedirs("imagenes_pesajes", exist_ok=True)
-    
     data = await state.get_data()
     cedula = data.get("cedula")
     placa = data.get("placa")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     filename = f"pesaje_{placa}_{cedula}_{timestamp}.jpg"
-    file_path = os.path.join("imagenes_pesajes", filename)
-    
+    file_path = os.path.join(IMG_DIR, filename)
+
+    # Descargar ya (es lo rápido); solo la subida a Drive va en segundo plano
+    file = await bot.get_file(file_id)
     await bot.download_file(file.file_path, file_path)
-    
-    # Subir a Drive
-    drive_link = upload_to_drive(file_path, filename)
-    await state.update_data(foto_pesaje=drive_link or file_path)
-    
-    # Crear resumen para confirmación
-    resumen = crear_resumen_conductor(data)
-    
-    keyboard = ReplyKeyboardBuilder()
-    keyboard.button(text="✅ Sí, confirmar")
-    keyboard.button(text="❌ No, cancelar")
-    keyboard.adjust(1)
-    
-    await message.answer(
-        f"📋 *RESUMEN DEL REGISTRO*\n\n"
-        f"{resumen}\n\n"
-        f"¿Está seguro de este peso y la información?",
-        reply_markup=keyboard.as_markup(resize_keyboard=True),
-        parse_mode="Markdown"
-    )
-    await state.set_state(ConductoresState.confirmar_peso)
+    await state.update_data(foto_pesaje=file_path)
+    lanzar_tarea_fondo(persistir_foto(file_path, filename, state, "foto_pesaje"))
 
-@dp.message(ConductoresState.foto_pesaje)
+    # Mostrar resumen final con opciones de edición
+    await mostrar_resumen_conductor(message, state)
+
+@dp.message(ConductoresState.foto_pesaje, ~F.photo)
 async def foto_pesaje_no_valida(message: types.Message, state: FSMContext):
     """Handler para cuando no envían una foto"""
     await message.answer("⚠️ Por favor envíe una FOTO del pesaje (no texto).")
 
-# 10. CONFIRMACIÓN FINAL
+# 10. CONFIRMACIÓN FINAL (resumen con edición por campo)
 @dp.message(ConductoresState.confirmar_peso)
 async def confirmar_registro_conductor(message: types.Message, state: FSMContext):
-    """Confirma y guarda el registro del conductor"""
-    texto = message.text.strip().lower()
-    
-    if "no" in texto or "cancelar" in texto or "❌" in texto:
+    """Procesa el resumen final: confirmar, cancelar o editar un campo"""
+    texto = message.text.strip()
+    data = await state.get_data()
+    campos = data.get('campos_editables', [])
+
+    # Un número dentro del rango = editar ese campo del resumen
+    if texto.isdigit() and 1 <= int(texto) <= len(campos):
+        await reenviar_pregunta_campo(message, state, campos[int(texto) - 1])
+        return
+
+    respuesta = texto.upper()
+    if respuesta == "OK" or "CONFIRMAR" in respuesta or "✅" in respuesta:
+        # Guardar en base de datos
+        await guardar_registro_conductor(message, state, data)
+        return
+
+    if "CANCELAR" in respuesta or "❌" in respuesta:
         await message.answer(
             "❌ Registro cancelado.\n\n"
             "Volviendo al menú principal...",
@@ -2236,113 +2745,246 @@ async def confirmar_registro_conductor(message: types.Message, state: FSMContext
         )
         await volver_menu_principal(message, state)
         return
-    
-    if "si" in texto or "confirmar" in texto or "✅" in texto or "sí" in texto:
-        # Guardar en base de datos
-        data = await state.get_data()
-        await guardar_registro_conductor(message, state, data)
-    else:
-        await message.answer("⚠️ Por favor seleccione una opción válida (Sí o No).")
+
+    await message.answer(
+        "⚠️ Opción no válida.\n\n"
+        "Escriba el *número* del campo que desea editar,\n"
+        "*OK* para confirmar o *CANCELAR* para cancelar.",
+        parse_mode="Markdown"
+    )
 
 # ==================== FUNCIONES AUXILIARES CONDUCTORES ==================== #
 
+# Formateadores del resumen por tipo de carga: un diccionario de despacho
+# en lugar del if/elif encadenado sobre tipo_carga
+def _fmt_resumen_animales(data: dict) -> tuple:
+    return (f"🐷 Cantidad: {data.get('num_animales')} animales",)
+
+def _fmt_resumen_combustible(data: dict) -> tuple:
+    return (
+        f"⛽ Tipo: {data.get('tipo_combustible')}",
+        f"📊 Galones: {data.get('cantidad_galones'):,.2f}",
+    )
+
+def _fmt_resumen_concentrado(data: dict) -> tuple:
+    return (
+        f"📋 Número de factura: {escapar_md(data.get('numero_factura'))}",
+        f"📋 Tipo de alimento: {data.get('tipo_alimento')}",
+        f"📋 Kilos comprados: {data.get('kilos_comprados'):,.2f} kg",
+    )
+
+def _fmt_resumen_bogota(data: dict) -> tuple:
+    # Info especial de Bogotá
+    lineas = (f"✅ Cerdos vivos: {data.get('cerdos_vivos', 0)}",)
+    if data.get('cerdos_muertos', 0) > 0:
+        lineas += (f"🚨 Cerdos muertos: {data.get('cerdos_muertos')}",)
+    return lineas
+
+_RESUMEN_POR_CARGA = {
+    'Lechones': _fmt_resumen_animales,
+    'Cerdos Gordos': _fmt_resumen_animales,
+    'Combustible': _fmt_resumen_combustible,
+    'Concentrado': _fmt_resumen_concentrado,
+}
+
 def crear_resumen_conductor(data: dict) -> str:
     """Crea un resumen legible del registro del conductor"""
-    lineas = []
-    lineas.append(f"👤 Cédula: {data.get('cedula')}")
-    lineas.append(f"🚛 Placa: {data.get('placa')}")
-    lineas.append(f"📦 Carga: {data.get('tipo_carga')}")
-    
-    tipo_carga = data.get('tipo_carga')
-    
-    if tipo_carga in ["Lechones", "Cerdos Gordos"]:
-        lineas.append(f"🐷 Cantidad: {data.get('num_animales')} animales")
-        
+    cabecera = (
+        f"👤 Cédula: {data.get('cedula')}",
+        f"🚛 Placa: {data.get('placa')}",
+        f"📦 Carga: {data.get('tipo_carga')}",
+    )
+    fmt_carga = _RESUMEN_POR_CARGA.get(data.get('tipo_carga'))
+    cuerpo = fmt_carga(data) if fmt_carga else ()
+    cola = (
+        f"🏢 Báscula: {data.get('bascula')}",
+        *(_fmt_resumen_bogota(data) if data.get('bascula') == "Bogotá" else ()),
+        f"⚖️ Peso: {data.get('peso'):,.2f} kg",
+    )
+    return "\n".join(cabecera + cuerpo + cola)
+
+def campos_editables_conductor(data: dict) -> list:
+    """Lista (clave, etiqueta) de los campos editables según el tipo de carga"""
+    campos = [("cedula", "Cédula"), ("placa", "Placa")]
+    tipo_carga = data.get("tipo_carga")
+
+    if tipo_carga in ("Lechones", "Cerdos Gordos"):
+        campos.append(("num_animales", "Cantidad de animales"))
     elif tipo_carga == "Combustible":
-        lineas.append(f"⛽ Tipo: {data.get('tipo_combustible')}")
-        lineas.append(f"📊 Galones: {data.get('cantidad_galones'):,.2f}")
-        
+        campos.append(("tipo_combustible", "Tipo de combustible"))
+        campos.append(("cantidad_galones", "Galones"))
     elif tipo_carga == "Concentrado":
-        lineas.append(f"📋 Número de factura: {data.get('numero_factura')}")
-        lineas.append(f"📋 Tipo de alimento: {data.get('tipo_alimento')}")
-        lineas.append(f"📋 Kilos comprados: {data.get('kilos_comprados'):,.2f} kg")
-    
-    lineas.append(f"🏢 Báscula: {data.get('bascula')}")
-    
-    # Info especial de Bogotá
-    if data.get('bascula') == "Bogotá":
-        lineas.append(f"✅ Cerdos vivos: {data.get('cerdos_vivos', 0)}")
-        if data.get('cerdos_muertos', 0) > 0:
-            lineas.append(f"🚨 Cerdos muertos: {data.get('cerdos_muertos')}")
-    
-    lineas.append(f"⚖️ Peso: {data.get('peso'):,.2f} kg")
-    
-    return "\n".join(lineas)
+        campos.append(("numero_factura", "Número de factura"))
+        campos.append(("tipo_alimento", "Tipo de alimento"))
+        campos.append(("kilos_comprados", "Kilos comprados"))
 
-async def guardar_registro_conductor(message: types.Message, state: FSMContext, data: dict):
-    """Guarda el registro del conductor en la base de datos y envía notificación"""
-    
-    # Guardar en base de datos
-    conn = None
-    try:
-        conn = await get_db_connection()
-        if conn:
-            # Crear tabla si no existe
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS conductores (
-                    id SERIAL PRIMARY KEY,
-                    telegram_id BIGINT NOT NULL,
-                    cedula VARCHAR(20) NOT NULL,
-                    placa VARCHAR(10) NOT NULL,
-                    tipo_carga VARCHAR(50) NOT NULL,
-                    num_animales INTEGER,
-                    tipo_combustible VARCHAR(20),
-                    cantidad_galones DECIMAL(10, 2),
-                    factura_dato1 VARCHAR(200),
-                    factura_dato2 VARCHAR(200),
-                    factura_dato3 VARCHAR(200),
-                    factura_foto TEXT,
-                    bascula VARCHAR(50) NOT NULL,
-                    cerdos_vivos INTEGER,
-                    cerdos_muertos INTEGER,
-                    peso DECIMAL(10, 2) NOT NULL,
-                    foto_pesaje TEXT,
-                    fecha TIMESTAMP DEFAULT NOW()
-                )
-            ''')
-            
-            # Insertar registro
-            await conn.execute('''
-                INSERT INTO conductores (
-                    telegram_id, cedula, placa, tipo_carga, num_animales, tipo_combustible,
-                    cantidad_galones, factura_dato1, factura_dato2, factura_dato3,
-                    factura_foto, bascula, cerdos_vivos, cerdos_muertos, peso, foto_pesaje
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16)
-            ''', 
-                data.get('telegram_id'),
-                data.get('cedula'),
-                data.get('placa'),
-                data.get('tipo_carga'),
-                data.get('num_animales'),
-                data.get('tipo_combustible'),
-                data.get('cantidad_galones'),
-                data.get('numero_factura'),
-                data.get('tipo_alimento'),
-                data.get('kilos_comprados'),
-                data.get('factura_foto'),
-                data.get('bascula'),
-                data.get('cerdos_vivos'),
-                data.get('cerdos_muertos'),
-                data.get('peso'),
-                data.get('foto_pesaje')
+    campos.append(("bascula", "Báscula"))
+    if data.get("bascula") == "Bogotá":
+        campos.append(("cerdos_vivos", "Cerdos vivos"))
+    campos.append(("peso", "Peso"))
+
+    return campos
+
+async def mostrar_resumen_conductor(message: types.Message, state: FSMContext):
+    """Muestra el resumen final con opciones numeradas de edición por campo"""
+    data = await state.get_data()
+    campos = campos_editables_conductor(data)
+
+    # Guardar el orden de los campos para mapear el número elegido al campo
+    await state.update_data(
+        campos_editables=[clave for clave, _ in campos],
+        editando=False
+    )
+
+    opciones = "\n".join(
+        f"{i}. {etiqueta}" for i, (_, etiqueta) in enumerate(campos, 1)
+    )
+
+    await message.answer(
+        "📋 *RESUMEN DEL REGISTRO*\n"
+        "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+        f"{crear_resumen_conductor(data)}\n\n"
+        "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+        "Si desea cambiar algún campo,\n"
+        "escriba su número:\n"
+        f"{opciones}\n\n"
+        "✅ Si todo está correcto, escriba *OK*\n"
+        "❌ Para cancelar, escriba *CANCELAR*",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(ConductoresState.confirmar_peso)
+
+# Tabla de reenvío de preguntas al editar un campo del resumen:
+# (texto de la pregunta, teclado o None, estado de captura). Los campos
+# de la tabla vuelven directo al resumen tras capturarse; los casos con
+# texto dinámico o que re-recorren el flujo se tratan aparte abajo.
+_REENVIO_CAMPOS = {
+    'cedula': (
+        "Por favor, ingrese nuevamente su *cédula*:",
+        None, ConductoresState.cedula,
+    ),
+    'placa': (
+        "Por favor, ingrese nuevamente la *placa del camión*:\n"
+        "_(Formato: 3 letras + 3 números, ejemplo: NHU982)_",
+        None, ConductoresState.placa,
+    ),
+    'tipo_combustible': (
+        "¿Qué tipo de combustible?\n\n"
+        "Seleccione una opción:",
+        KB_COMBUSTIBLE, ConductoresState.tipo_combustible,
+    ),
+    'cantidad_galones': (
+        "¿Cuántos galones va a transportar?\n"
+        "_(Puede usar decimales con coma o punto)_",
+        None, ConductoresState.cantidad_galones,
+    ),
+    'numero_factura': (
+        "✏️ Ingrese nuevamente el *número de factura*:",
+        None, ConductoresState.numero_factura,
+    ),
+    'tipo_alimento': (
+        "✏️ Seleccione nuevamente el *tipo de alimento*:\n\n"
+        "1️⃣ *Levante*\n"
+        "2️⃣ *Engorde/Medicado*\n"
+        "3️⃣ *Finalizador*",
+        KB_TIPO_ALIMENTO, ConductoresState.tipo_alimento,
+    ),
+    'kilos_comprados': (
+        "✏️ Ingrese nuevamente los *kilos comprados*:",
+        None, ConductoresState.kilos_comprados,
+    ),
+}
+
+async def reenviar_pregunta_campo(message: types.Message, state: FSMContext, campo: str):
+    """Reenvía la pregunta de un campo del resumen para editarlo.
+
+    Los campos de datos vuelven directo al resumen tras capturarse
+    (bandera 'editando'); báscula, cerdos vivos y peso re-recorren el
+    resto del flujo porque el peso y la foto dependen de ellos.
+    """
+    if campo in _REENVIO_CAMPOS:
+        pregunta, markup, estado = _REENVIO_CAMPOS[campo]
+        await state.update_data(editando=True)
+        await message.answer(
+            pregunta,
+            reply_markup=markup or ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(estado)
+
+    elif campo == "num_animales":
+        data = await state.get_data()
+        await state.update_data(editando=True)
+        animal_tipo = "lechones" if data.get("tipo_carga") == "Lechones" else "cerdos gordos"
+        await message.answer(
+            f"¿Cuántos {animal_tipo} va a transportar?\n"
+            f"_(Ingrese solo el número)_",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.num_animales)
+
+    elif campo == "bascula":
+        # Cambiar de báscula implica repetir peso y foto del pesaje
+        data = await state.get_data()
+        if data.get("es_peso_vacio", False):
+            await message.answer(
+                "📍 *SELECCIÓN DE BÁSCULA*\n\n"
+                "¿En qué báscula se realizará el pesaje?\n\n"
+                "1️⃣ Granja\n"
+                "2️⃣ Bogotá\n\n"
+                "Seleccione una opción:",
+                reply_markup=KB_GRANJA_BOGOTA,
+                parse_mode="Markdown"
             )
-            
-            print("✅ Registro de conductor guardado en base de datos")
-    except Exception as e:
-        print(f"⚠️ Error guardando en base de datos: {e}")
-    finally:
-        if conn:
-            await release_db_connection(conn)
+            await state.set_state(ConductoresState.bascula)
+        else:
+            await preguntar_bascula(message, state)
+
+    elif campo == "cerdos_vivos":
+        await message.answer(
+            "¿Cuántos cerdos llegan *VIVOS*?\n"
+            "_(Ingrese solo el número)_",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.cerdos_vivos)
+
+    elif campo == "peso":
+        await message.answer(
+            "¿Cuánto pesa? _(en kilogramos)_\n"
+            "_(Puede usar decimales con coma)_",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(ConductoresState.peso)
+
+async def guardar_registro_conductor(message: types.Message, state: FSMContext, data: dict):
+    """Encola el registro del conductor para la BD y envía notificación"""
+
+    # Encolar para el flusher de registros: bajo carga se insertan por
+    # lotes (executemany o COPY) en vez de un round-trip por registro
+    colas_registros['conductores'].put_nowait((
+        data.get('telegram_id'),
+        data.get('cedula'),
+        data.get('placa'),
+        data.get('tipo_carga'),
+        data.get('num_animales'),
+        data.get('tipo_combustible'),
+        data.get('cantidad_galones'),
+        data.get('numero_factura'),
+        data.get('tipo_alimento'),
+        data.get('kilos_comprados'),
+        data.get('factura_foto'),
+        data.get('bascula'),
+        data.get('cerdos_vivos'),
+        data.get('cerdos_muertos'),
+        data.get('peso'),
+        data.get('foto_pesaje'),
+        datetime.now()
+    ))
+    logger.debug("Registro de conductor encolado para guardar")
     
     # Enviar notificación al grupo
     await enviar_notificacion_grupo_conductor(data)
@@ -2357,6 +2999,46 @@ async def guardar_registro_conductor(message: types.Message, state: FSMContext,
 
     await finalizar_flujo(message, state)
 
+# Barra roja de las alertas críticas, construida una sola vez
+_BARRA_ROJA = "🔴" * 15
+
+# Hashtags de la notificación al grupo: lookup directo en vez de
+# re-evaluar la cadena de if/elif en cada registro
+_TAGS_TIPO_CARGA = {
+    "Lechones": "#Lechones",
+    "Cerdos Gordos": "#CerdosGordos",
+    "Concentrado": "#Concentrado",
+    "Combustible": "#Combustible",
+}
+_TAGS_BASCULA = {
+    "Báscula Italcol": "#Italcol",
+    "Bogotá": "#Bogota",
+    "Finca Tranquera": "#FincaTranquera",
+}
+
+@functools.lru_cache(maxsize=32)
+def _armar_hashtags(tipo_carga: str, bascula: str, hay_muertos: bool) -> str:
+    """Arma la línea de hashtags de la notificación de conductor.
+
+    Es función pura de (tipo_carga, báscula, hay muertos) con apenas
+    24 combinaciones posibles: tras el warmup cada llamada es un lookup.
+    """
+    tags = ["#Conductores"]
+
+    tag_carga = _TAGS_TIPO_CARGA.get(tipo_carga)
+    if tag_carga:
+        tags.append(tag_carga)
+
+    tag_bascula = _TAGS_BASCULA.get(bascula)
+    if tag_bascula:
+        tags.append(tag_bascula)
+
+    if hay_muertos:
+        tags.append("#AlertaCritica")
+        tags.append("#CerdosMuertos")
+
+    return " ".join(tags)
+
 async def enviar_notificacion_grupo_conductor(data: dict):
     """Envía notificación al grupo de Telegram con la información del conductor"""
     if not GROUP_CHAT_ID:
@@ -2364,117 +3046,107 @@ async def enviar_notificacion_grupo_conductor(data: dict):
         return
 
     try:
-        tipo_carga = data.get('tipo_carga')
-        bascula = data.get('bascula')
-
-        # Construir hashtags dinámicos
-        hashtags = ["#Conductores"]
-
-        # Hashtag por tipo de carga
-        if tipo_carga == "Lechones":
-            hashtags.append("#Lechones")
-        elif tipo_carga == "Cerdos Gordos":
-            hashtags.append("#CerdosGordos")
-        elif tipo_carga == "Concentrado":
-            hashtags.append("#Concentrado")
-        elif tipo_carga == "Combustible":
-            hashtags.append("#Combustible")
-
-        # Hashtag por báscula
-        if bascula == "Báscula Italcol":
-            hashtags.append("#Italcol")
-        elif bascula == "Bogotá":
-            hashtags.append("#Bogota")
-        elif bascula == "Finca Tranquera":
-            hashtags.append("#FincaTranquera")
+        # Desempaquetar el dict una sola vez: el resto del cuerpo lee
+        # locales (LOAD_FAST) en vez de repetir data.get por campo
+        tipo_carga = data.get('tipo_carga')
+        bascula = data.get('bascula')
+        numero_factura = data.get('numero_factura')
+        peso = data.get('peso')
+        factura_foto = data.get('factura_foto')
+        foto_pesaje = data.get('foto_pesaje')
 
-        # Hashtag de alerta si hay cerdos muertos
+        # Línea de hashtags: función pura memoizada
         cerdos_muertos = data.get('cerdos_muertos', 0)
-        if cerdos_muertos > 0:
-            hashtags.append("#AlertaCritica")
-            hashtags.append("#CerdosMuertos")
-
-        # Crear mensaje
-        mensaje_lineas = ["🚛 *NUEVO REGISTRO DE CONDUCTOR*"]
-        mensaje_lineas.append(" ".join(hashtags) + "\n")
+        hashtags = _armar_hashtags(tipo_carga or '', bascula or '', cerdos_muertos > 0)
 
+        # Crear mensaje: un template f-string por bloque en vez de acumular
+        # líneas en una lista y hacer join al final
         timestamp = datetime.now().strftime("%d/%m/%Y %H:%M")
-        mensaje_lineas.append(f"📅 Fecha: {timestamp}\n")
-
-        mensaje_lineas.append(f"👤 Cédula: *{data.get('cedula')}*")
-        mensaje_lineas.append(f"🚛 Placa: *{data.get('placa')}*")
-        mensaje_lineas.append(f"📦 Tipo de carga: *{tipo_carga}*\n")
+        # Las validaciones de entrada ya impiden caracteres de Markdown en
+        # cédula y placa, pero escapar aquí garantiza que el send_message
+        # nunca falle con 400 por un registro viejo o migrado
+        cedula = escapar_md(data.get('cedula'))
+        placa = escapar_md(data.get('placa'))
+
+        mensaje = (
+            f"🚛 *NUEVO REGISTRO DE CONDUCTOR*\n"
+            f"{hashtags}\n\n"
+            f"📅 Fecha: {timestamp}\n\n"
+            f"👤 Cédula: *{cedula}*\n"
+            f"🚛 Placa: *{placa}*\n"
+            f"📦 Tipo de carga: *{tipo_carga}*\n"
+        )
 
         # Detalles según tipo de carga
         if tipo_carga in ["Lechones", "Cerdos Gordos"]:
-            mensaje_lineas.append(f"🐷 Cantidad de animales: *{data.get('num_animales')}*")
+            mensaje += f"\n🐷 Cantidad de animales: *{data.get('num_animales')}*"
 
         elif tipo_carga == "Combustible":
-            mensaje_lineas.append(f"⛽ Tipo de combustible: *{data.get('tipo_combustible')}*")
-            mensaje_lineas.append(f"📊 Cantidad: *{data.get('cantidad_galones'):,.2f} galones*")
+            mensaje += (
+                f"\n⛽ Tipo de combustible: *{data.get('tipo_combustible')}*"
+                f"\n📊 Cantidad: *{data.get('cantidad_galones'):,.2f} galones*"
+            )
 
         elif tipo_carga == "Concentrado":
-            mensaje_lineas.append("📋 *DATOS DE FACTURA:*")
-            mensaje_lineas.append(f"   • Número de factura: {data.get('numero_factura')}")
-            mensaje_lineas.append(f"   • Tipo de alimento: {data.get('tipo_alimento')}")
-            mensaje_lineas.append(f"   • Kilos comprados: {data.get('kilos_comprados'):,.2f} kg")
+            mensaje += (
+                f"\n📋 *DATOS DE FACTURA:*"
+                f"\n   • Número de factura: {escapar_md(numero_factura)}"
+                f"\n   • Tipo de alimento: {data.get('tipo_alimento')}"
+                f"\n   • Kilos comprados: {data.get('kilos_comprados'):,.2f} kg"
+            )
 
-        mensaje_lineas.append(f"\n🏢 Báscula: *{data.get('bascula')}*")
+        mensaje += f"\n\n🏢 Báscula: *{bascula}*"
 
         # Información especial de Bogotá
-        if data.get('bascula') == "Bogotá":
-            mensaje_lineas.append(f"✅ Cerdos vivos: *{data.get('cerdos_vivos', 0)}*")
+        if bascula == "Bogotá":
+            mensaje += f"\n✅ Cerdos vivos: *{data.get('cerdos_vivos', 0)}*"
 
-            cerdos_muertos = data.get('cerdos_muertos', 0)
             if cerdos_muertos > 0:
                 # ALERTA ESPECIAL EN MAYÚSCULAS CON EMOJIS
-                mensaje_lineas.append("\n" + "🔴" * 15)
-                mensaje_lineas.append(f"🚨 *¡¡¡ALERTA CRÍTICA!!!* 🚨")
-                mensaje_lineas.append(f"⚠️ *SE MURIERON {cerdos_muertos} CERDOS* ⚠️")
-                mensaje_lineas.append("🔴" * 15 + "\n")
-
-        mensaje_lineas.append(f"⚖️ Peso registrado: *{data.get('peso'):,.2f} kg*")
+                mensaje += (
+                    f"\n\n{_BARRA_ROJA}"
+                    f"\n🚨 *¡¡¡ALERTA CRÍTICA!!!* 🚨"
+                    f"\n⚠️ *SE MURIERON {cerdos_muertos} CERDOS* ⚠️"
+                    f"\n{_BARRA_ROJA}\n"
+                )
 
-        mensaje = "\n".join(mensaje_lineas)
+        mensaje += f"\n⚖️ Peso registrado: *{peso:,.2f} kg*"
 
-        # Enviar mensaje de texto
-        await bot.send_message(
+        # Despachar el texto y las fotos en paralelo: la latencia total pasa
+        # de la suma de los round-trips a Telegram al máximo de los tres
+        envios = [("mensaje", enviar_al_grupo(lambda: bot.send_message(
             chat_id=GROUP_CHAT_ID,
             text=mensaje,
             parse_mode="Markdown"
-        )
-
-        # Enviar foto de FACTURA como archivo adjunto (si existe)
-        if tipo_carga == "Concentrado" and data.get('factura_foto'):
-            factura_path = data.get('factura_foto')
-            # Si es un path local (no URL de Drive)
-            if factura_path and not factura_path.startswith('http') and os.path.exists(factura_path):
-                try:
-                    with open(factura_path, 'rb') as photo:
-                        await bot.send_photo(
-                            chat_id=GROUP_CHAT_ID,
-                            photo=types.BufferedInputFile(photo.read(), filename="factura.jpg"),
-                            caption=f"📸 Foto de Factura - {data.get('numero_factura')}"
-                        )
-                    print("✅ Foto de factura enviada al grupo")
-                except Exception as e_factura:
-                    print(f"⚠️ Error enviando foto de factura: {e_factura}")
-
-        # Enviar foto de PESAJE como archivo adjunto (si existe)
-        if data.get('foto_pesaje'):
-            pesaje_path = data.get('foto_pesaje')
-            # Si es un path local (no URL de Drive)
-            if pesaje_path and not pesaje_path.startswith('http') and os.path.exists(pesaje_path):
-                try:
-                    with open(pesaje_path, 'rb') as photo:
-                        await bot.send_photo(
-                            chat_id=GROUP_CHAT_ID,
-                            photo=types.BufferedInputFile(photo.read(), filename="pesaje.jpg"),
-                            caption=f"📸 Foto de Pesaje - {data.get('placa')} - {data.get('peso'):,.2f} kg"
-                        )
-                    print("✅ Foto de pesaje enviada al grupo")
-                except Exception as e_pesaje:
-                    print(f"⚠️ Error enviando foto de pesaje: {e_pesaje}")
+        )))]
+
+        # Foto de FACTURA como archivo adjunto (si existe y es path local, no URL de Drive)
+        if tipo_carga == "Concentrado" and factura_foto:
+            factura_path = factura_foto
+            if not factura_path.startswith('http') and await asyncio.to_thread(os.path.exists, factura_path):
+                # FSInputFile transmite el archivo por chunks sin cargarlo en memoria
+                envios.append(("foto de factura", enviar_al_grupo(lambda: bot.send_photo(
+                    chat_id=GROUP_CHAT_ID,
+                    photo=types.FSInputFile(factura_path, filename="factura.jpg"),
+                    caption=f"📸 Foto de Factura - {numero_factura}"
+                ))))
+
+        # Foto de PESAJE como archivo adjunto (si existe y es path local, no URL de Drive)
+        if foto_pesaje:
+            pesaje_path = foto_pesaje
+            if not pesaje_path.startswith('http') and await asyncio.to_thread(os.path.exists, pesaje_path):
+                envios.append(("foto de pesaje", enviar_al_grupo(lambda: bot.send_photo(
+                    chat_id=GROUP_CHAT_ID,
+                    photo=types.FSInputFile(pesaje_path, filename="pesaje.jpg"),
+                    caption=f"📸 Foto de Pesaje - {placa} - {peso:,.2f} kg"
+                ))))
+
+        resultados = await asyncio.gather(*(coro for _, coro in envios), return_exceptions=True)
+        for (etiqueta, _), resultado in zip(envios, resultados):
+            if isinstance(resultado, Exception):
+                print(f"⚠️ Error enviando {etiqueta} al grupo: {resultado}")
+            else:
+                print(f"✅ Envío de {etiqueta} al grupo completado")
 
         print("✅ Notificación completa enviada al grupo")
 
@@ -2536,63 +3208,45 @@ async def confirmar_cedula_sitio1_si(message: types.Message, state: FSMContext):
     )
     await state.set_state(OperarioSitio1State.cantidad_lechones)
 
-@dp.message(OperarioSitio1State.cantidad_lechones)
-async def procesar_cantidad_lechones(message: types.Message, state: FSMContext):
-    """Procesa la cantidad de lechones a pesar"""
-    es_valido, cantidad, error = validar_numero_entero(message.text.strip(), minimo=1, maximo=10000)
-    
-    if not es_valido:
-        await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
-        return
-    
-    await state.update_data(cantidad_lechones=cantidad)
-    
-    keyboard = ReplyKeyboardBuilder()
-    keyboard.button(text="1. Sí, confirmar")
-    keyboard.button(text="2. No, editar")
-    keyboard.adjust(2)
-    
+# CANTIDAD DE LECHONES (par procesar/confirmar vía fábrica)
+async def _preguntar_cantidad_lechones(message: types.Message, state: FSMContext, cantidad: int):
     await message.answer(
         f"Cantidad de lechones: *{cantidad}*\n\n"
         f"¿Es correcta?\n\n"
         f"1️⃣ Sí, confirmar\n"
         f"2️⃣ No, editar\n\n"
         f"Escriba el número de la opción:",
-        reply_markup=keyboard.as_markup(resize_keyboard=True),
+        reply_markup=KB_SI_CONFIRMAR_NO_EDITAR,
         parse_mode="Markdown"
     )
-    await state.set_state(OperarioSitio1State.confirmar_cantidad_lechones)
 
-@dp.message(OperarioSitio1State.confirmar_cantidad_lechones)
-async def confirmar_cantidad_lechones(message: types.Message, state: FSMContext):
-    """Confirma la cantidad de lechones o permite modificarla"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "editar" in texto or "no" in texto:
-        await message.answer(
-            "¿Cuántos *lechones* va a pesar?\n"
-            "_(Ingrese un número)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(OperarioSitio1State.cantidad_lechones)
-        return
-    
-    if "1" in texto or "confirmar" in texto or "sí" in texto or "si" in texto:
-        data = await state.get_data()
-        cantidad_lechones = data.get('cantidad_lechones')
-        
-        await message.answer(
-            f"✅ Cantidad de lechones: *{cantidad_lechones}*\n\n"
-            f"¿Cuántos *pesajes* va a registrar?\n"
-            f"_(Ejemplo: 30 pesajes)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(OperarioSitio1State.cantidad_pesajes)
-        return
-    
-    await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Editar:")
+async def _repetir_cantidad_lechones(message: types.Message, state: FSMContext):
+    await message.answer(
+        "¿Cuántos *lechones* va a pesar?\n"
+        "_(Ingrese un número)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+
+async def _confirmada_cantidad_lechones(message: types.Message, state: FSMContext, data: dict, cantidad: int):
+    await message.answer(
+        f"✅ Cantidad de lechones: *{cantidad}*\n\n"
+        f"¿Cuántos *pesajes* va a registrar?\n"
+        f"_(Ejemplo: 30 pesajes)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(OperarioSitio1State.cantidad_pesajes)
+
+registrar_paso_confirmado(
+    OperarioSitio1State.cantidad_lechones,
+    OperarioSitio1State.confirmar_cantidad_lechones,
+    lambda texto: validar_numero_entero(texto, minimo=1, maximo=10000),
+    'cantidad_lechones',
+    _preguntar_cantidad_lechones,
+    _repetir_cantidad_lechones,
+    _confirmada_cantidad_lechones,
+)
 
 @dp.message(OperarioSitio1State.confirmar_cedula, F.text == "2")
 async def confirmar_cedula_sitio1_no(message: types.Message, state: FSMContext):
@@ -2607,9 +3261,9 @@ async def confirmar_cedula_sitio1_no(message: types.Message, state: FSMContext):
 @dp.message(OperarioSitio1State.confirmar_cedula)
 async def confirmar_cedula_sitio1(message: types.Message, state: FSMContext):
     """Confirma la cédula o permite modificarla"""
-    texto = message.text.strip().lower()
+    respuesta = clasificar_confirmacion(message.text)
 
-    if "2" in texto or "modificar" in texto:
+    if respuesta == RESP_NO:
         await message.answer(
             "Por favor, ingrese nuevamente su *cédula*:",
             reply_markup=ReplyKeyboardRemove(),
@@ -2618,7 +3272,7 @@ async def confirmar_cedula_sitio1(message: types.Message, state: FSMContext):
         await state.set_state(OperarioSitio1State.cedula)
         return
 
-    if "1" in texto or "confirmar" in texto:
+    if respuesta == RESP_SI:
         data = await state.get_data()
         cedula = data.get("cedula_temp")
         await state.update_data(cedula=cedula)
@@ -2635,182 +3289,150 @@ async def confirmar_cedula_sitio1(message: types.Message, state: FSMContext):
 
     await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
 
-@dp.message(OperarioSitio1State.cantidad_pesajes)
-async def procesar_cantidad_pesajes(message: types.Message, state: FSMContext):
-    """Procesa la cantidad de pesajes"""
-    es_valido, cantidad, error = validar_numero_entero(message.text.strip(), minimo=1, maximo=1000)
-    
-    if not es_valido:
-        await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
-        return
-    
-    await state.update_data(cantidad_pesajes_temp=cantidad)
+# CANTIDAD DE PESAJES (par procesar/confirmar vía fábrica)
+async def _preguntar_cantidad_pesajes(message: types.Message, state: FSMContext, cantidad: int):
     await preguntar_confirmacion(message, str(cantidad), "cantidad de pesajes")
-    await state.set_state(OperarioSitio1State.confirmar_cantidad_pesajes)
 
-@dp.message(OperarioSitio1State.confirmar_cantidad_pesajes)
-async def confirmar_cantidad_pesajes(message: types.Message, state: FSMContext):
-    """Confirma la cantidad de pesajes o permite modificarla"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        await message.answer(
-            "¿Cuántos *pesajes* va a registrar?\n"
-            f"_(Ejemplo: 30 pesajes)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(OperarioSitio1State.cantidad_pesajes)
-        return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        cantidad = data.get("cantidad_pesajes_temp")
-        await state.update_data(cantidad_pesajes=cantidad)
-        
-        await message.answer(
-            f"✅ Cantidad de pesajes: *{cantidad}*\n\n"
-            f"¿Cuántos *lechones* hay por cada pesaje?\n"
-            f"_(Ejemplo: 10 lechones por pesaje)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(OperarioSitio1State.lechones_por_pesaje)
-        return
-    
-    await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+async def _repetir_cantidad_pesajes(message: types.Message, state: FSMContext):
+    await message.answer(
+        "¿Cuántos *pesajes* va a registrar?\n"
+        f"_(Ejemplo: 30 pesajes)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
 
-@dp.message(OperarioSitio1State.lechones_por_pesaje)
-async def procesar_lechones_por_pesaje(message: types.Message, state: FSMContext):
-    """Procesa la cantidad de lechones por pesaje"""
-    es_valido, cantidad, error = validar_numero_entero(message.text.strip(), minimo=1, maximo=100)
-    
-    if not es_valido:
-        await message.answer(f"⚠️ {error}\n\nIntente nuevamente:")
-        return
-    
-    await state.update_data(lechones_por_pesaje_temp=cantidad)
+async def _confirmada_cantidad_pesajes(message: types.Message, state: FSMContext, data: dict, cantidad: int):
+    await state.update_data(cantidad_pesajes=cantidad)
+    await message.answer(
+        f"✅ Cantidad de pesajes: *{cantidad}*\n\n"
+        f"¿Cuántos *lechones* hay por cada pesaje?\n"
+        f"_(Ejemplo: 10 lechones por pesaje)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(OperarioSitio1State.lechones_por_pesaje)
+
+registrar_paso_confirmado(
+    OperarioSitio1State.cantidad_pesajes,
+    OperarioSitio1State.confirmar_cantidad_pesajes,
+    lambda texto: validar_numero_entero(texto, minimo=1, maximo=1000),
+    'cantidad_pesajes_temp',
+    _preguntar_cantidad_pesajes,
+    _repetir_cantidad_pesajes,
+    _confirmada_cantidad_pesajes,
+)
+
+# LECHONES POR PESAJE (par procesar/confirmar vía fábrica)
+async def _preguntar_lechones_por_pesaje(message: types.Message, state: FSMContext, cantidad: int):
     await preguntar_confirmacion(message, str(cantidad), "lechones por pesaje")
-    await state.set_state(OperarioSitio1State.confirmar_lechones_por_pesaje)
-
-@dp.message(OperarioSitio1State.confirmar_lechones_por_pesaje)
-async def confirmar_lechones_por_pesaje(message: types.Message, state: FSMContext):
-    """Confirma la cantidad de lechones por pesaje"""
-    texto = message.text.strip().lower()
-    
-    if "2" in texto or "modificar" in texto:
-        await message.answer(
-            "¿Cuántos *lechones* hay por cada pesaje?",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(OperarioSitio1State.lechones_por_pesaje)
-        return
-    
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        lechones = data.get("lechones_por_pesaje_temp")
-        await state.update_data(
-            lechones_por_pesaje=lechones,
-            pesaje_actual=1,
-            pesos=[],
-            fotos=[]
-        )
-        
-        await message.answer(
-            f"✅ Lechones por pesaje: *{lechones}*\n\n"
-            f"📊 Ingrese el *peso del pesaje #1* en kilogramos:\n"
-            f"_(Este pesaje contiene {lechones} lechones)_",
-            reply_markup=ReplyKeyboardRemove(),
-            parse_mode="Markdown"
-        )
-        await state.set_state(OperarioSitio1State.peso_pesaje)
-        return
-    
-    await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
 
-@dp.message(OperarioSitio1State.peso_pesaje)
-async def procesar_peso_pesaje(message: types.Message, state: FSMContext):
-    """Procesa el peso de un pesaje"""
-    es_valido, peso, error = validar_galones(message.text.strip())  # Reutilizamos validador de decimales
+async def _repetir_lechones_por_pesaje(message: types.Message, state: FSMContext):
+    await message.answer(
+        "¿Cuántos *lechones* hay por cada pesaje?",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
 
+async def _confirmados_lechones_por_pesaje(message: types.Message, state: FSMContext, data: dict, lechones: int):
+    await state.update_data(
+        lechones_por_pesaje=lechones,
+        pesaje_actual=1,
+        pesos=[],
+        fotos=[]
+    )
+    await message.answer(
+        f"✅ Lechones por pesaje: *{lechones}*\n\n"
+        f"📊 Ingrese el *peso del pesaje #1* en kilogramos:\n"
+        f"_(Este pesaje contiene {lechones} lechones)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(OperarioSitio1State.peso_pesaje)
+
+registrar_paso_confirmado(
+    OperarioSitio1State.lechones_por_pesaje,
+    OperarioSitio1State.confirmar_lechones_por_pesaje,
+    lambda texto: validar_numero_entero(texto, minimo=1, maximo=100),
+    'lechones_por_pesaje_temp',
+    _preguntar_lechones_por_pesaje,
+    _repetir_lechones_por_pesaje,
+    _confirmados_lechones_por_pesaje,
+)
+
+# PESO DE CADA PESAJE (par procesar/confirmar vía fábrica)
+def _validar_peso_pesaje(texto: str) -> tuple[bool, float, str]:
+    es_valido, peso, _ = validar_galones(texto)  # Reutilizamos validador de decimales
     if not es_valido or peso <= 0:
-        await message.answer(
-            f"⚠️ Peso inválido. Ingrese un número válido mayor a 0 kg\n\n"
-            f"Intente nuevamente:"
-        )
-        return
+        return False, 0.0, "Peso inválido. Ingrese un número válido mayor a 0 kg"
+    return True, peso, ""
+
+async def _preguntar_peso_pesaje(message: types.Message, state: FSMContext, peso: float):
+    data = await state.get_data()
+    pesaje_actual = data.get("pesaje_actual")
+    lechones_por_pesaje = data.get("lechones_por_pesaje")
+    await preguntar_confirmacion(
+        message,
+        f"{peso:,.2f} kg",
+        f"peso del pesaje #{pesaje_actual} ({lechones_por_pesaje} lechones)"
+    )
 
+async def _repetir_peso_pesaje(message: types.Message, state: FSMContext):
     data = await state.get_data()
+    await message.answer(
+        f"📊 Ingrese nuevamente el *peso del pesaje #{data.get('pesaje_actual')}* en kilogramos:\n"
+        f"_(Este pesaje contiene {data.get('lechones_por_pesaje')} lechones)_",
+        reply_markup=ReplyKeyboardRemove(),
+        parse_mode="Markdown"
+    )
+
+async def _confirmado_peso_pesaje(message: types.Message, state: FSMContext, data: dict, peso: float):
     pesaje_actual = data.get("pesaje_actual")
+    cantidad_pesajes = data.get("cantidad_pesajes")
     lechones_por_pesaje = data.get("lechones_por_pesaje")
+    pesos = data.get("pesos", [])
 
-    await state.update_data(peso_temp=peso)
-    await preguntar_confirmacion(message, f"{peso:,.2f} kg", f"peso del pesaje #{pesaje_actual} ({lechones_por_pesaje} lechones)")
-    await state.set_state(OperarioSitio1State.confirmar_peso)
+    # Guardar peso en la lista
+    pesos.append(peso)
 
-@dp.message(OperarioSitio1State.confirmar_peso)
-async def confirmar_peso_pesaje(message: types.Message, state: FSMContext):
-    """Confirma el peso del pesaje o permite modificarlo"""
-    texto = message.text.strip().lower()
+    # Verificar si hay más pesajes
+    if pesaje_actual < cantidad_pesajes:
+        siguiente = pesaje_actual + 1
+        # Una sola escritura al storage con ambas claves
+        await state.update_data(pesos=pesos, pesaje_actual=siguiente)
 
-    if "2" in texto or "modificar" in texto:
-        data = await state.get_data()
-        pesaje_actual = data.get("pesaje_actual")
-        lechones_por_pesaje = data.get("lechones_por_pesaje")
         await message.answer(
-            f"📊 Ingrese nuevamente el *peso del pesaje #{pesaje_actual}* en kilogramos:\n"
-            f"_(Este pesaje contiene {lechones_por_pesaje} lechones)_",
+            f"✅ Pesaje #{pesaje_actual} registrado: *{peso:,.2f} kg*\n\n"
+            f"📊 Ingrese el *peso del pesaje #{siguiente}* en kilogramos:\n"
+            f"_(Progreso: {pesaje_actual}/{cantidad_pesajes} | {lechones_por_pesaje} lechones por pesaje)_",
             reply_markup=ReplyKeyboardRemove(),
             parse_mode="Markdown"
         )
         await state.set_state(OperarioSitio1State.peso_pesaje)
-        return
-
-    if "1" in texto or "confirmar" in texto:
-        data = await state.get_data()
-        peso = data.get("peso_temp")
-        pesaje_actual = data.get("pesaje_actual")
-        cantidad_pesajes = data.get("cantidad_pesajes")
-        lechones_por_pesaje = data.get("lechones_por_pesaje")
-        pesos = data.get("pesos", [])
-        
-        # Guardar peso en la lista
-        pesos.append(peso)
+    else:
+        # Todos los pesajes completados, pedir foto final
         await state.update_data(pesos=pesos)
-        
-        # Verificar si hay más pesajes
-        if pesaje_actual < cantidad_pesajes:
-            siguiente = pesaje_actual + 1
-            await state.update_data(pesaje_actual=siguiente)
-            
-            await message.answer(
-                f"✅ Pesaje #{pesaje_actual} registrado: *{peso:,.2f} kg*\n\n"
-                f"📊 Ingrese el *peso del pesaje #{siguiente}* en kilogramos:\n"
-                f"_(Progreso: {pesaje_actual}/{cantidad_pesajes} | {lechones_por_pesaje} lechones por pesaje)_",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="Markdown"
-            )
-            await state.set_state(OperarioSitio1State.peso_pesaje)
-        else:
-            # Todos los pesajes completados, pedir foto final
-            await message.answer(
-                f"✅ Pesaje #{pesaje_actual} registrado: *{peso:,.2f} kg*\n\n"
-                f"🎉 *¡Todos los {cantidad_pesajes} pesajes han sido registrados!*\n\n"
-                f"📸 Ahora envíe una *foto de confirmación* del proceso:",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode="Markdown"
-            )
-            await state.set_state(OperarioSitio1State.foto_final)
-        return
-    
-    await message.answer("⚠️ Opción no válida. Seleccione 1 para Confirmar o 2 para Modificar:")
+        await message.answer(
+            f"✅ Pesaje #{pesaje_actual} registrado: *{peso:,.2f} kg*\n\n"
+            f"🎉 *¡Todos los {cantidad_pesajes} pesajes han sido registrados!*\n\n"
+            f"📸 Ahora envíe una *foto de confirmación* del proceso:",
+            reply_markup=ReplyKeyboardRemove(),
+            parse_mode="Markdown"
+        )
+        await state.set_state(OperarioSitio1State.foto_final)
+
+registrar_paso_confirmado(
+    OperarioSitio1State.peso_pesaje,
+    OperarioSitio1State.confirmar_peso,
+    _validar_peso_pesaje,
+    'peso_temp',
+    _preguntar_peso_pesaje,
+    _repetir_peso_pesaje,
+    _confirmado_peso_pesaje,
+)
 
 @dp.message(OperarioSitio1State.foto_final, F.photo)
 async def procesar_foto_final(message: types.Message, state: FSMContext):
     """Procesa la foto final de confirmación y finaliza el registro"""
-    data = await state.get_data()
-    
     # Descargar foto
     photo = message.photo[-1]
     file = await bot.get_file(photo.file_id)
@@ -2818,12 +3440,12 @@ async def procesar_foto_final(message: types.Message, state: FSMContext):
     await bot.download_file(file.file_path, file_path)
 
     # Subir a Google Drive
-    foto_url = upload_to_drive(file_path, f"foto_confirmacion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg")
-    
-    # Eliminar archivo temporal
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    foto_url = await asyncio.to_thread(upload_to_drive, file_path, f"foto_confirmacion_{time.strftime('%Y%m%d_%H%M%S')}.jpg")
     
+    # Eliminar archivo temporal (en hilo aparte para no bloquear el loop)
+    if await asyncio.to_thread(os.path.exists, file_path):
+        await asyncio.to_thread(os.remove, file_path)
+
     # Guardar URL de foto
     await state.update_data(foto_confirmacion=foto_url if foto_url else "Sin foto")
     
@@ -2850,98 +3472,108 @@ async def finalizar_registro_sitio1(message: types.Message, state: FSMContext):
     pesos = data.get("pesos", [])
     foto_confirmacion = data.get("foto_confirmacion", "Sin foto")
     
-    # Calcular estadísticas
-    peso_total = sum(pesos)
+    # Calcular estadísticas en una sola pasada sobre la lista; los
+    # kg/lechón por pesaje se calculan aquí una vez y el notificador
+    # los recibe ya listos en lugar de repetir las divisiones
+    peso_total = math.fsum(pesos)
+    pesos_por_lechon = [peso / lechones_por_pesaje for peso in pesos]
     total_lechones = cantidad_pesajes * lechones_por_pesaje
     peso_promedio_por_lechon = peso_total / total_lechones if total_lechones > 0 else 0
     peso_promedio_por_pesaje = peso_total / len(pesos) if pesos else 0
-    
-    # Guardar en base de datos
-    await guardar_registro_sitio1(data, peso_total, peso_promedio_por_lechon, peso_promedio_por_pesaje, total_lechones)
-    
-    # Enviar notificación al grupo
-    await enviar_notificacion_grupo_sitio1(data, peso_total, peso_promedio_por_lechon, peso_promedio_por_pesaje, total_lechones)
-    
-    # Crear resumen para el usuario
-    resumen = f"✅ *REGISTRO COMPLETADO*\n\n"
-    resumen += f"👤 Cédula: *{cedula}*\n"
-    resumen += f"📊 Pesajes registrados: *{cantidad_pesajes}*\n"
-    resumen += f"🐷 Lechones por pesaje: *{lechones_por_pesaje}*\n"
-    resumen += f"🐷 Total de lechones: *{total_lechones}*\n"
-    resumen += f"⚖️ Peso total: *{peso_total:,.2f} kg*\n"
-    resumen += f"📈 Peso promedio por lechón: *{peso_promedio_por_lechon:,.2f} kg*\n"
-    resumen += f"📈 Peso promedio por pesaje: *{peso_promedio_por_pesaje:,.2f} kg*\n\n"
-    resumen += f"*DETALLE POR PESAJE:*\n\n"
-    
-    for i, peso in enumerate(pesos, 1):
-        peso_por_lechon = peso / lechones_por_pesaje
-        resumen += f"Pesaje #{i}: {peso:,.2f} kg ({peso_por_lechon:,.2f} kg/lechón)\n"
-    
+
+    # Guardar en BD y notificar al grupo en paralelo: son efectos
+    # independientes, así el tiempo total es max(BD, Telegram) y no la suma
+    resultados = await asyncio.gather(
+        guardar_registro_sitio1(data, peso_total, peso_promedio_por_lechon, peso_promedio_por_pesaje, total_lechones),
+        enviar_notificacion_grupo_sitio1(data, peso_total, peso_promedio_por_lechon, peso_promedio_por_pesaje, total_lechones, pesos_por_lechon),
+        return_exceptions=True
+    )
+    for etiqueta, resultado in zip(("guardando registro", "notificando al grupo"), resultados):
+        if isinstance(resultado, Exception):
+            logger.exception(f"⚠️ Error {etiqueta} de Sitio 1", exc_info=resultado)
+    
+    # Crear resumen para el usuario: cabecera en un solo f-string y el
+    # detalle con join, sin reconcatenar el acumulado en cada vuelta
+    partes = [
+        f"✅ *REGISTRO COMPLETADO*\n\n"
+        f"👤 Cédula: *{cedula}*\n"
+        f"📊 Pesajes registrados: *{cantidad_pesajes}*\n"
+        f"🐷 Lechones por pesaje: *{lechones_por_pesaje}*\n"
+        f"🐷 Total de lechones: *{total_lechones}*\n"
+        f"⚖️ Peso total: *{peso_total:,.2f} kg*\n"
+        f"📈 Peso promedio por lechón: *{peso_promedio_por_lechon:,.2f} kg*\n"
+        f"📈 Peso promedio por pesaje: *{peso_promedio_por_pesaje:,.2f} kg*\n\n"
+        f"*DETALLE POR PESAJE:*\n"
+    ]
+    partes.extend(
+        f"Pesaje #{i}: {peso:,.2f} kg ({por_lechon:,.2f} kg/lechón)"
+        for i, (peso, por_lechon) in enumerate(zip(pesos, pesos_por_lechon), 1)
+    )
+    resumen = "\n".join(partes)
+
     await message.answer(resumen, parse_mode="Markdown")
     await finalizar_flujo(message, state)
 
+# SQL a nivel de módulo: asyncpg cachea el prepared statement por conexión
+# mientras el string sea exactamente el mismo objeto/texto en cada llamada,
+# así PostgreSQL no repite parse/plan en cada registro
+INSERT_SITIO1_SQL = '''
+    INSERT INTO operario_fijo_granja (
+        telegram_id, cedula, cantidad_pesajes, lechones_por_pesaje, total_lechones,
+        peso_total, peso_promedio_por_lechon, peso_promedio_por_pesaje,
+        foto_confirmacion
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    RETURNING id
+'''
+
+INSERT_SITIO1_PESO_SQL = (
+    "INSERT INTO operario_fijo_granja_pesos (registro_id, pesaje_num, peso) "
+    "VALUES ($1, $2, $3)"
+)
+
 async def guardar_registro_sitio1(data: dict, peso_total: float, peso_promedio_lechon: float, peso_promedio_pesaje: float, total_lechones: int):
     """Guarda el registro en la base de datos"""
-    conn = None
     try:
-        conn = await get_db_connection()
-        if not conn:
-            print("⚠️ No se pudo conectar a la base de datos")
-            return
+        async with db_connection() as conn:
+            if not conn:
+                print("⚠️ No se pudo conectar a la base de datos")
+                return
         
-        # Crear tabla si no existe
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS operario_fijo_granja (
-                id SERIAL PRIMARY KEY,
-                telegram_id BIGINT NOT NULL,
-                cedula VARCHAR(20) NOT NULL,
-                cantidad_pesajes INTEGER NOT NULL,
-                lechones_por_pesaje INTEGER NOT NULL,
-                total_lechones INTEGER NOT NULL,
-                peso_total DECIMAL(10, 2) NOT NULL,
-                peso_promedio_por_lechon DECIMAL(10, 2) NOT NULL,
-                peso_promedio_por_pesaje DECIMAL(10, 2) NOT NULL,
-                pesos_detalle TEXT,
-                foto_confirmacion TEXT,
-                fecha TIMESTAMP DEFAULT NOW()
+            # Las tablas se crean al arrancar (init_db_tablas); aquí solo INSERT
+            pesos = data.get("pesos", [])
+            foto_confirmacion = data.get("foto_confirmacion", "Sin foto")
+
+            # Insertar registro padre
+            registro_id = await conn.fetchval(
+                INSERT_SITIO1_SQL,
+                data.get('telegram_id'),
+                data.get('cedula'),
+                data.get('cantidad_pesajes'),
+                data.get('lechones_por_pesaje'),
+                total_lechones,
+                peso_total,
+                peso_promedio_lechon,
+                peso_promedio_pesaje,
+                foto_confirmacion
             )
-        ''')
-        
-        pesos = data.get("pesos", [])
-        foto_confirmacion = data.get("foto_confirmacion", "Sin foto")
-        
-        # Convertir lista de pesos a string JSON
-        import json
-        pesos_json = json.dumps(pesos)
-        
-        # Insertar registro
-        await conn.execute('''
-            INSERT INTO operario_fijo_granja (
-                telegram_id, cedula, cantidad_pesajes, lechones_por_pesaje, total_lechones,
-                peso_total, peso_promedio_por_lechon, peso_promedio_por_pesaje,
-                pesos_detalle, foto_confirmacion
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-        ''',
-            data.get('telegram_id'),
-            data.get('cedula'),
-            data.get('cantidad_pesajes'),
-            data.get('lechones_por_pesaje'),
-            total_lechones,
-            peso_total,
-            peso_promedio_lechon,
-            peso_promedio_pesaje,
-            pesos_json,
-            foto_confirmacion
-        )
-        
-        print("✅ Registro de Sitio 1 guardado en base de datos")
+
+            # Detalle de pesos en la tabla hija, en lote
+            if pesos:
+                filas_pesos = [(registro_id, i, peso) for i, peso in enumerate(pesos, 1)]
+                if len(filas_pesos) < REGISTROS_COPY_UMBRAL:
+                    await conn.executemany(INSERT_SITIO1_PESO_SQL, filas_pesos)
+                else:
+                    await conn.copy_records_to_table(
+                        'operario_fijo_granja_pesos',
+                        records=filas_pesos,
+                        columns=('registro_id', 'pesaje_num', 'peso')
+                    )
+
+            print("✅ Registro de Sitio 1 guardado en base de datos")
     except Exception as e:
         print(f"⚠️ Error guardando en base de datos: {e}")
-    finally:
-        if conn:
-            await release_db_connection(conn)
 
-async def enviar_notificacion_grupo_sitio1(data: dict, peso_total: float, peso_promedio_lechon: float, peso_promedio_pesaje: float, total_lechones: int):
+async def enviar_notificacion_grupo_sitio1(data: dict, peso_total: float, peso_promedio_lechon: float, peso_promedio_pesaje: float, total_lechones: int, pesos_por_lechon: list = None):
     """Envía notificación al grupo de Telegram"""
     if not GROUP_CHAT_ID:
         print("⚠️ GROUP_CHAT_ID no configurado. No se enviará notificación.")
@@ -2952,7 +3584,11 @@ async def enviar_notificacion_grupo_sitio1(data: dict, peso_total: float, peso_p
         foto_confirmacion = data.get("foto_confirmacion", "Sin foto")
         cantidad_pesajes = data.get('cantidad_pesajes')
         lechones_por_pesaje = data.get('lechones_por_pesaje')
-        
+
+        # Si quien llama no pasó los kg/lechón precalculados, calcularlos aquí
+        if pesos_por_lechon is None:
+            pesos_por_lechon = [peso / lechones_por_pesaje for peso in pesos]
+
         # Crear mensaje
         mensaje = "🐷 *NUEVO REGISTRO - OPERARIO SITIO 1*\n"
         mensaje += "#Sitio1 #Lechones\n\n"
@@ -2960,7 +3596,7 @@ async def enviar_notificacion_grupo_sitio1(data: dict, peso_total: float, peso_p
         timestamp = datetime.now().strftime("%d/%m/%Y %H:%M")
         mensaje += f"📅 Fecha: {timestamp}\n\n"
 
-        mensaje += f"👤 Cédula: *{data.get('cedula')}*\n"
+        mensaje += f"👤 Cédula: *{escapar_md(data.get('cedula'))}*\n"
         mensaje += f"📦 Pesajes registrados: *{cantidad_pesajes}*\n"
         mensaje += f"🐷 Lechones por pesaje: *{lechones_por_pesaje}*\n"
         mensaje += f"🐷 Total de lechones: *{total_lechones}*\n"
@@ -2968,39 +3604,21 @@ async def enviar_notificacion_grupo_sitio1(data: dict, peso_total: float, peso_p
         mensaje += f"📊 Peso promedio por lechón: *{peso_promedio_lechon:,.2f} kg*\n"
         mensaje += f"📊 Peso promedio por pesaje: *{peso_promedio_pesaje:,.2f} kg*\n\n"
         
-        mensaje += "*DETALLE POR PESAJE:*\n"
-        for i, peso in enumerate(pesos, 1):
-            peso_por_lechon = peso / lechones_por_pesaje
-            mensaje += f"Pesaje #{i}: {peso:,.2f} kg ({peso_por_lechon:,.2f} kg/lechón)\n"
+        detalle = "\n".join(
+            f"Pesaje #{i}: {peso:,.2f} kg ({por_lechon:,.2f} kg/lechón)"
+            for i, (peso, por_lechon) in enumerate(zip(pesos, pesos_por_lechon), 1)
+        )
+        mensaje += f"*DETALLE POR PESAJE:*\n{detalle}\n"
         
         if foto_confirmacion and foto_confirmacion != "Sin foto":
             mensaje += f"\n📸 [Ver foto de confirmación]({foto_confirmacion})"
         
         # Enviar mensaje
-        await bot.send_message(
+        await enviar_al_grupo(lambda: bot.send_message(
             chat_id=GROUP_CHAT_ID,
             text=mensaje,
             parse_mode="Markdown"
-        )
-
-        # Enviar TODAS las fotos como archivos adjuntos
-        if fotos_locales:
-            for i, foto_path in enumerate(fotos_locales, 1):
-                if foto_path and os.path.exists(foto_path):
-                    try:
-                        # Calcular cuántos lechones hay en este grupo
-                        lechones_pesados = (i - 1) * lechones_por_grupo
-                        lechones_en_este_grupo = min(lechones_por_grupo, cantidad_lechones - lechones_pesados)
-
-                        with open(foto_path, 'rb') as photo:
-                            await bot.send_photo(
-                                chat_id=GROUP_CHAT_ID,
-                                photo=types.BufferedInputFile(photo.read(), filename=f"pesaje_{i}.jpg"),
-                                caption=f"📸 Pesaje #{i} - {pesos[i-1]:,.2f} kg ({lechones_en_este_grupo} lechones)"
-                            )
-                        print(f"✅ Foto del pesaje #{i} enviada al grupo")
-                    except Exception as e_foto:
-                        print(f"⚠️ Error enviando foto del pesaje #{i}: {e_foto}")
+        ))
 
         print("✅ Notificación completa de Sitio 1 enviada al grupo")
 
@@ -3092,9 +3710,23 @@ async def sitio3_get_cedula(message: types.Message, state: FSMContext):
     )
     await state.set_state(RegistroState.sitio3_confirmar_cedula)
 
-@dp.message(RegistroState.sitio3_confirmar_cedula, F.text == "1")
-async def sitio3_confirmar_cedula_si(message: types.Message, state: FSMContext):
-    """Confirma cédula y pasa a número de banda"""
+# Un solo handler por estado de confirmación: despachar sobre message.text
+# adentro evita que el router evalúe tres filtros por mensaje
+@dp.message(RegistroState.sitio3_confirmar_cedula)
+async def sitio3_confirmar_cedula(message: types.Message, state: FSMContext):
+    """Procesa la confirmación de cédula (1 confirma, 2 edita)"""
+    respuesta = (message.text or "").strip()
+
+    if respuesta == "2":
+        # Rechaza cédula y vuelve a preguntar
+        await message.answer("¿Cuál es su cédula?")
+        await state.set_state(RegistroState.sitio3_cedula)
+        return
+
+    if respuesta != "1":
+        await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
+        return
+
     # Verificar si hay múltiples cédulas (alerta de seguridad)
     data = await state.get_data()
     cedula = data.get('sitio3_cedula')
@@ -3120,23 +3752,11 @@ async def sitio3_confirmar_cedula_si(message: types.Message, state: FSMContext):
         )
 
     await message.answer(
-        "🏷️ Escriba el número de banda\n\n"
-        "_(ejemplo: 212-b1)_",
+        PROMPT_BANDA,
         parse_mode="Markdown"
     )
     await state.set_state(RegistroState.sitio3_numero_banda)
 
-@dp.message(RegistroState.sitio3_confirmar_cedula, F.text == "2")
-async def sitio3_confirmar_cedula_no(message: types.Message, state: FSMContext):
-    """Rechaza cédula y vuelve a preguntar"""
-    await message.answer("¿Cuál es su cédula?")
-    await state.set_state(RegistroState.sitio3_cedula)
-
-@dp.message(RegistroState.sitio3_confirmar_cedula)
-async def sitio3_confirmar_cedula_invalido(message: types.Message, state: FSMContext):
-    """Handler para respuestas inválidas en confirmación de cédula"""
-    await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
-
 # PASO 2: Número de Banda (sin confirmación intermedia)
 @dp.message(RegistroState.sitio3_numero_banda)
 async def sitio3_get_banda(message: types.Message, state: FSMContext):
@@ -3158,13 +3778,7 @@ async def sitio3_get_banda(message: types.Message, state: FSMContext):
     await state.update_data(sitio3_banda_temp=banda)
 
     await message.answer(
-        "📍 ¿En qué corrales van a ubicarse los lechones?\n\n"
-        "Por favor ingrese el rango en formato: *#-#*\n\n"
-        "⚠️ _Máximo 9 corrales por registro_\n\n"
-        "*Ejemplos válidos:*\n"
-        "• `1-9`\n"
-        "• `10-18`\n"
-        "• `5-10`",
+        PROMPT_RANGO_CORRALES,
         parse_mode="Markdown"
     )
     await state.set_state(RegistroState.sitio3_rango_corrales)
@@ -3173,10 +3787,9 @@ async def sitio3_get_banda(message: types.Message, state: FSMContext):
 @dp.message(RegistroState.sitio3_rango_corrales)
 async def sitio3_get_rango(message: types.Message, state: FSMContext):
     """Captura y valida rango de corrales con máximo de 9"""
-    rango = message.text.strip()
-
-    # Validar con máximo de 9 corrales
-    es_valido, mensaje_error = validar_rango_corrales(rango, max_rango=9)
+    # Validar con máximo de 9 corrales; el validador devuelve el rango
+    # ya normalizado ("01-09" -> "1-9")
+    es_valido, rango, mensaje_error = validar_rango_corrales(message.text.strip(), max_rango=9)
 
     if not es_valido:
         await message.answer(
@@ -3191,20 +3804,14 @@ async def sitio3_get_rango(message: types.Message, state: FSMContext):
     # Guardar rango y pasar a tipo de comida
     await state.update_data(sitio3_rango_temp=rango)
 
-    builder = ReplyKeyboardBuilder()
-    builder.button(text="Levante")
-    builder.button(text="Engorde / Levante 3 medicado")
-    builder.button(text="Finalizador")
-    builder.adjust(1)  # 1 botón por fila para mejor legibilidad
-
     await message.answer(
         "🍽️ ¿Qué tipo de comida están consumiendo estos animales?",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_TIPO_COMIDA_SITIO3
     )
     await state.set_state(RegistroState.sitio3_tipo_comida)
 
 # PASO 4: Tipo de Comida - Muestra resumen final con confirmación
-@dp.message(RegistroState.sitio3_tipo_comida, F.text.in_(["Levante", "Engorde / Levante 3 medicado", "Finalizador"]))
+@dp.message(RegistroState.sitio3_tipo_comida, F.text.in_(_TIPOS_COMIDA))
 async def sitio3_get_tipo_comida(message: types.Message, state: FSMContext):
     """Captura tipo de comida y muestra resumen para confirmación"""
     tipo_comida = message.text
@@ -3216,17 +3823,11 @@ async def sitio3_get_tipo_comida(message: types.Message, state: FSMContext):
     rango = data.get('sitio3_rango_temp')
 
     # Mostrar resumen de la operación con opciones de edición
-    resumen = (
-        "📋 *RESUMEN DE LA OPERACIÓN*\n"
-        "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"1️⃣ Corrales: *{rango}*\n"
-        f"2️⃣ Banda: *{banda}*\n"
-        f"3️⃣ Tipo de comida: *{tipo_comida}*\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        "Si desea cambiar alguna opción,\n"
-        "escriba el número (1, 2 o 3).\n\n"
-        "✅ Si todo está correcto, escriba *OK*"
-    )
+    resumen = RESUMEN_SITIO3_TEMPLATE.format_map({
+        'rango': rango,
+        'banda': escapar_md(banda),
+        'tipo_comida': tipo_comida,
+    })
 
     await message.answer(
         resumen,
@@ -3260,38 +3861,37 @@ async def sitio3_resumen_confirmacion(message: types.Message, state: FSMContext)
 
         await state.update_data(sitio3_corrales=corrales)
 
-        # Mostrar resumen y preguntar si desea agregar más
-        resumen = "✅ Registro guardado correctamente.\n\n"
-        resumen += "📊 *Total de bandas registradas:*\n"
-        for i, corral in enumerate(corrales, 1):
-            resumen += f"\n🔹 *Banda {i}:* {corral['banda']}\n"
-            resumen += f"   • Corrales: {corral['rango']}\n"
-            resumen += f"   • Comida: {corral['tipo_comida']}\n"
-
-        resumen += f"\n━━━━━━━━━━━━━━━━━━━━\n"
-        resumen += f"📝 *Total de bandas registradas: {len(corrales)}*\n"
+        # Mostrar resumen y preguntar si desea agregar más (list+join en vez
+        # de concatenar strings en el bucle)
+        partes = [
+            "✅ Registro guardado correctamente.\n\n"
+            "📊 *Total de bandas registradas:*\n"
+        ]
+        partes.extend(
+            f"\n🔹 *Banda {i}:* {escapar_md(corral['banda'])}\n"
+            f"   • Corrales: {corral['rango']}\n"
+            f"   • Comida: {corral['tipo_comida']}\n"
+            for i, corral in enumerate(corrales, 1)
+        )
+        partes.append(
+            "\n━━━━━━━━━━━━━━━━━━━━\n"
+            f"📝 *Total de bandas registradas: {len(corrales)}*\n"
+        )
+        resumen = "".join(partes)
 
         await message.answer(resumen, parse_mode="Markdown")
 
         # Preguntar si desea registrar otra banda
-        builder = ReplyKeyboardBuilder()
-        builder.button(text="✅ Sí, otra banda")
-        builder.button(text="❌ No, terminar")
-        builder.adjust(2)
-
         await message.answer(
             "¿Desea registrar otra banda?",
-            reply_markup=builder.as_markup(resize_keyboard=True)
+            reply_markup=KB_OTRA_BANDA
         )
         await state.set_state(RegistroState.sitio3_agregar_mas)
 
     elif respuesta == "1":
         # Editar corrales
         await message.answer(
-            "📍 ¿En qué corrales van a ubicarse los lechones?\n\n"
-            "Por favor ingrese el rango en formato: *#-#*\n\n"
-            "⚠️ _Máximo 9 corrales por registro_\n\n"
-            "Ejemplo: `1-9`",
+            PROMPT_RANGO_CORRALES,
             parse_mode="Markdown"
         )
         await state.set_state(RegistroState.sitio3_rango_corrales)
@@ -3299,23 +3899,16 @@ async def sitio3_resumen_confirmacion(message: types.Message, state: FSMContext)
     elif respuesta == "2":
         # Editar banda
         await message.answer(
-            "🏷️ Escriba el número de banda\n\n"
-            "_(ejemplo: 212-b1)_",
+            PROMPT_BANDA,
             parse_mode="Markdown"
         )
         await state.set_state(RegistroState.sitio3_numero_banda)
 
     elif respuesta == "3":
         # Editar tipo de comida
-        builder = ReplyKeyboardBuilder()
-        builder.button(text="Levante")
-        builder.button(text="Engorde / Levante 3 medicado")
-        builder.button(text="Finalizador")
-        builder.adjust(1)
-
         await message.answer(
             "🍽️ ¿Qué tipo de comida están consumiendo estos animales?",
-            reply_markup=builder.as_markup(resize_keyboard=True)
+            reply_markup=KB_TIPO_COMIDA_SITIO3
         )
         await state.set_state(RegistroState.sitio3_tipo_comida)
 
@@ -3328,69 +3921,58 @@ async def sitio3_resumen_confirmacion(message: types.Message, state: FSMContext)
         )
 
 # PASO 6: Agregar Más Bandas o Terminar
-@dp.message(RegistroState.sitio3_agregar_mas, F.text.in_(["✅ Sí, otra banda", "Sí", "Si", "1"]))
+@dp.message(RegistroState.sitio3_agregar_mas, F.text.in_(_SI_OTRA_BANDA))
 async def sitio3_agregar_otro_corral(message: types.Message, state: FSMContext):
     """Usuario quiere agregar otra banda"""
     await message.answer(
-        "🏷️ Escriba el número de banda\n\n"
-        "_(ejemplo: 212-b1)_",
+        PROMPT_BANDA,
         parse_mode="Markdown",
         reply_markup=types.ReplyKeyboardRemove()
     )
     await state.set_state(RegistroState.sitio3_numero_banda)
 
-@dp.message(RegistroState.sitio3_agregar_mas, F.text.in_(["❌ No, terminar", "No", "2"]))
-async def sitio3_terminar_registro(message: types.Message, state: FSMContext):
-    """Usuario termina el registro - Guardar en BD y notificar"""
-    await message.answer("⏳ Guardando registros...", reply_markup=types.ReplyKeyboardRemove())
-
-    data = await state.get_data()
-    cedula = data.get('sitio3_cedula')
-    corrales = data.get('sitio3_corrales', [])
-    session_id = data.get('sitio3_session_id')
-
-    if not corrales:
-        await message.answer("⚠️ No hay bandas registradas para guardar.")
-        await volver_menu_sitio3(message, state)
-        return
-
-    # Guardar en base de datos
-    conn = None
-    try:
-        conn = await get_db_connection()
-        if conn:
-            fecha_registro = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+INSERT_SITIO3_BANDA_SQL = (
+    "INSERT INTO operario_sitio3_animales "
+    "(cedula_operario, bandas, rango_corrales, tipo_comida, fecha_registro, session_id, telegram_user_id) "
+    "VALUES ($1, $2, $3, $4, $5, $6, $7)"
+)
 
-            # Insertar cada banda como una fila separada
-            telegram_user_id = message.from_user.id
-            for corral in corrales:
-                await conn.execute('''
-                    INSERT INTO operario_sitio3_animales
-                    (cedula_operario, bandas, rango_corrales, tipo_comida, fecha_registro, session_id, telegram_user_id)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7)
-                ''', cedula, corral['banda'], corral['rango'], corral['tipo_comida'], fecha_registro, session_id, telegram_user_id)
+async def _guardar_y_notificar_sitio3(cedula, corrales, session_id, telegram_user_id):
+    """Guarda las bandas en BD y notifica al grupo (corre en segundo plano)"""
+    fecha_registro, fecha_formateada = ahora_formateada()
 
-            print(f"✅ {len(corrales)} bandas guardadas en BD (session: {session_id})")
-        else:
-            print("⚠️ No se pudo obtener conexión a la base de datos")
+    async def guardar():
+        # Guardar en base de datos
+        try:
+            async with db_connection() as conn:
+                if conn:
+                    # Insertar todas las bandas en lote (un solo round-trip por tanda)
+                    filas = [
+                        (cedula, corral['banda'], corral['rango'], corral['tipo_comida'], fecha_registro, session_id, telegram_user_id)
+                        for corral in corrales
+                    ]
+                    if len(filas) < REGISTROS_COPY_UMBRAL:
+                        await conn.executemany(INSERT_SITIO3_BANDA_SQL, filas)
+                    else:
+                        await conn.copy_records_to_table(
+                            'operario_sitio3_animales',
+                            records=filas,
+                            columns=('cedula_operario', 'bandas', 'rango_corrales', 'tipo_comida', 'fecha_registro', 'session_id', 'telegram_user_id')
+                        )
 
-    except Exception as e:
-        print(f"❌ Error guardando en base de datos: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if conn:
-            await release_db_connection(conn)
+                    logger.info("✅ %s bandas guardadas en BD (session: %s)", len(corrales), session_id)
+                else:
+                    logger.warning("⚠️ No se pudo obtener conexión a la base de datos")
 
-    # Calcular totales
-    total_bandas = len(corrales)
+        except Exception:
+            logger.exception("❌ Error guardando en base de datos")
 
-    # Generar notificación para el grupo de Telegram
-    if GROUP_CHAT_ID:
+    async def notificar():
+        # Generar notificación para el grupo de Telegram
+        if not GROUP_CHAT_ID:
+            return
         try:
-            fecha_formateada = datetime.now().strftime('%d/%m/%Y %H:%M')
-
-            mensaje_grupo = (
+            partes = [
                 "🐷 *NUEVO REGISTRO DE CONSUMO POR LOTE - SITIO 3*\n"
                 "#Sitio3 #ConsumoLote\n"
                 "━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
@@ -3398,35 +3980,53 @@ async def sitio3_terminar_registro(message: types.Message, state: FSMContext):
                 f"🕒 Fecha: {fecha_formateada}\n\n"
                 "📊 *BANDAS REGISTRADAS:*\n"
                 "━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+            ]
+            partes.extend(
+                f"🔹 *Banda {i}:* {escapar_md(corral['banda'])}\n"
+                f"   • Corrales: {corral['rango']}\n"
+                f"   • Comida: {corral['tipo_comida']}\n\n"
+                for i, corral in enumerate(corrales, 1)
             )
-
-            for i, corral in enumerate(corrales, 1):
-                mensaje_grupo += (
-                    f"🔹 *Banda {i}:* {corral['banda']}\n"
-                    f"   • Corrales: {corral['rango']}\n"
-                    f"   • Comida: {corral['tipo_comida']}\n\n"
-                )
-
-            mensaje_grupo += (
+            partes.append(
                 "━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📝 *Total de bandas registradas: {total_bandas}*"
+                f"📝 *Total de bandas registradas: {len(corrales)}*"
             )
+            mensaje_grupo = "".join(partes)
 
-            await bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown")
-            print("✅ Notificación enviada al grupo")
+            await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown"))
+            logger.info("✅ Notificación enviada al grupo")
 
         except Exception as e:
-            print(f"⚠️ Error al enviar notificación al grupo: {e}")
+            logger.warning("⚠️ Error al enviar notificación al grupo: %s", e)
 
-    # Mostrar resumen al usuario
+    # El INSERT y el aviso al grupo no dependen entre sí: solapar ambas esperas
+    await asyncio.gather(guardar(), notificar())
+
+@dp.message(RegistroState.sitio3_agregar_mas, F.text.in_(_NO_TERMINAR))
+async def sitio3_terminar_registro(message: types.Message, state: FSMContext):
+    """Usuario termina el registro - Responder ya; BD y grupo en segundo plano"""
+    data = await state.get_data()
+    cedula = data.get('sitio3_cedula')
+    corrales = data.get('sitio3_corrales', [])
+    session_id = data.get('sitio3_session_id')
+
+    if not corrales:
+        await message.answer("⚠️ No hay bandas registradas para guardar.", reply_markup=types.ReplyKeyboardRemove())
+        await volver_menu_sitio3(message, state)
+        return
+
+    # Mostrar resumen al usuario de inmediato
     resumen_usuario = (
         "✅ *Registro completado exitosamente*\n\n"
         "📊 *Resumen:*\n\n"
-        f"• Total de bandas registradas: {total_bandas}\n\n"
+        f"• Total de bandas registradas: {len(corrales)}\n\n"
         "Gracias por registrar la información."
     )
 
-    await message.answer(resumen_usuario, parse_mode="Markdown")
+    await message.answer(resumen_usuario, parse_mode="Markdown", reply_markup=types.ReplyKeyboardRemove())
+
+    # Guardado y notificación siguen en segundo plano
+    lanzar_tarea_fondo(_guardar_y_notificar_sitio3(cedula, corrales, session_id, message.from_user.id))
 
     # Finalizar flujo
     await asyncio.sleep(1)
@@ -3464,9 +4064,21 @@ async def descarga_get_cedula(message: types.Message, state: FSMContext):
     )
     await state.set_state(RegistroState.descarga_confirmar_cedula)
 
-@dp.message(RegistroState.descarga_confirmar_cedula, F.text == "1")
-async def descarga_confirmar_cedula_si(message: types.Message, state: FSMContext):
-    """Confirma cédula y pasa a cantidad de lechones"""
+@dp.message(RegistroState.descarga_confirmar_cedula)
+async def descarga_confirmar_cedula(message: types.Message, state: FSMContext):
+    """Procesa la confirmación de cédula (1 confirma, 2 edita)"""
+    respuesta = (message.text or "").strip()
+
+    if respuesta == "2":
+        # Rechaza cédula y vuelve a preguntar
+        await message.answer("¿Cuál es su cédula?")
+        await state.set_state(RegistroState.descarga_cedula)
+        return
+
+    if respuesta != "1":
+        await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
+        return
+
     # Verificar si hay múltiples cédulas (alerta de seguridad)
     data = await state.get_data()
     cedula = data.get('descarga_cedula')
@@ -3501,17 +4113,6 @@ async def descarga_confirmar_cedula_si(message: types.Message, state: FSMContext
     )
     await state.set_state(RegistroState.descarga_cantidad_lechones)
 
-@dp.message(RegistroState.descarga_confirmar_cedula, F.text == "2")
-async def descarga_confirmar_cedula_no(message: types.Message, state: FSMContext):
-    """Rechaza cédula y vuelve a preguntar"""
-    await message.answer("¿Cuál es su cédula?")
-    await state.set_state(RegistroState.descarga_cedula)
-
-@dp.message(RegistroState.descarga_confirmar_cedula)
-async def descarga_confirmar_cedula_invalido(message: types.Message, state: FSMContext):
-    """Handler para respuestas inválidas en confirmación de cédula"""
-    await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
-
 # PASO 2: Cantidad de Lechones
 @dp.message(RegistroState.descarga_cantidad_lechones)
 async def descarga_get_cantidad(message: types.Message, state: FSMContext):
@@ -3587,9 +4188,8 @@ async def descarga_confirmar_cantidad_invalido(message: types.Message, state: FS
 @dp.message(RegistroState.descarga_rango_corrales)
 async def descarga_get_rango(message: types.Message, state: FSMContext):
     """Captura y valida rango de corrales"""
-    rango = message.text.strip()
-
-    es_valido, mensaje_error = validar_rango_corrales(rango)
+    # El validador devuelve el rango ya normalizado ("01-09" -> "1-9")
+    es_valido, rango, mensaje_error = validar_rango_corrales(message.text.strip())
 
     if not es_valido:
         await message.answer(
@@ -3618,12 +4218,7 @@ async def descarga_get_rango(message: types.Message, state: FSMContext):
 async def descarga_confirmar_rango_si(message: types.Message, state: FSMContext):
     """Confirma rango y pasa a número de lote"""
     await message.answer(
-        "🏷️ Ingrese el número de LOTE\n\n"
-        "⚠️ Nota: El lote es el identificador único\n"
-        "de este grupo de animales para trazabilidad.\n\n"
-        "Formato típico: YYYY-NNN\n"
-        "Ejemplos: 2024-001, 2024-045, 2025-123\n\n"
-        "Número de lote:"
+        MSG_PEDIR_LOTE
     )
     await state.set_state(RegistroState.descarga_numero_lote)
 
@@ -3673,7 +4268,7 @@ async def descarga_get_lote(message: types.Message, state: FSMContext):
 
     await state.update_data(descarga_lote=numero_lote)
     await message.answer(
-        f"🏷️ Lote: *{numero_lote}*\n\n"
+        f"🏷️ Lote: *{escapar_md(numero_lote)}*\n\n"
         "¿Es correcto?\n\n"
         "1️⃣ Sí, confirmar\n"
         "2️⃣ No, editar\n\n"
@@ -3682,52 +4277,36 @@ async def descarga_get_lote(message: types.Message, state: FSMContext):
     )
     await state.set_state(RegistroState.descarga_confirmar_lote)
 
-@dp.message(RegistroState.descarga_confirmar_lote, F.text == "1")
-async def descarga_confirmar_lote_si(message: types.Message, state: FSMContext):
-    """Confirma lote y procede a guardar"""
-    await message.answer("⏳ Guardando registro de descarga...")
-
-    data = await state.get_data()
-    cedula = data.get('descarga_cedula')
-    cantidad = data.get('descarga_cantidad')
-    rango_corrales = data.get('descarga_rango')
-    numero_lote = data.get('descarga_lote')
-
-    # Generar identificador LOTE+CORRAL
-    identificador = f"{numero_lote}+{rango_corrales}"
+INSERT_DESCARGA_SQL = (
+    "INSERT INTO operario_sitio3_descarga_animales "
+    "(cedula_operario, cantidad_lechones, rango_corrales, numero_lote, identificador, fecha_registro, telegram_user_id) "
+    "VALUES ($1, $2, $3, $4, $5, $6, $7)"
+)
 
-    # Guardar en base de datos
-    conn = None
-    try:
-        conn = await get_db_connection()
-        if conn:
-            fecha_registro = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            telegram_user_id = message.from_user.id
+async def _guardar_y_notificar_descarga(cedula, cantidad, rango_corrales, numero_lote, identificador, telegram_user_id):
+    """Guarda la descarga en BD y notifica al grupo (corre en segundo plano)"""
+    fecha_registro, fecha_formateada = ahora_formateada()
 
-            # Insertar registro
-            await conn.execute('''
-                INSERT INTO operario_sitio3_descarga_animales
-                (cedula_operario, cantidad_lechones, rango_corrales, numero_lote, identificador, fecha_registro, telegram_user_id)
-                VALUES ($1, $2, $3, $4, $5, $6, $7)
-            ''', cedula, cantidad, rango_corrales, numero_lote, identificador, fecha_registro, telegram_user_id)
+    async def guardar():
+        # Guardar en base de datos
+        try:
+            async with db_connection() as conn:
+                if conn:
+                    # Insertar registro
+                    await conn.execute(INSERT_DESCARGA_SQL, cedula, cantidad, rango_corrales, numero_lote, identificador, fecha_registro, telegram_user_id)
 
-            print(f"✅ Descarga guardada en BD: {identificador}")
-        else:
-            print("⚠️ No se pudo obtener conexión a la base de datos")
+                    logger.info("✅ Descarga guardada en BD: %s", identificador)
+                else:
+                    logger.warning("⚠️ No se pudo obtener conexión a la base de datos")
 
-    except Exception as e:
-        print(f"❌ Error guardando en base de datos: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if conn:
-            await release_db_connection(conn)
+        except Exception:
+            logger.exception("❌ Error guardando en base de datos")
 
-    # Generar notificación para el grupo de Telegram
-    if GROUP_CHAT_ID:
+    async def notificar():
+        # Generar notificación para el grupo de Telegram
+        if not GROUP_CHAT_ID:
+            return
         try:
-            fecha_formateada = datetime.now().strftime('%d/%m/%Y %H:%M')
-
             mensaje_grupo = (
                 "🚚 *NUEVA DESCARGA DE LECHONES - SITIO 3*\n"
                 "━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
@@ -3743,11 +4322,29 @@ async def descarga_confirmar_lote_si(message: types.Message, state: FSMContext):
                 "✅ Descarga registrada exitosamente"
             )
 
-            await bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown")
-            print("✅ Notificación enviada al grupo")
+            await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown"))
+            logger.info("✅ Notificación enviada al grupo")
 
         except Exception as e:
-            print(f"⚠️ Error al enviar notificación al grupo: {e}")
+            logger.warning("⚠️ Error al enviar notificación al grupo: %s", e)
+
+    # El INSERT y el aviso al grupo no dependen entre sí: solapar ambas esperas
+    await asyncio.gather(guardar(), notificar())
+
+@dp.message(RegistroState.descarga_confirmar_lote, F.text == "1")
+async def descarga_confirmar_lote_si(message: types.Message, state: FSMContext):
+    """Confirma lote, responde ya y guarda/notifica en segundo plano"""
+    data = await state.get_data()
+    cedula = data.get('descarga_cedula')
+    cantidad = data.get('descarga_cantidad')
+    rango_corrales = data.get('descarga_rango')
+    numero_lote = data.get('descarga_lote')
+
+    # Generar identificador LOTE+CORRAL
+    identificador = f"{numero_lote}+{rango_corrales}"
+
+    # Guardado y notificación siguen en segundo plano
+    lanzar_tarea_fondo(_guardar_y_notificar_descarga(cedula, cantidad, rango_corrales, numero_lote, identificador, message.from_user.id))
 
     # Mostrar resumen al usuario
     resumen_usuario = (
@@ -3771,12 +4368,7 @@ async def descarga_confirmar_lote_si(message: types.Message, state: FSMContext):
 async def descarga_confirmar_lote_no(message: types.Message, state: FSMContext):
     """Rechaza lote y vuelve a preguntar"""
     await message.answer(
-        "🏷️ Ingrese el número de LOTE\n\n"
-        "⚠️ Nota: El lote es el identificador único\n"
-        "de este grupo de animales para trazabilidad.\n\n"
-        "Formato típico: YYYY-NNN\n"
-        "Ejemplos: 2024-001, 2024-045, 2025-123\n\n"
-        "Número de lote:"
+        MSG_PEDIR_LOTE
     )
     await state.set_state(RegistroState.descarga_numero_lote)
 
@@ -3790,37 +4382,42 @@ async def descarga_confirmar_lote_invalido(message: types.Message, state: FSMCon
 # ==================== OPERARIO SITIO 3 - INGRESO CONCENTRADO EN SILO ==================== #
 
 # Validación de peso en kilos para descargue (máximo 25000 kg)
+# El fullmatch previo evita el try/except de float(): levantar la excepción
+# con entrada basura es mucho más caro que el chequeo con regex compilada
+_PESO_DESCARGUE_RE = re.compile(r"\d{1,5}(?:[.,]\d{1,2})?")
+
+@functools.lru_cache(maxsize=1024)
 def validar_peso_kilos_descargue(valor: str) -> tuple[bool, float, str]:
     """
     Valida peso de descargue en kilos: decimal positivo, máximo 25000 kg
     Retorna: (es_valido, peso, mensaje_error)
     """
-    valor_normalizado = valor.replace(",", ".")
-    try:
-        peso = float(valor_normalizado)
-        if peso <= 0:
-            return False, 0.0, "El peso debe ser mayor a 0"
-        if peso > 25000:
-            return False, 0.0, "El peso no puede superar 25,000 kilos"
-        peso = round(peso, 2)
-        return True, peso, ""
-    except ValueError:
+    valor_limpio = valor.strip()
+    if not _PESO_DESCARGUE_RE.fullmatch(valor_limpio):
         return False, 0.0, "Debe ingresar un número válido (use punto o coma para decimales)"
 
+    entera, _, decimales = valor_limpio.replace(",", ".").partition(".")
+    peso = int(entera) + (int(decimales.ljust(2, "0")) / 100 if decimales else 0.0)
+    if peso <= 0:
+        return False, 0.0, "El peso debe ser mayor a 0"
+    if peso > 25000:
+        return False, 0.0, "El peso no puede superar 25,000 kilos"
+    return True, peso, ""
+
 # Validación de silo único (1-6)
+@functools.lru_cache(maxsize=1024)
 def validar_silo_unico(valor: str) -> tuple[bool, int, str]:
     """
     Valida que se ingrese un solo número de silo (1-6)
     Retorna: (es_valido, numero_silo, mensaje_error)
     """
     valor_limpio = valor.strip()
-    try:
-        silo = int(valor_limpio)
-        if silo < 1 or silo > 6:
-            return False, 0, "El número de silo debe estar entre 1 y 6"
-        return True, silo, ""
-    except ValueError:
-        return False, 0, "Debe ingresar un número de silo válido (1-6)"
+    # Comparación directa sobre el string: evita int() + try/except por mensaje
+    if len(valor_limpio) == 1 and "1" <= valor_limpio <= "6":
+        return True, int(valor_limpio), ""
+    if valor_limpio.isdigit():
+        return False, 0, "El número de silo debe estar entre 1 y 6"
+    return False, 0, "Debe ingresar un número de silo válido (1-6)"
 
 # PASO 1: Cédula
 @dp.message(RegistroState.medicion_cedula)
@@ -3847,9 +4444,21 @@ async def medicion_get_cedula(message: types.Message, state: FSMContext):
     )
     await state.set_state(RegistroState.medicion_confirmar_cedula)
 
-@dp.message(RegistroState.medicion_confirmar_cedula, F.text == "1")
-async def medicion_confirmar_cedula_si(message: types.Message, state: FSMContext):
-    """Confirma cédula y pasa a selección de silo"""
+@dp.message(RegistroState.medicion_confirmar_cedula)
+async def medicion_confirmar_cedula(message: types.Message, state: FSMContext):
+    """Procesa la confirmación de cédula (1 confirma, 2 edita)"""
+    respuesta = (message.text or "").strip()
+
+    if respuesta == "2":
+        # Rechaza cédula y vuelve a preguntar
+        await message.answer("¿Cuál es su cédula?")
+        await state.set_state(RegistroState.medicion_cedula)
+        return
+
+    if respuesta != "1":
+        await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
+        return
+
     data = await state.get_data()
     cedula = data.get('medicion_cedula')
     telegram_user_id = message.from_user.id
@@ -3873,38 +4482,18 @@ async def medicion_confirmar_cedula_si(message: types.Message, state: FSMContext
             tipo_operacion="Ingreso concentrado en silo"
         )
 
-    # Crear teclado con opciones de silos
-    builder = ReplyKeyboardBuilder()
-    builder.button(text="1")
-    builder.button(text="2")
-    builder.button(text="3")
-    builder.button(text="4")
-    builder.button(text="5")
-    builder.button(text="6")
-    builder.adjust(3)  # 3 botones por fila
-
     await message.answer(
         "📦 *Selección de Silo*\n\n"
         "La granja tiene 6 silos disponibles.\n"
         "Seleccione UN silo para registrar el ingreso:\n\n"
         "Escriba el número del silo (1-6):",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_SILOS
     )
     await state.set_state(RegistroState.medicion_seleccion_silos)
 
-@dp.message(RegistroState.medicion_confirmar_cedula, F.text == "2")
-async def medicion_confirmar_cedula_no(message: types.Message, state: FSMContext):
-    """Rechaza cédula y vuelve a preguntar"""
-    await message.answer("¿Cuál es su cédula?")
-    await state.set_state(RegistroState.medicion_cedula)
-
-@dp.message(RegistroState.medicion_confirmar_cedula)
-async def medicion_confirmar_cedula_invalido(message: types.Message, state: FSMContext):
-    await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
-
 # PASO 2: Selección de UN solo silo
-@dp.message(RegistroState.medicion_seleccion_silos, F.text.in_(["1", "2", "3", "4", "5", "6"]))
+@dp.message(RegistroState.medicion_seleccion_silos, F.text.in_(_SILOS_VALIDOS))
 async def medicion_get_silo(message: types.Message, state: FSMContext):
     """Captura y valida selección de silo único"""
     seleccion = message.text.strip()
@@ -3940,35 +4529,20 @@ async def medicion_silo_invalido(message: types.Message, state: FSMContext):
 @dp.message(RegistroState.medicion_confirmar_silos, F.text == "1")
 async def medicion_confirmar_silo_si(message: types.Message, state: FSMContext):
     """Confirma silo y pasa a tipo de alimento"""
-    builder = ReplyKeyboardBuilder()
-    builder.button(text="Levante")
-    builder.button(text="Engorde / Levante 3 medicado")
-    builder.button(text="Finalizador")
-    builder.adjust(1)
-
     await message.answer(
         "🍽️ ¿Qué tipo de alimento va a ingresar?",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_TIPO_COMIDA_SITIO3
     )
     await state.set_state(RegistroState.medicion_tipo_comida)
 
 @dp.message(RegistroState.medicion_confirmar_silos, F.text == "2")
 async def medicion_confirmar_silo_no(message: types.Message, state: FSMContext):
     """Rechaza silo y vuelve a preguntar"""
-    builder = ReplyKeyboardBuilder()
-    builder.button(text="1")
-    builder.button(text="2")
-    builder.button(text="3")
-    builder.button(text="4")
-    builder.button(text="5")
-    builder.button(text="6")
-    builder.adjust(3)
-
     await message.answer(
         "📦 *Selección de Silo*\n\n"
         "Escriba el número del silo (1-6):",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_SILOS
     )
     await state.set_state(RegistroState.medicion_seleccion_silos)
 
@@ -3977,7 +4551,7 @@ async def medicion_confirmar_silo_invalido(message: types.Message, state: FSMCon
     await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
 
 # PASO 3: Tipo de Alimento
-@dp.message(RegistroState.medicion_tipo_comida, F.text.in_(["Levante", "Engorde / Levante 3 medicado", "Finalizador"]))
+@dp.message(RegistroState.medicion_tipo_comida, F.text.in_(_TIPOS_COMIDA))
 async def medicion_get_tipo_comida(message: types.Message, state: FSMContext):
     """Captura tipo de alimento y pasa a peso de descargue"""
     tipo_comida = message.text
@@ -4062,6 +4636,30 @@ async def medicion_confirmar_peso_no(message: types.Message, state: FSMContext):
 async def medicion_confirmar_peso_invalido(message: types.Message, state: FSMContext):
     await message.answer("⚠️ Por favor escriba 1 para confirmar o 2 para editar.")
 
+async def persistir_foto_silo(file_path: str, filename: str, state: FSMContext):
+    """Sube la factura de un silo (ya descargada) a Drive en segundo plano.
+
+    Como persistir_foto, pero el enlace vive dentro de la lista
+    medicion_silos_procesados: se reemplaza la entrada cuya foto_local
+    coincida, si la sesión sigue viva cuando la subida termina.
+    """
+    try:
+        async with _UPLOAD_SEM:
+            drive_link = None
+            if GOOGLE_CREDENTIALS_PATH and os.path.exists(GOOGLE_CREDENTIALS_PATH) and GOOGLE_FOLDER_ID:
+                drive_link = await asyncio.to_thread(upload_to_drive, file_path, filename)
+
+        if drive_link and await state.get_state() is not None:
+            data = await state.get_data()
+            silos = data.get('medicion_silos_procesados', [])
+            for s in silos:
+                if s.get('foto_local') == file_path:
+                    s['foto_factura'] = drive_link
+                    await state.update_data(medicion_silos_procesados=silos)
+                    break
+    except Exception as e:
+        logger.exception(f"⚠️ Error subiendo foto {filename} a Drive: {e}")
+
 # PASO 5: Foto de Factura
 @dp.message(RegistroState.medicion_foto_factura, F.photo)
 async def medicion_guardar_foto_factura(message: types.Message, state: FSMContext):
@@ -4071,33 +4669,25 @@ async def medicion_guardar_foto_factura(message: types.Message, state: FSMContex
 
     try:
         photo = message.photo[-1]
-        file_info = await bot.get_file(photo.file_id)
 
-        images_folder = "imagenes_pesajes"
-        if not os.path.exists(images_folder):
-            os.makedirs(images_folder)
-
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
         cedula = data.get('medicion_cedula', 'SIN_CEDULA')
         file_name = f"factura_silo{silo}_{cedula}_{timestamp}.jpg"
-        local_file_path = os.path.join(images_folder, file_name)
-
-        await bot.download_file(file_info.file_path, destination=local_file_path)
+        local_file_path = os.path.join(IMG_DIR, file_name)
         absolute_path = os.path.abspath(local_file_path)
 
-        drive_link = None
-        if GOOGLE_CREDENTIALS_PATH and os.path.exists(GOOGLE_CREDENTIALS_PATH) and GOOGLE_FOLDER_ID:
-            drive_link = upload_to_drive(local_file_path, file_name)
-
-        if not drive_link:
-            drive_link = absolute_path
+        # Descargar ya (es lo rápido): así la foto está en disco aunque el
+        # usuario finalice antes de que la subida a Drive termine
+        file_info = await bot.get_file(photo.file_id)
+        await bot.download_file(file_info.file_path, destination=local_file_path)
 
-        # Guardar datos del registro
+        # Guardar datos del registro con el path local; la subida a Drive
+        # sigue en segundo plano y reemplaza el enlace
         silo_data = {
             'numero': silo,
             'tipo_comida': data.get('medicion_tipo_comida'),
             'peso_descargue': data.get('medicion_peso_descargue'),
-            'foto_factura': drive_link,
+            'foto_factura': absolute_path,
             'foto_local': local_file_path
         }
 
@@ -4105,6 +4695,8 @@ async def medicion_guardar_foto_factura(message: types.Message, state: FSMContex
         silos_procesados.append(silo_data)
         await state.update_data(medicion_silos_procesados=silos_procesados)
 
+        lanzar_tarea_fondo(persistir_foto_silo(local_file_path, file_name, state))
+
         # Mostrar resumen y preguntar si quiere agregar otro silo
         resumen = f"✅ *Silo {silo} registrado correctamente*\n\n"
         resumen += "📊 *Resumen hasta ahora:*\n\n"
@@ -4115,14 +4707,9 @@ async def medicion_guardar_foto_factura(message: types.Message, state: FSMContex
 
         await message.answer(resumen, parse_mode="Markdown")
 
-        builder = ReplyKeyboardBuilder()
-        builder.button(text="✅ Sí, otro silo")
-        builder.button(text="❌ No, finalizar")
-        builder.adjust(2)
-
         await message.answer(
             "¿Desea registrar otro silo?",
-            reply_markup=builder.as_markup(resize_keyboard=True)
+            reply_markup=KB_OTRO_SILO
         )
         await state.set_state(RegistroState.medicion_agregar_mas)
 
@@ -4135,27 +4722,25 @@ async def medicion_foto_factura_invalida(message: types.Message, state: FSMConte
     await message.answer("⚠️ Por favor envíe una FOTO de la factura (no texto).")
 
 # PASO 6: Agregar más silos o finalizar
-@dp.message(RegistroState.medicion_agregar_mas, F.text.in_(["✅ Sí, otro silo", "Sí", "Si", "1"]))
+@dp.message(RegistroState.medicion_agregar_mas, F.text.in_(_SI_OTRO_SILO))
 async def medicion_agregar_otro_silo(message: types.Message, state: FSMContext):
     """Usuario quiere agregar otro silo"""
-    builder = ReplyKeyboardBuilder()
-    builder.button(text="1")
-    builder.button(text="2")
-    builder.button(text="3")
-    builder.button(text="4")
-    builder.button(text="5")
-    builder.button(text="6")
-    builder.adjust(3)
-
     await message.answer(
         "📦 *Selección de Silo*\n\n"
         "Escriba el número del silo (1-6):",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_SILOS
     )
     await state.set_state(RegistroState.medicion_seleccion_silos)
 
-@dp.message(RegistroState.medicion_agregar_mas, F.text.in_(["❌ No, finalizar", "No", "2"]))
+INSERT_MEDICION_SILO_SQL = (
+    "INSERT INTO operario_sitio3_medicion_silos "
+    "(cedula_operario, numero_silo, tipo_comida, peso_antes, peso_despues, diferencia, "
+    "foto_antes, foto_despues, fecha_registro, session_id, telegram_user_id) "
+    "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)"
+)
+
+@dp.message(RegistroState.medicion_agregar_mas, F.text.in_(_NO_FINALIZAR))
 async def medicion_finalizar_registro(message: types.Message, state: FSMContext):
     """Usuario finaliza el registro - Guardar en BD y notificar"""
     await message.answer("⏳ Guardando registros...", reply_markup=types.ReplyKeyboardRemove())
@@ -4171,37 +4756,38 @@ async def medicion_finalizar_registro(message: types.Message, state: FSMContext)
         return
 
     # Guardar en base de datos
-    conn = None
     try:
-        conn = await get_db_connection()
-        if conn:
-            fecha_registro = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            telegram_user_id = message.from_user.id
+        async with db_connection() as conn:
+            if conn:
+                fecha_registro = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                telegram_user_id = message.from_user.id
+
+                # Insertar todos los silos en lote (un solo round-trip)
+                filas = [
+                    (cedula, silo['numero'], silo['tipo_comida'], 0.0,
+                     silo['peso_descargue'] / 1000,  # Convertir kg a toneladas para compatibilidad
+                     silo['peso_descargue'] / 1000,
+                     None,  # No hay foto antes
+                     silo['foto_factura'],  # Foto de factura va en foto_despues
+                     fecha_registro, session_id, telegram_user_id)
+                    for silo in silos_procesados
+                ]
+                if len(filas) < REGISTROS_COPY_UMBRAL:
+                    await conn.executemany(INSERT_MEDICION_SILO_SQL, filas)
+                else:
+                    await conn.copy_records_to_table(
+                        'operario_sitio3_medicion_silos',
+                        records=filas,
+                        columns=('cedula_operario', 'numero_silo', 'tipo_comida', 'peso_antes', 'peso_despues', 'diferencia',
+                                 'foto_antes', 'foto_despues', 'fecha_registro', 'session_id', 'telegram_user_id')
+                    )
 
-            for silo in silos_procesados:
-                await conn.execute('''
-                    INSERT INTO operario_sitio3_medicion_silos
-                    (cedula_operario, numero_silo, tipo_comida, peso_antes, peso_despues, diferencia,
-                     foto_antes, foto_despues, fecha_registro, session_id, telegram_user_id)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
-                ''', cedula, silo['numero'], silo['tipo_comida'], 0.0,
-                    silo['peso_descargue'] / 1000,  # Convertir kg a toneladas para compatibilidad
-                    silo['peso_descargue'] / 1000,
-                    None,  # No hay foto antes
-                    silo['foto_factura'],  # Foto de factura va en foto_despues
-                    fecha_registro, session_id, telegram_user_id)
-
-            print(f"✅ {len(silos_procesados)} silos guardados en BD (session: {session_id})")
-        else:
-            print("⚠️ No se pudo obtener conexión a la base de datos")
+                print(f"✅ {len(silos_procesados)} silos guardados en BD (session: {session_id})")
+            else:
+                print("⚠️ No se pudo obtener conexión a la base de datos")
 
     except Exception as e:
-        print(f"❌ Error guardando en base de datos: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if conn:
-            await release_db_connection(conn)
+        logger.exception(f"❌ Error guardando en base de datos: {e}")
 
     # Calcular total
     total_kilos = sum(s['peso_descargue'] for s in silos_procesados)
@@ -4233,19 +4819,19 @@ async def medicion_finalizar_registro(message: types.Message, state: FSMContext)
                 f"🏋️ *TOTAL INGRESADO: {total_kilos:,.2f} kilos*"
             )
 
-            await bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown")
+            await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown"))
 
             # Enviar fotos de facturas
             for silo in silos_procesados:
                 try:
                     foto_path = silo.get('foto_local')
                     if foto_path and os.path.exists(foto_path):
-                        with open(foto_path, 'rb') as photo:
-                            await bot.send_photo(
-                                chat_id=GROUP_CHAT_ID,
-                                photo=types.BufferedInputFile(photo.read(), filename=f"factura_silo{silo['numero']}.jpg"),
-                                caption=f"📸 Factura Silo {silo['numero']} - {silo['peso_descargue']:,.2f} kg"
-                            )
+                        # FSInputFile envía el archivo por streaming, sin cargarlo entero en memoria
+                        await enviar_al_grupo(lambda: bot.send_photo(
+                            chat_id=GROUP_CHAT_ID,
+                            photo=types.FSInputFile(foto_path, filename=f"factura_silo{silo['numero']}.jpg"),
+                            caption=f"📸 Factura Silo {silo['numero']} - {silo['peso_descargue']:,.2f} kg"
+                        ))
                 except Exception as e_foto:
                     print(f"⚠️ Error enviando foto del Silo {silo['numero']}: {e_foto}")
 
@@ -4300,16 +4886,11 @@ async def celdas_get_cedula(message: types.Message, state: FSMContext):
 @dp.message(RegistroState.celdas_confirmar_cedula, F.text == "1")
 async def celdas_confirmar_cedula_si(message: types.Message, state: FSMContext):
     """Confirmar cédula y pasar a selección de silo"""
-    builder = ReplyKeyboardBuilder()
-    for i in range(1, 7):
-        builder.add(types.KeyboardButton(text=str(i)))
-    builder.adjust(3)
-
     await message.answer(
         "🏭 *Selección de Silo*\n\n"
         "Seleccione el número de silo (1-6):",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_SILOS
     )
     await state.set_state(RegistroState.celdas_seleccion_silo)
 
@@ -4334,11 +4915,6 @@ async def celdas_seleccionar_silo(message: types.Message, state: FSMContext):
 
     await state.update_data(celdas_silo=silo)
 
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="1"))
-    builder.add(types.KeyboardButton(text="2"))
-    builder.adjust(2)
-
     await message.answer(
         f"🏭 Silo seleccionado: *{silo}*\n\n"
         "¿Es correcto?\n\n"
@@ -4346,7 +4922,7 @@ async def celdas_seleccionar_silo(message: types.Message, state: FSMContext):
         "2️⃣ No, editar\n\n"
         "Escriba el número de la opción:",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_OPCION_1_2
     )
     await state.set_state(RegistroState.celdas_confirmar_silo)
 
@@ -4364,16 +4940,11 @@ async def celdas_confirmar_silo_si(message: types.Message, state: FSMContext):
 @dp.message(RegistroState.celdas_confirmar_silo, F.text == "2")
 async def celdas_confirmar_silo_no(message: types.Message, state: FSMContext):
     """Volver a seleccionar silo"""
-    builder = ReplyKeyboardBuilder()
-    for i in range(1, 7):
-        builder.add(types.KeyboardButton(text=str(i)))
-    builder.adjust(3)
-
     await message.answer(
         "🏭 *Selección de Silo*\n\n"
         "Seleccione el número de silo (1-6):",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_SILOS
     )
     await state.set_state(RegistroState.celdas_seleccion_silo)
 
@@ -4392,11 +4963,6 @@ async def celdas_get_saldo(message: types.Message, state: FSMContext):
 
     await state.update_data(celdas_saldo=saldo)
 
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="1"))
-    builder.add(types.KeyboardButton(text="2"))
-    builder.adjust(2)
-
     await message.answer(
         f"📊 Saldo ingresado: *{saldo}*\n\n"
         "¿Es correcto?\n\n"
@@ -4404,7 +4970,7 @@ async def celdas_get_saldo(message: types.Message, state: FSMContext):
         "2️⃣ No, editar\n\n"
         "Escriba el número de la opción:",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_OPCION_1_2
     )
     await state.set_state(RegistroState.celdas_confirmar_saldo)
 
@@ -4434,52 +5000,37 @@ async def celdas_confirmar_saldo_no(message: types.Message, state: FSMContext):
 async def celdas_confirmar_saldo_invalido(message: types.Message, state: FSMContext):
     await message.answer("⚠️ Por favor seleccione 1 o 2.")
 
-@dp.message(RegistroState.celdas_foto, F.photo)
-async def celdas_recibir_foto(message: types.Message, state: FSMContext):
-    """Procesar foto de celdas de carga"""
-    data = await state.get_data()
-    cedula = data.get('celdas_cedula')
-    silo = data.get('celdas_silo')
-    saldo = data.get('celdas_saldo')
-
-    # Obtener la foto con mejor calidad
-    photo = message.photo[-1]
-    file = await bot.get_file(photo.file_id)
-
-    # Guardar foto temporalmente
-    foto_path = f"temp_celdas_{message.from_user.id}_{silo}.jpg"
-    await bot.download_file(file.file_path, foto_path)
+async def _procesar_foto_celdas(file_id, cedula, silo, saldo, telegram_user_id):
+    """Descarga la foto de celdas, la sube a Drive, guarda y notifica (segundo plano)"""
+    foto_path = f"temp_celdas_{telegram_user_id}_{silo}.jpg"
 
     # Subir a Google Drive
     foto_drive_id = None
     try:
-        fecha_actual = datetime.now().strftime("%Y%m%d_%H%M%S")
-        nombre_archivo = f"Celdas_Silo{silo}_{fecha_actual}.jpg"
-        foto_drive_id = upload_to_drive(foto_path, nombre_archivo, "image/jpeg")
+        async with _UPLOAD_SEM:
+            file = await bot.get_file(file_id)
+            await bot.download_file(file.file_path, foto_path)
+            fecha_actual = time.strftime("%Y%m%d_%H%M%S")
+            nombre_archivo = f"Celdas_Silo{silo}_{fecha_actual}.jpg"
+            foto_drive_id = await asyncio.to_thread(upload_to_drive, foto_path, nombre_archivo)
         if foto_drive_id:
             print(f"✅ Foto de celdas subida a Google Drive: {foto_drive_id}")
     except Exception as e:
         print(f"⚠️ Error subiendo foto a Drive: {e}")
 
     # Guardar en base de datos
-    conn = None
     try:
-        conn = await get_db_connection()
-        if conn:
-            session_id = str(uuid.uuid4())
-            await conn.execute('''
-                INSERT INTO operario_sitio3_celdas_carga
-                (cedula_operario, numero_silo, saldo_celda, foto_celda, session_id, telegram_user_id)
-                VALUES ($1, $2, $3, $4, $5, $6)
-            ''', cedula, silo, saldo, foto_drive_id, session_id, message.from_user.id)
-            print(f"✅ Registro de celdas de carga guardado: Silo {silo}")
+        async with db_connection() as conn:
+            if conn:
+                session_id = str(uuid.uuid4())
+                await conn.execute('''
+                    INSERT INTO operario_sitio3_celdas_carga
+                    (cedula_operario, numero_silo, saldo_celda, foto_celda, session_id, telegram_user_id)
+                    VALUES ($1, $2, $3, $4, $5, $6)
+                ''', cedula, silo, saldo, foto_drive_id, session_id, telegram_user_id)
+                print(f"✅ Registro de celdas de carga guardado: Silo {silo}")
     except Exception as e:
-        print(f"⚠️ Error guardando registro de celdas: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if conn:
-            await release_db_connection(conn)
+        logger.exception(f"⚠️ Error guardando registro de celdas: {e}")
 
     # Enviar notificación al grupo
     if GROUP_CHAT_ID:
@@ -4494,16 +5045,15 @@ async def celdas_recibir_foto(message: types.Message, state: FSMContext):
                 f"📅 Fecha: {fecha_hora}\n"
                 "━━━━━━━━━━━━━━━━━━━━"
             )
-            await bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown")
+            await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown"))
 
             # Enviar foto
             if foto_path and os.path.exists(foto_path):
-                with open(foto_path, 'rb') as photo_file:
-                    await bot.send_photo(
-                        chat_id=GROUP_CHAT_ID,
-                        photo=types.BufferedInputFile(photo_file.read(), filename=f"celdas_silo{silo}.jpg"),
-                        caption=f"📸 Celdas de Carga - Silo {silo}"
-                    )
+                await enviar_al_grupo(lambda: bot.send_photo(
+                    chat_id=GROUP_CHAT_ID,
+                    photo=types.FSInputFile(foto_path, filename=f"celdas_silo{silo}.jpg"),
+                    caption=f"📸 Celdas de Carga - Silo {silo}"
+                ))
         except Exception as e:
             print(f"⚠️ Error enviando notificación al grupo: {e}")
 
@@ -4514,18 +5064,26 @@ async def celdas_recibir_foto(message: types.Message, state: FSMContext):
         except:
             pass
 
-    # Preguntar si desea registrar otro silo
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="✅ Sí, registrar otro"))
-    builder.add(types.KeyboardButton(text="❌ No, finalizar"))
-    builder.adjust(1)
+@dp.message(RegistroState.celdas_foto, F.photo)
+async def celdas_recibir_foto(message: types.Message, state: FSMContext):
+    """Procesar foto de celdas de carga"""
+    data = await state.get_data()
+    cedula = data.get('celdas_cedula')
+    silo = data.get('celdas_silo')
+    saldo = data.get('celdas_saldo')
+
+    # Obtener la foto con mejor calidad; descarga, Drive, BD y aviso al
+    # grupo siguen en segundo plano mientras el usuario continúa
+    photo = message.photo[-1]
+    lanzar_tarea_fondo(_procesar_foto_celdas(photo.file_id, cedula, silo, saldo, message.from_user.id))
 
+    # Preguntar si desea registrar otro silo
     await message.answer(
         "✅ *Registro de celdas guardado exitosamente*\n\n"
         f"📊 Silo {silo} - Saldo: {saldo}\n\n"
         "¿Desea registrar otro silo?",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_REGISTRAR_OTRO
     )
     await state.set_state(RegistroState.celdas_agregar_mas)
 
@@ -4536,16 +5094,11 @@ async def celdas_foto_invalida(message: types.Message, state: FSMContext):
 @dp.message(RegistroState.celdas_agregar_mas, F.text.contains("Sí"))
 async def celdas_agregar_mas_si(message: types.Message, state: FSMContext):
     """Registrar otro silo"""
-    builder = ReplyKeyboardBuilder()
-    for i in range(1, 7):
-        builder.add(types.KeyboardButton(text=str(i)))
-    builder.adjust(3)
-
     await message.answer(
         "🏭 *Selección de Silo*\n\n"
         "Seleccione el número de silo (1-6):",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_SILOS
     )
     await state.set_state(RegistroState.celdas_seleccion_silo)
 
@@ -4751,11 +5304,6 @@ async def combustible_get_placa(message: types.Message, state: FSMContext):
 
     await state.update_data(combustible_placa=placa)
 
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="1"))
-    builder.add(types.KeyboardButton(text="2"))
-    builder.adjust(2)
-
     await message.answer(
         f"🚗 Placa ingresada: *{placa}*\n\n"
         "¿Es correcta?\n\n"
@@ -4763,7 +5311,7 @@ async def combustible_get_placa(message: types.Message, state: FSMContext):
         "2️⃣ No, editar\n\n"
         "Escriba el número de la opción:",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_OPCION_1_2
     )
     await state.set_state(RegistroState.combustible_confirmar_placa)
 
@@ -4798,19 +5346,14 @@ async def combustible_get_nombre_equipo(message: types.Message, state: FSMContex
 
     await state.update_data(combustible_nombre_equipo=nombre)
 
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="1"))
-    builder.add(types.KeyboardButton(text="2"))
-    builder.adjust(2)
-
     await message.answer(
-        f"⚙️ Equipo ingresado: *{nombre}*\n\n"
+        f"⚙️ Equipo ingresado: *{escapar_md(nombre)}*\n\n"
         "¿Es correcto?\n\n"
         "1️⃣ Sí, confirmar\n"
         "2️⃣ No, editar\n\n"
         "Escriba el número de la opción:",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_OPCION_1_2
     )
     await state.set_state(RegistroState.combustible_confirmar_nombre_equipo)
 
@@ -4855,19 +5398,14 @@ async def combustible_seleccionar_centro(message: types.Message, state: FSMConte
 
     await state.update_data(combustible_centro_costo=centro)
 
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="1"))
-    builder.add(types.KeyboardButton(text="2"))
-    builder.adjust(2)
-
     await message.answer(
-        f"📍 Centro de costo: *{centro}*\n\n"
+        f"📍 Centro de costo: *{escapar_md(centro)}*\n\n"
         "¿Es correcto?\n\n"
         "1️⃣ Sí, confirmar\n"
         "2️⃣ No, editar\n\n"
         "Escriba el número de la opción:",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_OPCION_1_2
     )
     await state.set_state(RegistroState.combustible_confirmar_centro_costo)
 
@@ -4883,24 +5421,18 @@ async def combustible_confirmar_centro_si(message: types.Message, state: FSMCont
     centro_costo = data.get('combustible_centro_costo')
 
     # Guardar en base de datos
-    conn = None
     try:
-        conn = await get_db_connection()
-        if conn:
-            session_id = str(uuid.uuid4())
-            await conn.execute('''
-                INSERT INTO operario_sitio3_combustible
-                (cedula_operario, tipo_combustible, equipo_maquinaria, placa_vehiculo, nombre_equipo, centro_costo, session_id, telegram_user_id)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            ''', cedula, tipo, equipo, placa, nombre_equipo, centro_costo, session_id, message.from_user.id)
-            print(f"✅ Registro de combustible guardado")
+        async with db_connection() as conn:
+            if conn:
+                session_id = str(uuid.uuid4())
+                await conn.execute('''
+                    INSERT INTO operario_sitio3_combustible
+                    (cedula_operario, tipo_combustible, equipo_maquinaria, placa_vehiculo, nombre_equipo, centro_costo, session_id, telegram_user_id)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                ''', cedula, tipo, equipo, placa, nombre_equipo, centro_costo, session_id, message.from_user.id)
+                print(f"✅ Registro de combustible guardado")
     except Exception as e:
-        print(f"⚠️ Error guardando registro de combustible: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if conn:
-            await release_db_connection(conn)
+        logger.exception(f"⚠️ Error guardando registro de combustible: {e}")
 
     # Enviar notificación al grupo
     if GROUP_CHAT_ID:
@@ -4925,7 +5457,7 @@ async def combustible_confirmar_centro_si(message: types.Message, state: FSMCont
                 f"📅 Fecha: {fecha_hora}\n"
                 "━━━━━━━━━━━━━━━━━━━━"
             )
-            await bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown")
+            await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown"))
         except Exception as e:
             print(f"⚠️ Error enviando notificación al grupo: {e}")
 
@@ -5014,11 +5546,6 @@ async def traslado_get_corral_origen(message: types.Message, state: FSMContext):
 
     await state.update_data(traslado_corral_origen=corral)
 
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="1"))
-    builder.add(types.KeyboardButton(text="2"))
-    builder.adjust(2)
-
     await message.answer(
         f"🐷 Corral de origen: *{corral}*\n\n"
         "¿Es correcto?\n\n"
@@ -5026,7 +5553,7 @@ async def traslado_get_corral_origen(message: types.Message, state: FSMContext):
         "2️⃣ No, editar\n\n"
         "Escriba el número de la opción:",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_OPCION_1_2
     )
     await state.set_state(RegistroState.traslado_confirmar_origen)
 
@@ -5074,11 +5601,6 @@ async def traslado_get_corral_destino(message: types.Message, state: FSMContext)
 
     await state.update_data(traslado_corral_destino=corral)
 
-    builder = ReplyKeyboardBuilder()
-    builder.add(types.KeyboardButton(text="1"))
-    builder.add(types.KeyboardButton(text="2"))
-    builder.adjust(2)
-
     await message.answer(
         f"🐷 Corral de destino: *{corral}*\n\n"
         "¿Es correcto?\n\n"
@@ -5086,7 +5608,7 @@ async def traslado_get_corral_destino(message: types.Message, state: FSMContext)
         "2️⃣ No, editar\n\n"
         "Escriba el número de la opción:",
         parse_mode="Markdown",
-        reply_markup=builder.as_markup(resize_keyboard=True)
+        reply_markup=KB_OPCION_1_2
     )
     await state.set_state(RegistroState.traslado_confirmar_destino)
 
@@ -5099,24 +5621,18 @@ async def traslado_confirmar_destino_si(message: types.Message, state: FSMContex
     corral_destino = data.get('traslado_corral_destino')
 
     # Guardar en base de datos
-    conn = None
     try:
-        conn = await get_db_connection()
-        if conn:
-            session_id = str(uuid.uuid4())
-            await conn.execute('''
-                INSERT INTO operario_sitio3_traslado_corrales
-                (cedula_operario, corral_origen, corral_destino, session_id, telegram_user_id)
-                VALUES ($1, $2, $3, $4, $5)
-            ''', cedula, corral_origen, corral_destino, session_id, message.from_user.id)
-            print(f"✅ Traslado entre corrales guardado: {corral_origen} -> {corral_destino}")
+        async with db_connection() as conn:
+            if conn:
+                session_id = str(uuid.uuid4())
+                await conn.execute('''
+                    INSERT INTO operario_sitio3_traslado_corrales
+                    (cedula_operario, corral_origen, corral_destino, session_id, telegram_user_id)
+                    VALUES ($1, $2, $3, $4, $5)
+                ''', cedula, corral_origen, corral_destino, session_id, message.from_user.id)
+                print(f"✅ Traslado entre corrales guardado: {corral_origen} -> {corral_destino}")
     except Exception as e:
-        print(f"⚠️ Error guardando traslado: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if conn:
-            await release_db_connection(conn)
+        logger.exception(f"⚠️ Error guardando traslado: {e}")
 
     # Enviar notificación al grupo
     if GROUP_CHAT_ID:
@@ -5131,7 +5647,7 @@ async def traslado_confirmar_destino_si(message: types.Message, state: FSMContex
                 f"📅 Fecha: {fecha_hora}\n"
                 "━━━━━━━━━━━━━━━━━━━━"
             )
-            await bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown")
+            await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown"))
         except Exception as e:
             print(f"⚠️ Error enviando notificación al grupo: {e}")
 
@@ -5177,50 +5693,44 @@ async def mostrar_capacidad_silo(message: types.Message, state: FSMContext):
     silo_numero = int(message.text)
     
     # Conectar a la base de datos para consultar
-    conn = None
     try:
-        conn = await get_db_connection()
-        if conn:
-            # Consultar todos los registros de este silo desde la tabla normalizada
-            registros = await conn.fetch('''
-                SELECT s.peso, s.fecha, r.camion_id
-                FROM silos s
-                JOIN registros r ON s.registro_id = r.id
-                WHERE s.numero_silo = $1
-                ORDER BY s.fecha DESC
-                LIMIT 20
-            ''', silo_numero)
+        async with db_connection() as conn:
+            if conn:
+                # Consultar todos los registros de este silo desde la tabla normalizada
+                registros = await conn.fetch('''
+                    SELECT s.peso, s.fecha, r.camion_id
+                    FROM silos s
+                    JOIN registros r ON s.registro_id = r.id
+                    WHERE s.numero_silo = $1
+                    ORDER BY s.fecha DESC
+                    LIMIT 20
+                ''', silo_numero)
             
-            if registros:
-                # Calcular capacidad total del silo
-                total_silo = sum(float(reg['peso']) for reg in registros)
-                detalle = f"📊 *Capacidad del Silo {silo_numero}*\n\n"
-                detalle += f"📦 *Total acumulado:* {total_silo:.1f} kg\n"
-                detalle += f"📋 *Últimos {len(registros)} registros:*\n\n"
+                if registros:
+                    # Calcular capacidad total del silo
+                    total_silo = sum(float(reg['peso']) for reg in registros)
+                    detalle = f"📊 *Capacidad del Silo {silo_numero}*\n\n"
+                    detalle += f"📦 *Total acumulado:* {total_silo:.1f} kg\n"
+                    detalle += f"📋 *Últimos {len(registros)} registros:*\n\n"
                 
-                for reg in registros:
-                    peso_silo = float(reg['peso'])
-                    # Formatear fecha
-                    fecha_obj = reg['fecha']
-                    if hasattr(fecha_obj, 'strftime'):
-                        fecha_formato = fecha_obj.strftime('%d/%m/%Y %H:%M')
-                    else:
-                        fecha_formato = str(fecha_obj)[:16]
+                    for reg in registros:
+                        peso_silo = float(reg['peso'])
+                        # Formatear fecha
+                        fecha_obj = reg['fecha']
+                        if hasattr(fecha_obj, 'strftime'):
+                            fecha_formato = fecha_obj.strftime('%d/%m/%Y %H:%M')
+                        else:
+                            fecha_formato = str(fecha_obj)[:16]
                     
-                    detalle += f"🚚 {reg['camion_id']}: {peso_silo} kg - {fecha_formato}\n"
+                        detalle += f"🚚 {reg['camion_id']}: {peso_silo} kg - {fecha_formato}\n"
                 
-                await message.answer(detalle, parse_mode="Markdown")
-            else:
-                await message.answer(f"⚠️ No se encontraron registros para el Silo {silo_numero}")
+                    await message.answer(detalle, parse_mode="Markdown")
+                else:
+                    await message.answer(f"⚠️ No se encontraron registros para el Silo {silo_numero}")
     
     except Exception as e:
-        print(f"⚠️ Error consultando capacidad de silo: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"⚠️ Error consultando capacidad de silo: {e}")
         await message.answer("⚠️ Error al consultar la base de datos")
-    finally:
-        if conn:
-            await release_db_connection(conn)
 
     # Finalizar flujo de consulta
     await finalizar_flujo(message, state)
@@ -5263,34 +5773,28 @@ async def restar_peso_del_silo(message: types.Message, state: FSMContext):
     peso_str = data.get('peso_a_restar_temporal')
     peso_a_restar = float(peso_str.replace(",", "."))
     
-    conn = None
     try:
-        conn = await get_db_connection()
-        if conn:
-            # Insertar un registro negativo para restar del total
-            await conn.execute('''
-                INSERT INTO silos (registro_id, numero_silo, peso, fecha)
-                VALUES (NULL, $1, $2, NOW())
-            ''', silo_numero, -peso_a_restar)
+        async with db_connection() as conn:
+            if conn:
+                # Insertar un registro negativo para restar del total
+                await conn.execute('''
+                    INSERT INTO silos (registro_id, numero_silo, peso, fecha)
+                    VALUES (NULL, $1, $2, NOW())
+                ''', silo_numero, -peso_a_restar)
             
-            # Consultar el nuevo total
-            total_actual = await conn.fetchval('''
-                SELECT COALESCE(SUM(peso), 0) FROM silos WHERE numero_silo = $1
-            ''', silo_numero)
+                # Consultar el nuevo total
+                total_actual = await conn.fetchval('''
+                    SELECT COALESCE(SUM(peso), 0) FROM silos WHERE numero_silo = $1
+                ''', silo_numero)
             
-            await message.answer(
-                f"✅ Se restaron {peso_a_restar} kg del Silo {silo_numero}\n\n"
-                f"📦 Capacidad actual del Silo {silo_numero}: {total_actual:.1f} kg"
-            )
+                await message.answer(
+                    f"✅ Se restaron {peso_a_restar} kg del Silo {silo_numero}\n\n"
+                    f"📦 Capacidad actual del Silo {silo_numero}: {total_actual:.1f} kg"
+                )
 
     except Exception as e:
-        print(f"⚠️ Error restando peso: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"⚠️ Error restando peso: {e}")
         await message.answer("⚠️ Error al actualizar la base de datos")
-    finally:
-        if conn:
-            await release_db_connection(conn)
 
     # Finalizar flujo
     await finalizar_flujo(message, state)
@@ -5415,7 +5919,7 @@ async def editar_camion(message: types.Message, state: FSMContext):
     await state.set_state(RegistroState.camion)
 
 # ==================== TIPO DE CARGA ==================== #
-@dp.message(RegistroState.tipo_carga, F.text.in_(["Cerdo vivo", "Canales frías", "Desposte", "Pedidos", "Gasolina"]))
+@dp.message(RegistroState.tipo_carga, F.text.in_(_TIPOS_CARGA_CAMION))
 async def get_tipo_carga(message: types.Message, state: FSMContext):
     await state.update_data(tipo_carga=message.text)
     await message.answer(
@@ -5682,7 +6186,7 @@ async def destino_terminar_silos(message: types.Message, state: FSMContext):
                     f"👤 Cédula: *{data.get('cedula', 'N/A')}*\n\n"
                     "⚠️ Se requiere verificación"
                 )
-                await bot.send_message(GROUP_CHAT_ID, mensaje_alerta, parse_mode="Markdown")
+                await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_alerta, parse_mode="Markdown"))
                 print(f"✅ Alerta de discrepancia enviada al grupo ({diferencia:.2f} kg)")
             except Exception as e:
                 print(f"⚠️ Error enviando alerta de discrepancia: {e}")
@@ -5702,15 +6206,12 @@ async def guardar_registro(message: types.Message, state: FSMContext):
         file_info = await bot.get_file(photo.file_id)
         
         # Crear carpeta para imágenes si no existe
-        images_folder = "imagenes_pesajes"
-        if not os.path.exists(images_folder):
-            os.makedirs(images_folder)
         
         # Nombre único para la imagen
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
         placa = data.get('camion', 'SIN_PLACA')
         file_name = f"pesaje_{placa}_{timestamp}.jpg"
-        local_file_path = os.path.join(images_folder, file_name)
+        local_file_path = os.path.join(IMG_DIR, file_name)
         
         # Descargar la imagen
         await bot.download_file(file_info.file_path, destination=local_file_path)
@@ -5722,7 +6223,7 @@ async def guardar_registro(message: types.Message, state: FSMContext):
         # Intentar subir a Drive (si está configurado)
         drive_link = None
         if GOOGLE_CREDENTIALS_PATH and os.path.exists(GOOGLE_CREDENTIALS_PATH) and GOOGLE_FOLDER_ID:
-            drive_link = upload_to_drive(local_file_path, file_name)
+            drive_link = await asyncio.to_thread(upload_to_drive, local_file_path, file_name)
             if drive_link:
                 print(f"✅ Imagen subida a Google Drive")
         
@@ -5734,93 +6235,87 @@ async def guardar_registro(message: types.Message, state: FSMContext):
         # Intentar guardar en base de datos (opcional)
         registro_guardado = False
         if DATABASE_URL:
-            conn = None
             try:
-                conn = await get_db_connection()
-                if conn:
-                    tipo_pesaje = data.get("tipo")
-                    placa = data.get("camion")
+                async with db_connection() as conn:
+                    if conn:
+                        tipo_pesaje = data.get("tipo")
+                        placa = data.get("camion")
                     
-                    # Para ORIGEN: guardar peso simple
-                    if tipo_pesaje == "Origen":
-                        peso_str = str(data.get("peso", "0"))
-                        peso_float = float(peso_str.replace(",", "."))
-                        bascula = data.get("bascula", "Báscula Origen")
-
-                        await conn.execute('''
-                            INSERT INTO registros (camion_id, tipo_pesaje, bascula, peso, fecha, cedula, imagen, tipodeempleado, tipocarga)
-                            VALUES ($1, $2, $3, $4, NOW(), $5, $6, $7, $8)
-                        ''', placa, tipo_pesaje, bascula, peso_float, data.get("cedula"), drive_link, data.get("tipo_empleado"), data.get("tipo_carga"))
+                        # Para ORIGEN: guardar peso simple
+                        if tipo_pesaje == "Origen":
+                            peso_str = str(data.get("peso", "0"))
+                            peso_float = float(peso_str.replace(",", "."))
+                            bascula = data.get("bascula", "Báscula Origen")
+
+                            await conn.execute('''
+                                INSERT INTO registros (camion_id, tipo_pesaje, bascula, peso, fecha, cedula, imagen, tipodeempleado, tipocarga)
+                                VALUES ($1, $2, $3, $4, NOW(), $5, $6, $7, $8)
+                            ''', placa, tipo_pesaje, bascula, peso_float, data.get("cedula"), drive_link, data.get("tipo_empleado"), data.get("tipo_carga"))
                         
-                        registro_guardado = True
-                        print("✅ Registro de ORIGEN guardado en base de datos")
+                            registro_guardado = True
+                            print("✅ Registro de ORIGEN guardado en base de datos")
                     
-                    # Para DESTINO: guardar total de báscula y validar con último origen
-                    elif tipo_pesaje == "Destino":
-                        peso_bascula = data.get("peso_bascula_general", 0)
-                        silos = data.get("silos", [])
-                        total_silos = data.get("total_silos", 0)
+                        # Para DESTINO: guardar total de báscula y validar con último origen
+                        elif tipo_pesaje == "Destino":
+                            peso_bascula = data.get("peso_bascula_general", 0)
+                            silos = data.get("silos", [])
+                            total_silos = data.get("total_silos", 0)
                         
-                        # Buscar el último registro de ORIGEN para esta placa
-                        print(f"🔍 Buscando último ORIGEN para placa: {placa}")
+                            # Buscar el último registro de ORIGEN para esta placa
+                            print(f"🔍 Buscando último ORIGEN para placa: {placa}")
                         
-                        ultimo_origen = await conn.fetchrow('''
-                            SELECT peso FROM registros 
-                            WHERE camion_id = $1 AND tipo_pesaje = 'Origen'
-                            ORDER BY fecha DESC
-                            LIMIT 1
-                        ''', placa)
-                        print(f"� Resultado de búsqueda: {ultimo_origen}")
+                            ultimo_origen = await conn.fetchrow('''
+                                SELECT peso FROM registros 
+                                WHERE camion_id = $1 AND tipo_pesaje = 'Origen'
+                                ORDER BY fecha DESC
+                                LIMIT 1
+                            ''', placa)
+                            print(f"� Resultado de búsqueda: {ultimo_origen}")
                         
-                        # Guardar el registro principal (solo peso de báscula)
-                        registro_id = await conn.fetchval('''
-                            INSERT INTO registros (camion_id, tipo_pesaje, bascula, peso, fecha, cedula, imagen, tipodeempleado, tipocarga)
-                            VALUES ($1, $2, $3, $4, NOW(), $5, $6, $7, $8)
-                            RETURNING id
-                        ''', placa, tipo_pesaje, "Báscula General", peso_bascula, data.get("cedula"), drive_link, data.get("tipo_empleado"), data.get("tipo_carga"))
+                            # Guardar el registro principal (solo peso de báscula)
+                            registro_id = await conn.fetchval('''
+                                INSERT INTO registros (camion_id, tipo_pesaje, bascula, peso, fecha, cedula, imagen, tipodeempleado, tipocarga)
+                                VALUES ($1, $2, $3, $4, NOW(), $5, $6, $7, $8)
+                                RETURNING id
+                            ''', placa, tipo_pesaje, "Báscula General", peso_bascula, data.get("cedula"), drive_link, data.get("tipo_empleado"), data.get("tipo_carga"))
                         
-                        print(f"✅ Registro de DESTINO guardado en base de datos (ID: {registro_id})")
-                        print(f"   - Peso báscula: {peso_bascula} kg")
-                        print(f"   - Total silos: {total_silos} kg")
+                            print(f"✅ Registro de DESTINO guardado en base de datos (ID: {registro_id})")
+                            print(f"   - Peso báscula: {peso_bascula} kg")
+                            print(f"   - Total silos: {total_silos} kg")
                         
-                        # Guardar cada silo en la tabla de silos
-                        for silo in silos:
-                            await conn.execute('''
-                                INSERT INTO silos (registro_id, numero_silo, peso, fecha)
-                                VALUES ($1, $2, $3, NOW())
-                            ''', registro_id, silo['numero'], float(silo['peso']))
-                            print(f"   ✅ Silo {silo['numero']}: {silo['peso']} kg guardado")
+                            # Guardar cada silo en la tabla de silos
+                            for silo in silos:
+                                await conn.execute('''
+                                    INSERT INTO silos (registro_id, numero_silo, peso, fecha)
+                                    VALUES ($1, $2, $3, NOW())
+                                ''', registro_id, silo['numero'], float(silo['peso']))
+                                print(f"   ✅ Silo {silo['numero']}: {silo['peso']} kg guardado")
                         
-                        # Validar con último origen y guardar para el resumen
-                        mensaje_validacion = ""
-                        if ultimo_origen:
-                            peso_origen = float(ultimo_origen['peso'])
-                            diferencia = peso_bascula - peso_origen
-                            diferencia_abs = abs(diferencia)
+                            # Validar con último origen y guardar para el resumen
+                            mensaje_validacion = ""
+                            if ultimo_origen:
+                                peso_origen = float(ultimo_origen['peso'])
+                                diferencia = peso_bascula - peso_origen
+                                diferencia_abs = abs(diferencia)
                             
-                            print(f"   - Último peso ORIGEN: {peso_origen} kg")
-                            print(f"   - Diferencia: {diferencia_abs} kg")
+                                print(f"   - Último peso ORIGEN: {peso_origen} kg")
+                                print(f"   - Diferencia: {diferencia_abs} kg")
                             
-                            # Guardar info de validación para mostrar al usuario
-                            await state.update_data(
-                                peso_origen_comparacion=peso_origen,
-                                diferencia_origen=diferencia
-                            )
+                                # Guardar info de validación para mostrar al usuario
+                                await state.update_data(
+                                    peso_origen_comparacion=peso_origen,
+                                    diferencia_origen=diferencia
+                                )
                             
-                            if diferencia_abs > 1.0:  # Tolerancia de 1 kg
-                                print(f"   ⚠️ ADVERTENCIA: Diferencia mayor a 1kg con el último origen")
-                        else:
-                            print("   ⚠️ No se encontró registro de ORIGEN previo para esta placa")
+                                if diferencia_abs > 1.0:  # Tolerancia de 1 kg
+                                    print(f"   ⚠️ ADVERTENCIA: Diferencia mayor a 1kg con el último origen")
+                            else:
+                                print("   ⚠️ No se encontró registro de ORIGEN previo para esta placa")
                     
-                else:
-                    print("⚠️ No se pudo obtener conexión a la base de datos")
+                    else:
+                        print("⚠️ No se pudo obtener conexión a la base de datos")
             except Exception as e:
-                print(f"⚠️ Error guardando en base de datos: {e}")
-                import traceback
-                traceback.print_exc()
-            finally:
-                if conn:
-                    await release_db_connection(conn)
+                logger.exception(f"⚠️ Error guardando en base de datos: {e}")
 
         # Recargar data desde state para obtener los datos actualizados (peso_origen_comparacion, etc.)
         data = await state.get_data()
@@ -5941,19 +6436,19 @@ async def guardar_registro(message: types.Message, state: FSMContext):
                 
                 # Enviar la foto con el caption al grupo
                 with open(local_file_path, 'rb') as photo_file:
-                    await bot.send_photo(
+                    await enviar_al_grupo(lambda: bot.send_photo(
                         chat_id=GROUP_CHAT_ID,
                         photo=types.BufferedInputFile(photo_file.read(), filename=file_name),
                         caption=mensaje_grupo,
                         parse_mode="Markdown"
-                    )
+                    ))
                 print("✅ Notificación enviada al grupo con foto")
                 
             except Exception as e:
                 print(f"⚠️ Error al enviar notificación al grupo: {e}")
                 # Si falla enviar con foto, intentar solo texto
                 try:
-                    await bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown")
+                    await enviar_al_grupo(lambda: bot.send_message(GROUP_CHAT_ID, mensaje_grupo, parse_mode="Markdown"))
                     print("✅ Notificación enviada al grupo (solo texto)")
                 except Exception as e2:
                     print(f"⚠️ Error al enviar mensaje de texto al grupo: {e2}")
@@ -5993,6 +6488,7 @@ async def main():
     if DATABASE_URL:
         print("📊 Configurando base de datos...")
         await init_db_pool()
+        await init_db_tablas()
     else:
         print("⚠️  Base de datos NO configurada")
     
@@ -6007,11 +6503,32 @@ async def main():
     print("💬 Esperando mensajes...")
     print("="*50 + "\n")
     
+    # Arrancar el consumidor de la cola de mensajes salientes y el
+    # volcador periódico de registros inactivos
+    tarea_mensajes = asyncio.create_task(consumidor_mensajes())
+    tarea_registros = asyncio.create_task(flusher_registros())
+
+    # Con Redis, las sesiones expiradas se detectan por keyspace notifications
+    # más un barrido de respaldo; sin Redis, una pasada periódica poda y
+    # expira el dict en memoria
+    if redis_actividad is not None:
+        tareas_expiracion = [
+            asyncio.create_task(escuchar_expiraciones_actividad()),
+            asyncio.create_task(barrer_actividad_redis()),
+        ]
+    else:
+        tareas_expiracion = [asyncio.create_task(podar_actividad())]
+
     try:
         # Iniciar polling (esto bloquea hasta que se detenga el bot)
         await dp.start_polling(bot)
     finally:
-        # Cerrar pool al salir
+        tarea_mensajes.cancel()
+        tarea_registros.cancel()
+        for tarea in tareas_expiracion:
+            tarea.cancel()
+        # Volcar lo que quede pendiente antes de cerrar el pool
+        await volcar_registros_pendientes()
         global db_pool
         if db_pool:
             print("\n🔒 Cerrando conexiones a la base de datos...")